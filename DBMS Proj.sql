@@ -114,6 +114,9 @@ CREATE TABLE reminder (
     FOREIGN KEY (user_id) REFERENCES app_user(user_id) ON DELETE CASCADE
 );
 
+-- Range scans by the reminder scheduler
+CREATE INDEX idx_reminder_status_due ON reminder(status, due_date);
+
 CREATE TABLE tag_suggestion (
     suggestion_id INT AUTO_INCREMENT PRIMARY KEY,
     note_id INT NOT NULL,
@@ -134,6 +137,24 @@ CREATE TABLE bookmark (
     FOREIGN KEY (user_id) REFERENCES app_user(user_id) ON DELETE CASCADE
 );
 
+-- AI summary of a note, with the hash of the content it was generated from
+CREATE TABLE note_summary (
+    note_id INT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    content_hash CHAR(40) NOT NULL,
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+);
+
+-- Failed summary generations for a note's current content (cleared when the content changes)
+CREATE TABLE summary_failure (
+    note_id INT PRIMARY KEY,
+    content_hash CHAR(40) NOT NULL,
+    attempts INT NOT NULL,
+    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+);
+
 
 
 
@@ -0,0 +1,189 @@
+"""
+Note access control
+Resolves what a user may do with one or many notes in a single query, memoized per request
+and cached per user until a share, delete or visibility change invalidates it
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from flask import g, has_app_context
+
+from shared_state import get_shared_store
+
+# Collaboration levels, weakest first; owners of the note row outrank all of them
+ACCESS_RANKS = {'read': 1, 'write': 2, 'owner': 3}
+
+# What each action needs: 'delete' is reserved for the note's creator
+REQUIRED_RANK = {'read': 1, 'write': 2, 'share': 3}
+
+ACCESS_CACHE_TTL = float(os.getenv('ACCESS_CACHE_TTL', '60'))
+ACCESS_CACHE_MAX_USERS = int(os.getenv('ACCESS_CACHE_MAX_USERS', '1000'))
+
+
+class NotePermission:
+    """A user's access to one note"""
+
+    __slots__ = ('note_id', 'owner_id', 'level', 'is_owner')
+
+    def __init__(self, note_id: int, owner_id: Optional[int], level: Optional[str], is_owner: bool):
+        self.note_id = note_id
+        self.owner_id = owner_id
+        self.level = level
+        self.is_owner = is_owner
+
+    @property
+    def exists(self) -> bool:
+        return self.owner_id is not None
+
+    def allows(self, action: str) -> bool:
+        """Check an action: 'read', 'write', 'share' or 'delete'"""
+        if self.is_owner:
+            return True
+        if action == 'delete' or self.level is None:
+            return False
+        return ACCESS_RANKS[self.level] >= REQUIRED_RANK[action]
+
+    def to_dict(self) -> Dict:
+        return {'note_id': self.note_id, 'access_level': self.level, 'is_owner': self.is_owner}
+
+
+class AccessResolver:
+    """
+    Batched permission lookups
+
+    Resolved permissions are memoized on flask.g for the current request and kept in a
+    per-user cache (LRU over users, TTL per entry). Call invalidate_note after anything
+    that changes who can see a note. With a shared store, invalidations are
+    also published there and applied by every other process before its next lookup.
+    """
+
+    def __init__(self, ttl_s: float = ACCESS_CACHE_TTL, max_users: int = ACCESS_CACHE_MAX_USERS, store=None):
+        self.ttl_s = ttl_s
+        self.max_users = max_users
+        self.store = store
+        self._invalidation_seq = store.latest_invalidation() if store is not None else 0
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[int, Dict[int, tuple]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _request_memo(self) -> Dict:
+        if not has_app_context():
+            return {}
+        memo = g.get('_note_access')
+        if memo is None:
+            memo = g._note_access = {}
+        return memo
+
+    def _apply_shared_invalidations(self):
+        latest, entries, complete = self.store.invalidations_since(self._invalidation_seq)
+        if latest == self._invalidation_seq:
+            return
+        with self._lock:
+            if not complete:
+                self._cache.clear()
+            for kind, target in entries:
+                if kind != 'note':
+                    continue  # index invalidations (see index_sync.py)
+                for user_cache in self._cache.values():
+                    user_cache.pop(target, None)
+            self._invalidation_seq = latest
+
+    def resolve(self, cur, user_id: int, note_ids: Iterable[int]) -> Dict[int, NotePermission]:
+        """Resolve permissions for many notes, querying only the ones not already known"""
+        if self.store is not None:
+            self._apply_shared_invalidations()
+        memo = self._request_memo()
+        result = {}
+        pending = []
+        now = time.monotonic()
+
+        with self._lock:
+            user_cache = self._cache.get(user_id)
+            if user_cache is not None:
+                self._cache.move_to_end(user_id)
+            for note_id in dict.fromkeys(int(n) for n in note_ids):
+                permission = memo.get((user_id, note_id))
+                if permission is None and user_cache is not None:
+                    cached = user_cache.get(note_id)
+                    if cached is not None and cached[1] > now:
+                        permission = cached[0]
+                        self.hits += 1
+                if permission is None:
+                    pending.append(note_id)
+                else:
+                    result[note_id] = permission
+            self.misses += len(pending)
+
+        if pending:
+            cur.execute(f"""
+                SELECT n.note_id, n.user_id, col.access_level, n.is_public
+                FROM note n
+                LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+                WHERE n.note_id IN ({', '.join(['%s'] * len(pending))})
+            """, (user_id, *pending))
+            found = {row[0]: row for row in cur.fetchall()}
+            expires = now + self.ttl_s
+            with self._lock:
+                user_cache = self._cache.setdefault(user_id, {})
+                self._cache.move_to_end(user_id)
+                while len(self._cache) > self.max_users:
+                    self._cache.popitem(last=False)
+                for note_id in pending:
+                    row = found.get(note_id)
+                    if row is None:
+                        permission = NotePermission(note_id, None, None, False)
+                    elif row[1] == user_id:
+                        permission = NotePermission(note_id, row[1], 'owner', True)
+                    else:
+                        # Public notes are readable by everyone
+                        level = row[2] or ('read' if row[3] else None)
+                        permission = NotePermission(note_id, row[1], level, False)
+                    user_cache[note_id] = (permission, expires)
+                    result[note_id] = permission
+
+        for note_id, permission in result.items():
+            memo[(user_id, note_id)] = permission
+        return result
+
+    def resolve_one(self, cur, user_id: int, note_id: int) -> NotePermission:
+        return self.resolve(cur, user_id, (note_id,))[int(note_id)]
+
+    def invalidate_note(self, note_id: int):
+        """Forget a note for every user (deleted, shared, or made public/private)"""
+        note_id = int(note_id)
+        with self._lock:
+            for user_cache in self._cache.values():
+                user_cache.pop(note_id, None)
+        if self.store is not None:
+            self.store.publish_invalidation('note', (note_id,))
+        memo = self._request_memo()
+        for key in [k for k in memo if k[1] == note_id]:
+            del memo[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'cached_users': len(self._cache),
+                'cached_entries': sum(len(c) for c in self._cache.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'ttl_s': self.ttl_s,
+                'shared_invalidations': self.store is not None,
+            }
+
+
+# Global instance
+_access_resolver = None
+
+
+def get_access_resolver() -> AccessResolver:
+    """Get or create the access resolver instance"""
+    global _access_resolver
+    if _access_resolver is None:
+        _access_resolver = AccessResolver(store=get_shared_store())
+    return _access_resolver
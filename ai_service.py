@@ -3,9 +3,13 @@ AI Service for Automatic Tag Suggestions using Google Gemini
 Analyzes note content and suggests relevant tags with confidence scores
 """
 
+import asyncio
+import json
 import os
 import re
 from typing import List, Dict, Tuple
+from metrics import timed
+from resilience import get_model_guard, ModelUnavailableError
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
@@ -13,6 +17,41 @@ except ImportError:
     GEMINI_AVAILABLE = False
     print("Warning: google-generativeai not installed. AI features will be disabled.")
 
+# Markdown code fences the model sometimes wraps its JSON in
+_CODE_FENCE_RE = re.compile(r'```(?:json)?\s*')
+
+
+def configure_gemini(api_key: str):
+    """
+    Configure the Gemini client
+    
+    If GEMINI_API_ENDPOINT is set (e.g. http://localhost:8089 for loadtest/fake_gemini.py),
+    requests go to that endpoint over REST instead of Google's API.
+    """
+    endpoint = os.getenv('GEMINI_API_ENDPOINT')
+    if endpoint:
+        genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+    else:
+        genai.configure(api_key=api_key)
+
+
+def async_client_supported() -> bool:
+    """
+    Whether generate_content_async can be used
+    
+    The async client needs the gRPC transport; with GEMINI_API_ENDPOINT (REST) the
+    blocking call is run on a worker thread instead.
+    """
+    return (GEMINI_AVAILABLE and not os.getenv('GEMINI_API_ENDPOINT')
+            and hasattr(genai.GenerativeModel, 'generate_content_async'))
+
+
+async def generate_content_async(model, prompt: str):
+    """Await a Gemini call without holding a thread where the client allows it"""
+    if async_client_supported():
+        return await model.generate_content_async(prompt)
+    return await asyncio.to_thread(model.generate_content, prompt)
+
 
 class AITagSuggestionService:
     """Service for generating AI-powered tag suggestions using Google Gemini"""
@@ -36,7 +75,7 @@ class AITagSuggestionService:
             return
         
         try:
-            genai.configure(api_key=self.api_key)
+            configure_gemini(self.api_key)
             # Try different model names - Google has changed model names over time
             model_names = [
                 'gemini-1.5-flash',
@@ -82,6 +121,25 @@ class AITagSuggestionService:
         """Check if AI service is available"""
         return self.model is not None and GEMINI_AVAILABLE
     
+    def _generate_content(self, prompt: str, service: str = 'tag_suggestions'):
+        """
+        Call the Gemini model, recording the call latency under the service name
+        
+        Raises:
+            ModelUnavailableError: If the call timed out or the circuit breaker is open
+        """
+        def call():
+            with timed('llm_call_ms', service=service):
+                return self.model.generate_content(prompt)
+        return get_model_guard().call(call, service)
+    
+    async def _generate_content_async(self, prompt: str, service: str = 'tag_suggestions'):
+        """Async counterpart of _generate_content (same deadline and breaker)"""
+        async def call():
+            with timed('llm_call_ms', service=service):
+                return await generate_content_async(self.model, prompt)
+        return await get_model_guard().call_async(call, service)
+    
     def extract_keywords(self, text: str) -> List[str]:
         """
         Extract keywords from text using simple NLP techniques
@@ -107,29 +165,15 @@ class AITagSuggestionService:
         keyword_counts = Counter(keywords)
         return [word for word, count in keyword_counts.most_common(10)]
     
-    def suggest_tags_with_ai(self, note_title: str, note_content: str, existing_tags: List[str] = None) -> List[Tuple[str, float]]:
-        """
-        Use Gemini AI to analyze note content and suggest relevant tags
-        
-        Args:
-            note_title: Title of the note
-            note_content: Content of the note
-            existing_tags: List of existing tags in the system (optional, for context)
-        
-        Returns:
-            List of tuples (tag_name, confidence_score) sorted by confidence
-        """
-        if not self.is_available():
-            # Fallback to keyword extraction
-            return self._fallback_suggestions(note_title, note_content, existing_tags)
+    @staticmethod
+    def _tag_prompt(note_title: str, note_content: str, existing_tags: List[str] = None) -> str:
+        """Build the tag suggestion prompt"""
+        # Prepare the prompt for Gemini
+        existing_tags_str = ""
+        if existing_tags:
+            existing_tags_str = f"\n\nExisting tags in the system: {', '.join(existing_tags[:20])}"
         
-        try:
-            # Prepare the prompt for Gemini
-            existing_tags_str = ""
-            if existing_tags:
-                existing_tags_str = f"\n\nExisting tags in the system: {', '.join(existing_tags[:20])}"
-            
-            prompt = f"""Analyze the following note and suggest 3-5 relevant tags that best describe its content, topic, and purpose.
+        prompt = f"""Analyze the following note and suggest 3-5 relevant tags that best describe its content, topic, and purpose.
 
 Note Title: {note_title}
 
@@ -149,41 +193,85 @@ Example response:
 [{{"tag": "programming", "confidence": 0.9}}, {{"tag": "python", "confidence": 0.8}}, {{"tag": "tutorial", "confidence": 0.75}}]
 
 Return only the JSON array, no other text:"""
-
-            # Generate response from Gemini
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean the response (remove markdown code blocks if present)
-            response_text = re.sub(r'```json\s*', '', response_text)
-            response_text = re.sub(r'```\s*', '', response_text)
-            response_text = response_text.strip()
-            
-            # Parse JSON response
-            import json
-            suggestions = json.loads(response_text)
-            
-            # Validate and format results
-            results = []
-            for item in suggestions:
-                if isinstance(item, dict) and 'tag' in item and 'confidence' in item:
-                    tag_name = item['tag'].lower().strip()
-                    confidence = float(item['confidence'])
-                    # Clamp confidence between 0 and 1
-                    confidence = max(0.0, min(1.0, confidence))
-                    if tag_name:
-                        results.append((tag_name, confidence))
-            
-            # Sort by confidence (descending)
-            results.sort(key=lambda x: x[1], reverse=True)
-            
-            return results[:5]  # Return top 5 suggestions
+        return prompt
+    
+    def suggest_tags_with_ai(self, note_title: str, note_content: str, existing_tags: List[str] = None) -> List[Tuple[str, float]]:
+        """
+        Use Gemini AI to analyze note content and suggest relevant tags
+        
+        Args:
+            note_title: Title of the note
+            note_content: Content of the note
+            existing_tags: List of existing tags in the system (optional, for context)
+        
+        Returns:
+            List of tuples (tag_name, confidence_score) sorted by confidence
+        """
+        if not self.is_available():
+            # Fallback to keyword extraction
+            return self._fallback_suggestions(note_title, note_content, existing_tags)
+        
+        try:
+            prompt = self._tag_prompt(note_title, note_content, existing_tags)
             
+            # Generate response from Gemini
+            response = self._generate_content(prompt)
+            return self.parse_suggestions(response.text)
+        
+        except ModelUnavailableError:
+            # Gemini is slow or the breaker is open: answer from keywords now instead of waiting
+            return self._fallback_suggestions(note_title, note_content, existing_tags)
         except Exception as e:
             print(f"Error in AI tag suggestion: {e}")
             # Fallback to keyword extraction
             return self._fallback_suggestions(note_title, note_content, existing_tags)
     
+    async def suggest_tags_with_ai_async(self, note_title: str, note_content: str, existing_tags: List[str] = None) -> List[Tuple[str, float]]:
+        """Async version of suggest_tags_with_ai, used by the ASGI server"""
+        if not self.is_available():
+            return self._fallback_suggestions(note_title, note_content, existing_tags)
+        
+        try:
+            prompt = self._tag_prompt(note_title, note_content, existing_tags)
+            response = await self._generate_content_async(prompt)
+            return self.parse_suggestions(response.text)
+        
+        except ModelUnavailableError:
+            return self._fallback_suggestions(note_title, note_content, existing_tags)
+        except Exception as e:
+            print(f"Error in AI tag suggestion: {e}")
+            return self._fallback_suggestions(note_title, note_content, existing_tags)
+    
+    @staticmethod
+    def parse_suggestions(response_text: str) -> List[Tuple[str, float]]:
+        """
+        Parse the model's JSON answer into (tag_name, confidence) tuples
+        
+        Raises:
+            ValueError: If the response is not valid JSON
+        """
+        # Clean the response (remove markdown code blocks if present)
+        response_text = _CODE_FENCE_RE.sub('', response_text.strip()).strip()
+        
+        # Parse JSON response
+        suggestions = json.loads(response_text)
+        
+        # Validate and format results
+        results = []
+        for item in suggestions:
+            if isinstance(item, dict) and 'tag' in item and 'confidence' in item:
+                tag_name = item['tag'].lower().strip()
+                confidence = float(item['confidence'])
+                # Clamp confidence between 0 and 1
+                confidence = max(0.0, min(1.0, confidence))
+                if tag_name:
+                    results.append((tag_name, confidence))
+        
+        # Sort by confidence (descending)
+        results.sort(key=lambda x: x[1], reverse=True)
+        
+        return results[:5]  # Return top 5 suggestions
+    
     def _fallback_suggestions(self, note_title: str, note_content: str, existing_tags: List[str] = None) -> List[Tuple[str, float]]:
         """
         Fallback method when AI is not available
@@ -234,7 +322,7 @@ Return only the JSON array, no other text:"""
 
 Summary:"""
             
-            response = self.model.generate_content(prompt)
+            response = self._generate_content(prompt, 'summaries')
             return response.text.strip()
         except Exception as e:
             print(f"Error generating summary: {e}")
@@ -245,7 +333,7 @@ Summary:"""
 _ai_service = None
 
 def get_ai_service(api_key: str = None) -> AITagSuggestionService:
-    """Get or create the global AI service instance"""
+    """Get or create the global AI service instance (per process; it holds only the model client)"""
     global _ai_service
     if _ai_service is None:
         _ai_service = AITagSuggestionService(api_key)
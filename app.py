@@ -1,38 +1,339 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from flask_mysqldb import MySQL
+from flask import Flask, Blueprint, render_template, request, jsonify, redirect, url_for, session, current_app
 from datetime import datetime, timedelta
 import os
+import time
+from functools import wraps
 from dotenv import load_dotenv
 from ai_service import get_ai_service
 from chatbot_service import get_chatbot
+from conversation_memory import get_conversation_memory
+from chatbot_plans import (plan_steps, plan_note_ids, resolve_references, read_page, ActionEffects, PlanError,
+                           PlanStepError, READ_ACTIONS)
+from response_utils import get_version_tracker, conditional_get, compress_response
+from serializers import (NoteRecord, NOTE_DETAIL_COLUMNS, NOTE_SEARCH_FIELDS, parse_fields, serialize_note_rows,
+                         merge_activity)
+from text_utils import compute_text_statistics, search_terms, build_snippet
+from instrumentation import init_instrumentation, add_statement_listener
+from storage import create_storage
+from access_control import get_access_resolver
+from tag_index import get_tag_index
+from facets import get_facet_index
+from typeahead import get_typeahead_cache, normalize_query, token_pattern
+from duplicates import get_duplicate_index
+from trigram_index import get_trigram_index
+from index_sync import get_index_sync
+from change_feed import get_change_feed, wait_slot, CHANGE_FEED_BUSY_RETRY_S
+from reminder_scheduler import ReminderScheduler
+from summaries import SummaryWorker, drop_stale_summary
+from autosave import get_autosave_buffer, note_version, PATCH_FIELDS, PatchError, VersionConflict
+from singleflight import get_single_flight, content_key
+from resilience import get_model_guard
+from slow_query_log import get_slow_query_recorder
+from metrics import get_metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here-change-in-production')
-
-# MySQL Configuration (from environment variables or defaults)
-app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST', 'localhost')
-app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'root')
-app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', 'admin')
-app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'pkb1')
-
-mysql = MySQL(app)
+# All routes live on this blueprint; create_app() builds an application around it
+bp = Blueprint('pkb', __name__)
+
+# Database backend: STORAGE_BACKEND=mysql (default) or sqlite (embedded file at SQLITE_PATH)
+db = create_storage()
+
+# Log statements slower than SLOW_QUERY_MS with their EXPLAIN plan (see /api/debug/slow-queries)
+add_statement_listener(get_slow_query_recorder().on_statement)
+
+# Publish 'reminder_due' events to the change feed (see /api/changes); started by the first request
+reminder_scheduler = ReminderScheduler(db)
+
+# Generates the AI summaries shown on note cards, debounced after writes; started by the first request
+summary_worker = SummaryWorker(db)
+
+@bp.before_app_request
+def start_background_services():
+    if os.getenv('REMINDER_SCHEDULER', '1') != '0':
+        reminder_scheduler.ensure_started()
+    summary_worker.ensure_started()
+    get_autosave_buffer().ensure_started()
+    get_duplicate_index().ensure_started()
+
+def create_app():
+    """Build the Flask application"""
+    app = Flask(__name__)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here-change-in-production')
+    
+    # MySQL Configuration (from environment variables or defaults)
+    app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST', 'localhost')
+    app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'root')
+    app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', 'admin')
+    app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'pkb1')
+    
+    db.init_app(app)
+    reminder_scheduler.init_app(app)
+    summary_worker.init_app(app, note_summary_stored)
+    get_autosave_buffer().init_app(app, write_note_draft)
+    get_duplicate_index().init_app(app, db)
+    
+    # Compress large JSON responses (gzip, or brotli when installed)
+    app.after_request(compress_response)
+    
+    # Route latency and SQL timing (see /api/metrics)
+    init_instrumentation(app)
+    
+    app.register_blueprint(bp)
+    return app
+
+# Tables and indexes added after the original schema, created on startup for databases that
+# predate them (same definitions as in DBMS Proj.sql and sqlite_schema.sql). Each entry is
+# (query returning a row when the object already exists, or None, statement); MySQL has no
+# CREATE INDEX IF NOT EXISTS, so its indexes are looked up in information_schema first.
+MYSQL_INDEX_EXISTS = """
+    SELECT 1 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = '{table}' AND index_name = '{index}'
+    LIMIT 1
+"""
+SCHEMA_UPGRADES = {
+    'mysql': [
+        (None, """CREATE TABLE IF NOT EXISTS note_summary (
+            note_id INT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            content_hash CHAR(40) NOT NULL,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+        )"""),
+        (None, """CREATE TABLE IF NOT EXISTS summary_failure (
+            note_id INT PRIMARY KEY,
+            content_hash CHAR(40) NOT NULL,
+            attempts INT NOT NULL,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+        )"""),
+        (MYSQL_INDEX_EXISTS.format(table='reminder', index='idx_reminder_status_due'),
+         "CREATE INDEX idx_reminder_status_due ON reminder(status, due_date)"),
+    ],
+    'sqlite': [
+        (None, """CREATE TABLE IF NOT EXISTS note_summary (
+            note_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            content_hash CHAR(40) NOT NULL,
+            generated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+        )"""),
+        (None, """CREATE TABLE IF NOT EXISTS summary_failure (
+            note_id INTEGER PRIMARY KEY,
+            content_hash CHAR(40) NOT NULL,
+            attempts INT NOT NULL,
+            failed_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+        )"""),
+        (None, "CREATE INDEX IF NOT EXISTS idx_reminder_status_due ON reminder(status, due_date)"),
+    ],
+}
+
+def warm_up(app):
+    """
+    Do the one-time startup work: AI clients, the database schema, templates
+    
+    The production entry point (wsgi.py) runs this in the master process before the
+    workers fork, so every worker starts warm and the work is done once.
+    """
+    get_ai_service()
+    get_chatbot(os.getenv('GEMINI_API_KEY'))
+    app.jinja_env.get_template('index.html')
+    with app.app_context():
+        # Opening a connection creates the SQLite schema on first use
+        cur = db.connection.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchall()
+        for exists_query, statement in SCHEMA_UPGRADES[db.name]:
+            if exists_query is not None:
+                cur.execute(exists_query)
+                if cur.fetchone() is not None:
+                    continue
+            cur.execute(statement)
+        db.connection.commit()
+        # The duplicate index is built by its own background thread in each serving process.
+        # Index writes published from here on are applied on top of this load
+        get_index_sync()
+        get_trigram_index().load(cur)
+        cur.close()
+    get_access_resolver()
+    get_version_tracker()
+    get_change_feed()
 
 # Helper function to get current user
 def get_current_user():
     return session.get('user_id', 1)  # Default to user 1 for demo
 
+# Helper function to find every user who can see a note (owner + collaborators)
+def get_note_audience(cur, note_id):
+    cur.execute("""
+        SELECT user_id FROM note WHERE note_id = %s
+        UNION
+        SELECT shared_with_user_id FROM collaboration WHERE note_id = %s
+    """, (note_id, note_id))
+    return [row[0] for row in cur.fetchall()]
+
+# Helper function to invalidate cached list responses (ETags) after a commit
+def mark_data_changed(*user_ids):
+    get_version_tracker().bump(*user_ids)
+    get_change_feed().publish(user_ids, 'data_changed')
+
+ACCESS_DENIED_MESSAGES = {
+    'read': 'You do not have access to this note',
+    'write': 'You do not have permission to edit this note',
+    'share': 'Only the owner can share this note',
+    'delete': 'Only the owner can delete this note',
+}
+
+# Helper function to check the current user's access to a note; returns an error response or None
+def note_access_error(cur, note_id, action='read'):
+    permission = get_access_resolver().resolve_one(cur, get_current_user(), note_id)
+    if not permission.exists:
+        return jsonify({'error': 'Note not found'}), 404
+    if not permission.allows(action):
+        return jsonify({'error': ACCESS_DENIED_MESSAGES[action]}), 403
+    return None
+
+# Helper function to look up who owns a reminder (None if it does not exist)
+def reminder_owner(cur, reminder_id):
+    cur.execute("SELECT user_id FROM reminder WHERE reminder_id = %s", (reminder_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+REMINDER_DENIED_MESSAGE = 'You can only complete your own reminders'
+
+# Helper function to drop cached permissions after sharing, visibility or deletion changes
+def mark_access_changed(note_id):
+    get_access_resolver().invalidate_note(note_id)
+
+# Decorator for diagnostics routes: only served in debug mode or with DEBUG_ENDPOINTS=1
+def debug_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not (current_app.debug or os.getenv('DEBUG_ENDPOINTS') == '1'):
+            return jsonify({'error': 'Not found'}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+# Helper function to refresh list responses (ETags) once a background summary was stored
+def note_summary_stored(cur, note_id):
+    mark_data_changed(*get_note_audience(cur, note_id))
+
+# Helper functions to keep the autocomplete index current after tags were attached to or detached
+# from notes (other worker processes re-read them through index_sync.py)
+def record_tag_usage(tags_by_id):
+    tag_index = get_tag_index()
+    for tag_id, tag_name in tags_by_id.items():
+        tag_index.add_tag(tag_id, tag_name)
+    tag_index.record_usage(tags_by_id)
+    get_index_sync().tags_changed(tags_by_id)
+
+def record_tag_removal(tag_ids):
+    get_tag_index().record_usage(tag_ids, -1)
+    get_index_sync().tags_changed(tag_ids)
+
+# Helper function to keep the near-duplicate and fuzzy search indexes and the note's summary current
+# after its text was written
+def index_note_text(note_id, title, content):
+    get_duplicate_index().index_note(note_id, title, content)
+    get_trigram_index().index_note(note_id, title, content)
+    get_index_sync().note_changed(note_id)
+    summary_worker.note_changed(note_id)
+
+# Helper functions to keep the fuzzy search index current after tags were attached or a note deleted
+def index_note_tags(note_id, tag_names):
+    get_trigram_index().add_tags(note_id, tag_names)
+    get_index_sync().note_changed(note_id)
+
+def unindex_note(note_id):
+    get_duplicate_index().remove_note(note_id)
+    get_trigram_index().remove_note(note_id)
+    get_index_sync().note_changed(note_id)
+
+# Helper functions for the tags/tag_mode/category/notebook filters of the note list endpoints
+def parse_facet_filters(args):
+    """Returns the filters given in the query string (empty dict if none); raises ValueError"""
+    filters = {}
+    try:
+        if args.get('tags'):
+            filters['tag_ids'] = [int(t) for t in args['tags'].split(',') if t.strip()]
+        if args.get('category'):
+            filters['category_id'] = int(args['category'])
+        if args.get('notebook'):
+            filters['notebook_id'] = int(args['notebook'])
+    except ValueError:
+        raise ValueError('tags, category and notebook must be numeric ids')
+    tag_mode = args.get('tag_mode', 'and')
+    if tag_mode not in ('and', 'or'):
+        raise ValueError("tag_mode must be 'and' or 'or'")
+    if 'tag_ids' in filters:
+        filters['tag_mode'] = tag_mode
+    return filters
+
+def user_facets(cur, user_id):
+    return get_facet_index().for_user(cur, user_id, get_version_tracker().get(user_id))
+
+def filter_rows_by_facets(cur, user_id, rows, filters):
+    """Keep the note rows (note_id first) that match the facet filters"""
+    facets = user_facets(cur, user_id)
+    selected = facets.select(**filters)
+    positions = facets.positions
+    return [row for row in rows if row[0] in positions and selected >> positions[row[0]] & 1]
+
+def serialize_search_hits(rows, fields, terms):
+    """Serialize note list rows for search results: a snippet around the terms replaces the content"""
+    # The content column is only read here, to cut the snippets; it is not sent
+    row_fields = [f for f in fields if f != 'snippet']
+    hits = serialize_note_rows(rows, row_fields) if row_fields else [{} for _ in rows]
+    if 'snippet' in fields:
+        for hit, row in zip(hits, rows):
+            hit['snippet'] = build_snippet(row[2], terms)
+    return hits
+
+def note_list_rows(cur, user_id, note_ids):
+    """Rows shaped like the note list queries for these notes, newest first"""
+    if not note_ids:
+        return []
+    cur.execute(f"""
+        SELECT n.note_id, n.title, n.content, n.is_public, n.created_at, n.updated_at,
+               c.name as category_name, nb.title as notebook_title,
+               GROUP_CONCAT(DISTINCT t.name) as tags,
+               (SELECT COUNT(*) FROM bookmark b WHERE b.note_id = n.note_id AND b.user_id = %s) as is_bookmarked,
+               CASE 
+                    WHEN n.user_id = %s THEN 'owner'
+                    WHEN col.shared_with_user_id = %s THEN 'shared'
+               END as note_type,
+               COALESCE(col.access_level, 'owner') as access_level,
+               ns.summary
+        FROM note n
+        LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+        LEFT JOIN category c ON n.category_id = c.category_id
+        LEFT JOIN notebook nb ON n.notebook_id = nb.notebook_id
+        LEFT JOIN note_tag nt ON n.note_id = nt.note_id
+        LEFT JOIN tag t ON nt.tag_id = t.tag_id
+        LEFT JOIN note_summary ns ON ns.note_id = n.note_id
+        WHERE n.note_id IN ({', '.join(['%s'] * len(note_ids))})
+        GROUP BY n.note_id, col.access_level, ns.summary
+        ORDER BY n.updated_at DESC
+    """, (user_id, user_id, user_id, user_id, *note_ids))
+    return cur.fetchall()
+
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/notes')
+@bp.route('/api/notes')
+@conditional_get(get_current_user)
 def get_notes():
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        facet_filters = parse_facet_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cur = db.connection.cursor()
     cur.execute("""
         SELECT DISTINCT n.note_id, n.title, n.content, n.is_public, n.created_at, n.updated_at,
                c.name as category_name, nb.title as notebook_title,
@@ -42,42 +343,35 @@ def get_notes():
                     WHEN n.user_id = %s THEN 'owner'
                     WHEN col.shared_with_user_id = %s THEN 'shared'
                END as note_type,
-               COALESCE(col.access_level, 'owner') as access_level
+               COALESCE(col.access_level, 'owner') as access_level,
+               ns.summary
         FROM note n
         LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
         LEFT JOIN category c ON n.category_id = c.category_id
         LEFT JOIN notebook nb ON n.notebook_id = nb.notebook_id
         LEFT JOIN note_tag nt ON n.note_id = nt.note_id
         LEFT JOIN tag t ON nt.tag_id = t.tag_id
+        LEFT JOIN note_summary ns ON ns.note_id = n.note_id
         WHERE n.user_id = %s OR col.shared_with_user_id = %s
-        GROUP BY n.note_id, col.access_level
+        GROUP BY n.note_id, col.access_level, ns.summary
         ORDER BY n.updated_at DESC
     """, (user_id, user_id, user_id, user_id, user_id, user_id))
     notes = cur.fetchall()
+    if facet_filters:
+        notes = filter_rows_by_facets(cur, user_id, notes, facet_filters)
     cur.close()
     
-    notes_list = []
-    for note in notes:
-        notes_list.append({
-            'note_id': note[0],
-            'title': note[1],
-            'content': note[2],
-            'is_public': note[3],
-            'created_at': note[4].strftime('%Y-%m-%d %H:%M'),
-            'updated_at': note[5].strftime('%Y-%m-%d %H:%M'),
-            'category': note[6],
-            'notebook': note[7],
-            'tags': note[8].split(',') if note[8] else [],
-            'is_bookmarked': bool(note[9]),
-            'note_type': note[10] if len(note) > 10 and note[10] else 'owner',
-            'access_level': note[11] if len(note) > 11 else 'owner'
-        })
+    notes_list = serialize_note_rows(notes, fields)
     
     return jsonify(notes_list)
 
-@app.route('/api/notes/<int:note_id>')
+@bp.route('/api/notes/<int:note_id>')
 def get_note(note_id):
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
     cur.execute("""
         SELECT n.note_id, n.title, n.content, n.is_public, n.created_at, n.updated_at,
                c.name as category_name, c.category_id, nb.title as notebook_title, nb.notebook_id,
@@ -94,27 +388,19 @@ def get_note(note_id):
     cur.close()
     
     if note:
-        return jsonify({
-            'note_id': note[0],
-            'title': note[1],
-            'content': note[2],
-            'is_public': note[3],
-            'created_at': note[4].strftime('%Y-%m-%d %H:%M'),
-            'updated_at': note[5].strftime('%Y-%m-%d %H:%M'),
-            'category': note[6],
-            'category_id': note[7],
-            'notebook': note[8],
-            'notebook_id': note[9],
-            'tags': note[10].split(',') if note[10] else []
-        })
+        result = NoteRecord(NOTE_DETAIL_COLUMNS, note).to_dict(NOTE_DETAIL_COLUMNS)
+        # Unsaved autosave edits are part of the note as its editors see it
+        result.update(get_autosave_buffer().current(note_id) or {})
+        result['version'] = note_version(note_fields(result))
+        return jsonify(result)
     return jsonify({'error': 'Note not found'}), 404
 
-@app.route('/api/notes', methods=['POST'])
+@bp.route('/api/notes', methods=['POST'])
 def create_note():
     data = request.json
     user_id = get_current_user()
     
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     cur.execute("""
         INSERT INTO note (user_id, title, content, is_public, category_id, notebook_id)
         VALUES (%s, %s, %s, %s, %s, %s)
@@ -124,93 +410,186 @@ def create_note():
     note_id = cur.lastrowid
     
     # Add tags (this will trigger trg_auto_todo_reminder if 'todo' tag is added)
+    added_tags = {}
     if 'tags' in data and data['tags']:
         for tag_name in data['tags']:
             cur.execute("INSERT IGNORE INTO tag (name) VALUES (%s)", (tag_name,))
             cur.execute("SELECT tag_id FROM tag WHERE name = %s", (tag_name,))
             tag_id = cur.fetchone()[0]
             cur.execute("INSERT INTO note_tag (note_id, tag_id) VALUES (%s, %s)", (note_id, tag_id))
+            added_tags[tag_id] = tag_name
     
-    mysql.connection.commit()
+    db.connection.commit()
     cur.close()
+    record_tag_usage(added_tags)
+    index_note_text(note_id, data['title'], data['content'])
+    index_note_tags(note_id, added_tags.values())
+    mark_data_changed(user_id)
+    mark_access_changed(note_id)
     
     return jsonify({'note_id': note_id, 'message': 'Note created successfully'})
 
-@app.route('/api/notes/<int:note_id>', methods=['PUT'])
+@bp.route('/api/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     data = request.json
     user_id = get_current_user()
     
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     
-    # Check if user is owner or has write access
-    cur.execute("""
-        SELECT user_id FROM note WHERE note_id = %s
-    """, (note_id,))
-    note_owner = cur.fetchone()
+    # Owners and collaborators with write access may edit
+    denied = note_access_error(cur, note_id, 'write')
+    if denied:
+        cur.close()
+        return denied
     
-    if not note_owner:
+    cur.execute("""
+        UPDATE note 
+        SET title = %s, content = %s, is_public = %s
+        WHERE note_id = %s
+    """, (data['title'], data['content'], data.get('is_public', 0), note_id))
+    drop_stale_summary(cur, note_id, data['content'])
+    audience = get_note_audience(cur, note_id)
+    db.connection.commit()
+    cur.close()
+    # The full update supersedes any pending autosave
+    get_autosave_buffer().discard(note_id)
+    index_note_text(note_id, data['title'], data['content'])
+    mark_data_changed(*audience)
+    mark_access_changed(note_id)  # is_public may have changed
+    return jsonify({'message': 'Note updated successfully'})
+
+def note_fields(values):
+    """The editable fields of a note, normalised so versions compare equal across backends"""
+    return {'title': values['title'], 'content': values['content'] or '', 'is_public': int(values['is_public'] or 0)}
+
+def write_note_draft(note_id, fields, changed, base):
+    """
+    Store a coalesced autosave: one UPDATE of the changed columns, so one history version
+
+    The UPDATE only applies while the row still holds the base fields the draft started
+    from, so a PUT committed meanwhile is never overwritten with older draft fields.
+    """
+    cur = db.connection.cursor()
+    try:
+        cur.execute("SELECT title, content, is_public FROM note WHERE note_id = %s", (note_id,))
+        row = cur.fetchone()
+        if row is None or note_fields(dict(zip(PATCH_FIELDS, row))) != base:
+            return False
+        columns = [name for name in PATCH_FIELDS if name in changed and fields[name] != base[name]]
+        if not columns:
+            return False
+        cur.execute(f"""
+            UPDATE note SET {', '.join(f'{name} = %s' for name in columns)}
+            WHERE note_id = %s AND title = %s AND COALESCE(content, '') = %s AND is_public = %s
+        """, (*[fields[name] for name in columns], note_id, base['title'], base['content'], base['is_public']))
+        if cur.rowcount == 0:
+            # Changed between the SELECT and the UPDATE
+            db.connection.rollback()
+            return False
+        if 'content' in columns:
+            drop_stale_summary(cur, note_id, fields['content'])
+        audience = get_note_audience(cur, note_id)
+        db.connection.commit()
+    finally:
         cur.close()
-        return jsonify({'error': 'Note not found'}), 404
+    index_note_text(note_id, fields['title'], fields['content'])
+    mark_data_changed(*audience)
+    if 'is_public' in columns:
+        mark_access_changed(note_id)
+    return True
+
+@bp.route('/api/notes/<int:note_id>', methods=['PATCH'])
+def patch_note(note_id):
+    """
+    Partial update for autosave: any of title, content (or content_diff splices) and
+    is_public, based on the version the client last saw
+    
+    Edits are coalesced into a draft that is written once they pause; flush=true writes
+    it now (e.g. when the editor closes).
+    """
+    data = request.json or {}
+    user_id = get_current_user()
+    if not data.get('base_version'):
+        return jsonify({'error': 'base_version is required'}), 400
     
-    # If user is owner, allow update
-    if note_owner[0] == user_id:
-        cur.execute("""
-            UPDATE note 
-            SET title = %s, content = %s, is_public = %s
-            WHERE note_id = %s
-        """, (data['title'], data['content'], data.get('is_public', 0), note_id))
-        mysql.connection.commit()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id, 'write')
+    if denied:
         cur.close()
-        return jsonify({'message': 'Note updated successfully'})
+        return denied
     
-    # Check if user has write access via collaboration
-    cur.execute("""
-        SELECT access_level FROM collaboration 
-        WHERE note_id = %s AND shared_with_user_id = %s
-    """, (note_id, user_id))
-    collab = cur.fetchone()
+    def stored_fields():
+        cur.execute("SELECT title, content, is_public FROM note WHERE note_id = %s", (note_id,))
+        return note_fields(dict(zip(PATCH_FIELDS, cur.fetchone())))
     
-    if collab and collab[0] in ['write', 'owner']:
-        cur.execute("""
-            UPDATE note 
-            SET title = %s, content = %s, is_public = %s
-            WHERE note_id = %s
-        """, (data['title'], data['content'], data.get('is_public', 0), note_id))
-        mysql.connection.commit()
+    autosave = get_autosave_buffer()
+    try:
+        if any(name in data for name in PATCH_FIELDS + ('content_diff',)):
+            result = autosave.patch(note_id, user_id, data['base_version'], data, stored_fields)
+        else:
+            draft = autosave.current(note_id)
+            fields = draft or stored_fields()
+            if note_version(fields) != data['base_version']:
+                raise VersionConflict(note_version(fields), fields)
+            result = {'version': data['base_version'], 'pending': draft is not None}
+    except VersionConflict as e:
         cur.close()
-        return jsonify({'message': 'Note updated successfully'})
-    
+        return jsonify({'error': str(e), 'version': e.version, 'note': e.fields}), 409
+    except PatchError as e:
+        cur.close()
+        return jsonify({'error': str(e)}), 400
     cur.close()
-    return jsonify({'error': 'You do not have permission to edit this note'}), 403
+    
+    result['saved'] = False
+    if data.get('flush'):
+        result['saved'] = autosave.flush(note_id)
+        result['pending'] = False
+        result.pop('save_in_s', None)
+    return jsonify(result)
 
-@app.route('/api/notes/<int:note_id>', methods=['DELETE'])
+@bp.route('/api/notes/<int:note_id>', methods=['DELETE'])
 def delete_note(note_id):
-    user_id = get_current_user()
-    cur = mysql.connection.cursor()
-    
-    # Check if user is owner (only owners can delete)
-    cur.execute("SELECT user_id FROM note WHERE note_id = %s", (note_id,))
-    note_owner = cur.fetchone()
-    
-    if not note_owner:
-        cur.close()
-        return jsonify({'error': 'Note not found'}), 404
+    cur = db.connection.cursor()
     
-    if note_owner[0] != user_id:
+    # Only owners can delete
+    denied = note_access_error(cur, note_id, 'delete')
+    if denied:
         cur.close()
-        return jsonify({'error': 'Only the owner can delete this note'}), 403
+        return denied
     
+    audience = get_note_audience(cur, note_id)
+    cur.execute("SELECT tag_id FROM note_tag WHERE note_id = %s", (note_id,))
+    tag_ids = [row[0] for row in cur.fetchall()]
     cur.execute("DELETE FROM note WHERE note_id = %s", (note_id,))
-    mysql.connection.commit()
+    db.connection.commit()
     cur.close()
+    record_tag_removal(tag_ids)
+    unindex_note(note_id)
+    get_autosave_buffer().discard(note_id)
+    mark_data_changed(*audience)
+    mark_access_changed(note_id)
     
     return jsonify({'message': 'Note deleted successfully'})
 
 # ========== NEW: Note History (from trg_note_version trigger) ==========
-@app.route('/api/notes/<int:note_id>/history')
+# Access check and ETag part for a note's history: edits bump the owner's data version,
+# which the viewer's does not follow when the note is public
+def note_history_validator(note_id):
+    cur = db.connection.cursor()
+    try:
+        denied = note_access_error(cur, note_id)
+        if denied:
+            return denied
+        cur.execute("SELECT user_id FROM note WHERE note_id = %s", (note_id,))
+        owner_id = cur.fetchone()[0]
+    finally:
+        cur.close()
+    return f"owner:{owner_id}:{get_version_tracker().get(owner_id)}"
+
+@bp.route('/api/notes/<int:note_id>/history')
+@conditional_get(get_current_user, note_history_validator)
 def get_note_history(note_id):
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     cur.execute("""
         SELECT nh.history_id, nh.title_snapshot, nh.content_snapshot, 
                nh.version_at, u.name as edited_by
@@ -231,22 +610,30 @@ def get_note_history(note_id):
     } for h in history])
 
 # ========== PROCEDURE: suggest_tag ==========
-@app.route('/api/notes/<int:note_id>/suggest-tag', methods=['POST'])
+@bp.route('/api/notes/<int:note_id>/suggest-tag', methods=['POST'])
 def suggest_tag_for_note(note_id):
     data = request.json
     tag_id = data['tag_id']
     confidence = data.get('confidence', 0.75)
     
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id, 'write')
+    if denied:
+        cur.close()
+        return denied
     cur.callproc('suggest_tag', [note_id, tag_id, confidence])
-    mysql.connection.commit()
+    db.connection.commit()
     cur.close()
     
     return jsonify({'message': 'Tag suggested successfully'})
 
-@app.route('/api/notes/<int:note_id>/tag-suggestions')
+@bp.route('/api/notes/<int:note_id>/tag-suggestions')
 def get_tag_suggestions(note_id):
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
     cur.execute("""
         SELECT ts.suggestion_id, t.tag_id, t.name, ts.confidence, ts.suggested_at
         FROM tag_suggestion ts
@@ -266,177 +653,245 @@ def get_tag_suggestions(note_id):
     } for s in suggestions])
 
 # ========== AI-POWERED AUTO TAG SUGGESTION (Gemini) ==========
-@app.route('/api/notes/<int:note_id>/ai-suggest-tags', methods=['POST'])
+def store_tag_suggestions(note_id, suggestions):
+    """Create missing tags and record new suggestions; returns the ones added"""
+    cur = db.connection.cursor()
+    results = []
+    
+    for tag_name, confidence in suggestions:
+        # Create tag if it doesn't exist
+        cur.execute("INSERT IGNORE INTO tag (name) VALUES (%s)", (tag_name,))
+        cur.execute("SELECT tag_id FROM tag WHERE name = %s", (tag_name,))
+        tag_row = cur.fetchone()
+        
+        if tag_row:
+            tag_id = tag_row[0]
+            get_tag_index().add_tag(tag_id, tag_name)
+            get_index_sync().tags_changed((tag_id,))
+            
+            # Check if suggestion already exists
+            cur.execute("""
+                SELECT suggestion_id FROM tag_suggestion 
+                WHERE note_id = %s AND tag_id = %s
+            """, (note_id, tag_id))
+            
+            if not cur.fetchone():
+                # Add suggestion using the stored procedure
+                cur.callproc('suggest_tag', [note_id, tag_id, confidence])
+                results.append({
+                    'tag_name': tag_name,
+                    'tag_id': tag_id,
+                    'confidence': confidence
+                })
+    
+    db.connection.commit()
+    cur.close()
+    return results
+
+def load_note_for_tagging(note_id):
+    """
+    Check write access and read what the tag prompt needs
+    
+    Returns:
+        (error_response, None) or (None, (title, content, existing_tags))
+    """
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id, 'write')
+    if denied:
+        cur.close()
+        return denied, None
+    cur.execute("""
+        SELECT title, content FROM note WHERE note_id = %s
+    """, (note_id,))
+    note = cur.fetchone()
+    
+    # Get existing tags for context
+    cur.execute("SELECT name FROM tag")
+    existing_tags = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return None, (note[0] or "", note[1] or "", existing_tags)
+
+AI_UNAVAILABLE_RESPONSE = {
+    'error': 'AI service not available. Please set GEMINI_API_KEY environment variable.',
+    'available': False
+}
+
+def tag_suggestion_payload(results, coalesced):
+    if results is None:
+        return {
+            'message': 'No tag suggestions generated',
+            'suggestions': [],
+            'available': True,
+            'coalesced': coalesced
+        }
+    return {
+        'message': f'Generated {len(results)} AI tag suggestions',
+        'suggestions': results,
+        'available': True,
+        'coalesced': coalesced
+    }
+
+@bp.route('/api/notes/<int:note_id>/ai-suggest-tags', methods=['POST'])
 def ai_suggest_tags(note_id):
     """Use Google Gemini AI to automatically suggest tags for a note"""
     try:
         # Get the note content
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT title, content FROM note WHERE note_id = %s
-        """, (note_id,))
-        note = cur.fetchone()
-        
-        if not note:
-            cur.close()
-            return jsonify({'error': 'Note not found'}), 404
-        
-        note_title = note[0] or ""
-        note_content = note[1] or ""
-        
-        # Get existing tags for context
-        cur.execute("SELECT name FROM tag")
-        existing_tags = [row[0] for row in cur.fetchall()]
-        cur.close()
+        denied, note = load_note_for_tagging(note_id)
+        if denied:
+            return denied
+        note_title, note_content, existing_tags = note
         
         # Get AI service instance
         ai_service = get_ai_service()
         
         if not ai_service.is_available():
-            return jsonify({
-                'error': 'AI service not available. Please set GEMINI_API_KEY environment variable.',
-                'available': False
-            }), 503
-        
-        # Get AI suggestions
-        suggestions = ai_service.suggest_tags_with_ai(note_title, note_content, existing_tags)
-        
-        if not suggestions:
-            return jsonify({
-                'message': 'No tag suggestions generated',
-                'suggestions': [],
-                'available': True
-            })
+            return jsonify(AI_UNAVAILABLE_RESPONSE), 503
         
-        # Process suggestions: create tags if they don't exist and add suggestions
-        cur = mysql.connection.cursor()
-        results = []
-        
-        for tag_name, confidence in suggestions:
-            # Create tag if it doesn't exist
-            cur.execute("INSERT IGNORE INTO tag (name) VALUES (%s)", (tag_name,))
-            cur.execute("SELECT tag_id FROM tag WHERE name = %s", (tag_name,))
-            tag_row = cur.fetchone()
-            
-            if tag_row:
-                tag_id = tag_row[0]
-                
-                # Check if suggestion already exists
-                cur.execute("""
-                    SELECT suggestion_id FROM tag_suggestion 
-                    WHERE note_id = %s AND tag_id = %s
-                """, (note_id, tag_id))
-                
-                if not cur.fetchone():
-                    # Add suggestion using the stored procedure
-                    cur.callproc('suggest_tag', [note_id, tag_id, confidence])
-                    results.append({
-                        'tag_name': tag_name,
-                        'tag_id': tag_id,
-                        'confidence': confidence
-                    })
-        
-        mysql.connection.commit()
-        cur.close()
+        # Get AI suggestions and store them. Double-clicks and parallel tabs asking for the
+        # same note content share one model call and one write (single-flight)
+        def generate_and_store():
+            suggestions = ai_service.suggest_tags_with_ai(note_title, note_content, existing_tags)
+            if not suggestions:
+                return None
+            return store_tag_suggestions(note_id, suggestions)
         
-        return jsonify({
-            'message': f'Generated {len(results)} AI tag suggestions',
-            'suggestions': results,
-            'available': True
-        })
+        key = ('ai_suggest_tags', note_id, content_key(note_title, note_content))
+        results, coalesced = get_single_flight().do(key, generate_and_store)
+        return jsonify(tag_suggestion_payload(results, coalesced))
         
     except Exception as e:
         return jsonify({'error': f'Error generating AI suggestions: {str(e)}'}), 500
 
-@app.route('/api/ai-status')
-def ai_status():
-    """Check if AI service is available"""
+def ai_status_payload():
     ai_service = get_ai_service()
-    return jsonify({
+    guard = get_model_guard().stats()
+    if not ai_service.is_available():
+        message = 'AI service not configured. Set GEMINI_API_KEY environment variable.'
+    elif guard['breaker']['state'] != 'closed':
+        message = 'AI model is failing; using keyword-based suggestions until it recovers'
+    else:
+        message = 'AI service is ready'
+    return {
         'available': ai_service.is_available(),
-        'message': 'AI service is ready' if ai_service.is_available() else 'AI service not configured. Set GEMINI_API_KEY environment variable.'
-    })
+        'message': message,
+        'circuit': guard['breaker'],
+        'timeout_s': guard['timeout_s']
+    }
+
+@bp.route('/api/ai-status')
+def ai_status():
+    """Check if AI service is available"""
+    return jsonify(ai_status_payload())
 
 # ========== PROCEDURE: share_note (Collaboration) ==========
-@app.route('/api/notes/<int:note_id>/share', methods=['POST'])
+@bp.route('/api/notes/<int:note_id>/share', methods=['POST'])
 def share_note(note_id):
     data = request.json
     shared_with_user_id = data['user_id']
     access_level = data.get('access_level', 'read')
     
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id, 'share')
+    if denied:
+        cur.close()
+        return denied
     cur.callproc('share_note', [note_id, shared_with_user_id, access_level])
-    mysql.connection.commit()
     cur.close()
+    cur = db.connection.cursor()
+    audience = get_note_audience(cur, note_id)
+    db.connection.commit()
+    cur.close()
+    mark_data_changed(*audience)
+    mark_access_changed(note_id)
     
     return jsonify({'message': 'Note shared successfully'})
 
-@app.route('/api/notes/<int:note_id>/collaborators')
+@bp.route('/api/notes/<int:note_id>/collaborators')
 def get_collaborators(note_id):
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
+    collabs = list_collaborators(cur, note_id)
+    cur.close()
+    
+    return jsonify(collabs)
+
+def list_collaborators(cur, note_id):
     cur.execute("""
         SELECT c.collab_id, u.user_id, u.name, u.email, c.access_level, c.shared_at
         FROM collaboration c
         JOIN app_user u ON c.shared_with_user_id = u.user_id
         WHERE c.note_id = %s
     """, (note_id,))
-    collabs = cur.fetchall()
-    cur.close()
-    
-    return jsonify([{
+    return [{
         'collab_id': c[0],
         'user_id': c[1],
         'name': c[2],
         'email': c[3],
         'access_level': c[4],
         'shared_at': c[5].strftime('%Y-%m-%d %H:%M')
-    } for c in collabs])
+    } for c in cur.fetchall()]
 
 # ========== PROCEDURE: mark_reminder_done ==========
-@app.route('/api/reminders/<int:reminder_id>/done', methods=['POST'])
+@bp.route('/api/reminders/<int:reminder_id>/done', methods=['POST'])
 def mark_reminder_done(reminder_id):
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    owner = reminder_owner(cur, reminder_id)
+    if owner != get_current_user():
+        cur.close()
+        if owner is None:
+            return jsonify({'error': 'Reminder not found'}), 404
+        return jsonify({'error': REMINDER_DENIED_MESSAGE}), 403
     cur.callproc('mark_reminder_done', [reminder_id])
-    mysql.connection.commit()
+    db.connection.commit()
     cur.close()
     
     return jsonify({'message': 'Reminder marked as done'})
 
 # ========== Other existing routes ==========
-@app.route('/api/categories')
+@bp.route('/api/categories')
 def get_categories():
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     cur.execute("SELECT category_id, name, description FROM category")
     categories = cur.fetchall()
     cur.close()
     
     return jsonify([{'id': c[0], 'name': c[1], 'description': c[2]} for c in categories])
 
-@app.route('/api/notebooks')
+@bp.route('/api/notebooks')
 def get_notebooks():
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    notebooks = list_notebooks(cur, user_id)
+    cur.close()
+    
+    return jsonify(notebooks)
+
+def list_notebooks(cur, user_id):
     cur.execute("""
         SELECT notebook_id, title, description, created_at 
         FROM notebook 
         WHERE user_id = %s
         ORDER BY created_at DESC
     """, (user_id,))
-    notebooks = cur.fetchall()
-    cur.close()
-    
-    return jsonify([{
+    return [{
         'id': n[0], 
         'title': n[1], 
         'description': n[2],
         'created_at': n[3].strftime('%Y-%m-%d %H:%M')
-    } for n in notebooks])
+    } for n in cur.fetchall()]
 
-@app.route('/api/notebooks/<int:notebook_id>/notes')
+@bp.route('/api/notebooks/<int:notebook_id>/notes')
 def get_notebook_notes(notebook_id):
     """Return notes inside a specific notebook for the current user (including shared notes)"""
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cur = db.connection.cursor()
     cur.execute("""
         SELECT DISTINCT n.note_id, n.title, n.content, n.is_public, n.created_at, n.updated_at,
                c.name as category_name, nb.title as notebook_title,
@@ -446,53 +901,40 @@ def get_notebook_notes(notebook_id):
                     WHEN n.user_id = %s THEN 'owner'
                     WHEN col.shared_with_user_id = %s THEN 'shared'
                END as note_type,
-               COALESCE(col.access_level, 'owner') as access_level
+               COALESCE(col.access_level, 'owner') as access_level,
+               ns.summary
         FROM note n
         LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
         LEFT JOIN category c ON n.category_id = c.category_id
         LEFT JOIN notebook nb ON n.notebook_id = nb.notebook_id
         LEFT JOIN note_tag nt ON n.note_id = nt.note_id
         LEFT JOIN tag t ON nt.tag_id = t.tag_id
+        LEFT JOIN note_summary ns ON ns.note_id = n.note_id
         WHERE (n.user_id = %s OR col.shared_with_user_id = %s)
           AND n.notebook_id = %s
-        GROUP BY n.note_id, col.access_level
+        GROUP BY n.note_id, col.access_level, ns.summary
         ORDER BY n.updated_at DESC
     """, (user_id, user_id, user_id, user_id, user_id, user_id, notebook_id))
     notes = cur.fetchall()
     cur.close()
 
-    notes_list = []
-    for note in notes:
-        notes_list.append({
-            'note_id': note[0],
-            'title': note[1],
-            'content': note[2],
-            'is_public': note[3],
-            'created_at': note[4].strftime('%Y-%m-%d %H:%M'),
-            'updated_at': note[5].strftime('%Y-%m-%d %H:%M'),
-            'category': note[6],
-            'notebook': note[7],
-            'tags': note[8].split(',') if note[8] else [],
-            'is_bookmarked': bool(note[9]),
-            'note_type': note[10] if len(note) > 10 and note[10] else 'owner',
-            'access_level': note[11] if len(note) > 11 else 'owner'
-        })
+    notes_list = serialize_note_rows(notes, fields)
 
     return jsonify(notes_list)
 
-@app.route('/api/users')
+@bp.route('/api/users')
 def get_users():
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     cur.execute("SELECT user_id, name, email FROM app_user")
     users = cur.fetchall()
     cur.close()
     
     return jsonify([{'id': u[0], 'name': u[1], 'email': u[2]} for u in users])
 
-@app.route('/api/current-user')
+@bp.route('/api/current-user')
 def get_current_user_info():
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     cur.execute("SELECT user_id, name, email FROM app_user WHERE user_id = %s", (user_id,))
     user = cur.fetchone()
     cur.close()
@@ -501,13 +943,13 @@ def get_current_user_info():
         return jsonify({'id': user[0], 'name': user[1], 'email': user[2]})
     return jsonify({'id': 1, 'name': 'Unknown', 'email': ''})
 
-@app.route('/api/set-user', methods=['POST'])
+@bp.route('/api/set-user', methods=['POST'])
 def set_current_user():
     data = request.json
     user_id = data.get('user_id')
     
     if user_id:
-        cur = mysql.connection.cursor()
+        cur = db.connection.cursor()
         cur.execute("SELECT user_id FROM app_user WHERE user_id = %s", (user_id,))
         if cur.fetchone():
             session['user_id'] = user_id
@@ -518,21 +960,41 @@ def set_current_user():
     
     return jsonify({'error': 'Invalid user_id'}), 400
 
-@app.route('/api/tags')
+@bp.route('/api/tags')
 def get_tags():
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     cur.execute("SELECT tag_id, name FROM tag")
     tags = cur.fetchall()
     cur.close()
     
     return jsonify([{'id': t[0], 'name': t[1]} for t in tags])
 
-@app.route('/api/reminders')
+@bp.route('/api/tags/autocomplete')
+def autocomplete_tags():
+    """Tags starting with ?q=, most used first (served from the in-memory prefix index)"""
+    prefix = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    # Other processes' tag writes; no database connection unless there are any
+    get_index_sync().apply(db)
+    tag_index = get_tag_index()
+    if tag_index.needs_load():
+        # No database connection at all once the index is loaded
+        cur = db.connection.cursor()
+        tag_index.load(cur)
+        cur.close()
+    return jsonify(tag_index.search(prefix, limit))
+
+@bp.route('/api/reminders')
 def get_reminders():
     user_id = get_current_user()
     status = request.args.get('status')  # e.g., 'pending', 'done', 'skipped'
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    reminders = list_reminders(cur, user_id, status)
+    cur.close()
     
+    return jsonify(reminders)
+
+def list_reminders(cur, user_id, status=None):
     if status:
         cur.execute("""
             SELECT r.reminder_id, r.reminder_text, r.due_date, r.status, n.title, n.note_id
@@ -549,22 +1011,28 @@ def get_reminders():
             WHERE r.user_id = %s
             ORDER BY r.due_date ASC
         """, (user_id,))
-    reminders = cur.fetchall()
-    cur.close()
-    
-    return jsonify([{
+    now = datetime.now()
+    return [{
         'id': r[0],
         'text': r[1],
         'due_date': r[2].strftime('%Y-%m-%d %H:%M'),
         'status': r[3],
+        'overdue': r[3] == 'pending' and r[2] < now,
         'note_title': r[4],
         'note_id': r[5]
-    } for r in reminders])
+    } for r in cur.fetchall()]
 
-@app.route('/api/bookmarks')
+@bp.route('/api/bookmarks')
+@conditional_get(get_current_user)
 def get_bookmarks():
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    bookmarks = list_bookmarks(cur, user_id)
+    cur.close()
+    
+    return jsonify(bookmarks)
+
+def list_bookmarks(cur, user_id):
     cur.execute("""
         SELECT n.note_id, n.title, n.content, b.created_at
         FROM bookmark b
@@ -572,20 +1040,21 @@ def get_bookmarks():
         WHERE b.user_id = %s
         ORDER BY b.created_at DESC
     """, (user_id,))
-    bookmarks = cur.fetchall()
-    cur.close()
-    
-    return jsonify([{
+    return [{
         'note_id': b[0],
         'title': b[1],
         'content': b[2],
         'bookmarked_at': b[3].strftime('%Y-%m-%d %H:%M')
-    } for b in bookmarks])
+    } for b in cur.fetchall()]
 
-@app.route('/api/bookmarks/<int:note_id>', methods=['POST'])
+@bp.route('/api/bookmarks/<int:note_id>', methods=['POST'])
 def toggle_bookmark(note_id):
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
     
     # Check if bookmark exists
     cur.execute("SELECT bookmark_id FROM bookmark WHERE note_id = %s AND user_id = %s", 
@@ -603,16 +1072,22 @@ def toggle_bookmark(note_id):
         message = 'Bookmark added'
         bookmarked = True
     
-    mysql.connection.commit()
+    db.connection.commit()
     cur.close()
+    mark_data_changed(user_id)
     
     return jsonify({'message': message, 'bookmarked': bookmarked})
 
-@app.route('/api/stats')
+@bp.route('/api/stats')
 def get_stats():
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    stats = user_stats(cur, user_id)
+    cur.close()
     
+    return jsonify(stats)
+
+def user_stats(cur, user_id):
     # Get various statistics - count only user's own notes
     cur.execute("SELECT COUNT(*) FROM note WHERE user_id = %s", (user_id,))
     total_notes = cur.fetchone()[0]
@@ -629,27 +1104,43 @@ def get_stats():
     cur.execute("SELECT COUNT(*) FROM bookmark WHERE user_id = %s", (user_id,))
     total_bookmarks = cur.fetchone()[0]
     
-    cur.close()
-    
-    return jsonify({
+    return {
         'total_notes': total_notes,
         'total_notebooks': total_notebooks,
         'pending_reminders': pending_reminders,
         'total_bookmarks': total_bookmarks
-    })
+    }
 
 # ========== NEW FEATURES: Search, Export, Duplicate, Statistics, Activity Feed ==========
 
-@app.route('/api/notes/search')
+@bp.route('/api/notes/search')
+@conditional_get(get_current_user)
 def search_notes():
-    """Full-text search for notes"""
+    """
+    Full-text search for notes; each hit carries a snippet around the match instead of its content
+    
+    With fuzzy=1, words may contain typos (see fuzzy_search_rows).
+    """
     user_id = get_current_user()
     query = request.args.get('q', '').strip()
     
     if not query:
         return jsonify({'error': 'Search query is required'}), 400
     
-    cur = mysql.connection.cursor()
+    try:
+        fields = parse_fields(request.args.get('fields'), NOTE_SEARCH_FIELDS)
+        facet_filters = parse_facet_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    cur = db.connection.cursor()
+    
+    if request.args.get('fuzzy') in ('1', 'true'):
+        notes, terms = fuzzy_search_rows(cur, user_id, query)
+        if facet_filters:
+            notes = filter_rows_by_facets(cur, user_id, notes, facet_filters)
+        cur.close()
+        return jsonify(serialize_search_hits(notes, fields, terms))
     
     # Search in title and content, including shared notes
     search_pattern = f'%{query}%'
@@ -662,16 +1153,18 @@ def search_notes():
                     WHEN n.user_id = %s THEN 'owner'
                     WHEN col.shared_with_user_id = %s THEN 'shared'
                END as note_type,
-               COALESCE(col.access_level, 'owner') as access_level
+               COALESCE(col.access_level, 'owner') as access_level,
+               ns.summary
         FROM note n
         LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
         LEFT JOIN category c ON n.category_id = c.category_id
         LEFT JOIN notebook nb ON n.notebook_id = nb.notebook_id
         LEFT JOIN note_tag nt ON n.note_id = nt.note_id
         LEFT JOIN tag t ON nt.tag_id = t.tag_id
+        LEFT JOIN note_summary ns ON ns.note_id = n.note_id
         WHERE (n.user_id = %s OR col.shared_with_user_id = %s)
           AND (n.title LIKE %s OR n.content LIKE %s)
-        GROUP BY n.note_id, col.access_level
+        GROUP BY n.note_id, col.access_level, ns.summary
         ORDER BY 
             CASE 
                 WHEN n.title LIKE %s THEN 1
@@ -682,31 +1175,190 @@ def search_notes():
     """, (user_id, user_id, user_id, user_id, user_id, user_id, search_pattern, search_pattern, search_pattern, search_pattern))
     
     notes = cur.fetchall()
+    if facet_filters:
+        notes = filter_rows_by_facets(cur, user_id, notes, facet_filters)
     cur.close()
     
-    notes_list = []
-    for note in notes:
-        notes_list.append({
-            'note_id': note[0],
-            'title': note[1],
-            'content': note[2],
-            'is_public': note[3],
-            'created_at': note[4].strftime('%Y-%m-%d %H:%M'),
-            'updated_at': note[5].strftime('%Y-%m-%d %H:%M'),
-            'category': note[6],
-            'notebook': note[7],
-            'tags': note[8].split(',') if note[8] else [],
-            'is_bookmarked': bool(note[9]),
-            'note_type': note[10] if len(note) > 10 and note[10] else 'owner',
-            'access_level': note[11] if len(note) > 11 else 'owner'
-        })
+    return jsonify(serialize_search_hits(notes, fields, search_terms(query)))
+
+def fuzzy_search_rows(cur, user_id, query):
+    """
+    Note list rows of the visible notes with a close match of every query word (fewest typos
+    first, then newest), and the indexed words that matched
+    """
+    get_index_sync().apply(db)
+    trigram_index = get_trigram_index()
+    if trigram_index.needs_load():
+        trigram_index.load(cur)
+    positions = user_facets(cur, user_id).positions
+    hits = [hit for hit in trigram_index.search(query) if hit[0] in positions]
+    hits.sort(key=lambda hit: (hit[1], positions[hit[0]]))
+    note_ids = [hit[0] for hit in hits]
+    rows = {row[0]: row for row in note_list_rows(cur, user_id, note_ids)}
+    terms = sorted({term for hit in hits for term in hit[2]}, key=len, reverse=True)
+    return [rows[note_id] for note_id in note_ids if note_id in rows], terms
+
+@bp.route('/api/notes/facets')
+@conditional_get(get_current_user)
+def get_note_facets():
+    """Notes matching the filters (and optional ?q= search) plus tag/category/notebook counts"""
+    user_id = get_current_user()
+    query = request.args.get('q', '').strip()
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        facet_filters = parse_facet_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(notes_list)
+    cur = db.connection.cursor()
+    facets = user_facets(cur, user_id)
+    selected = facets.select(**facet_filters)
+    
+    if query:
+        search_pattern = f'%{query}%'
+        cur.execute("""
+            SELECT n.note_id
+            FROM note n
+            LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+            WHERE (n.user_id = %s OR col.shared_with_user_id = %s)
+              AND (n.title LIKE %s OR n.content LIKE %s)
+        """, (user_id, user_id, user_id, search_pattern, search_pattern))
+        selected &= facets.bitmap_for(row[0] for row in cur.fetchall())
+    
+    note_ids = facets.note_ids_in(selected)
+    notes = note_list_rows(cur, user_id, note_ids)
+    cur.close()
+    
+    return jsonify({
+        'total': len(note_ids),
+        'notes': serialize_note_rows(notes, fields),
+        'facets': facets.counts(selected)
+    })
+
+def typeahead_match(cur, user_id, tokens, candidate_ids=None):
+    """
+    Ids of the visible notes where every token starts a word, title matches first, then newest
+
+    With candidate_ids (the answer to a query this one extends) only those notes are read,
+    by primary key; otherwise LIKE narrows the notes the user can see.
+    """
+    if candidate_ids is not None:
+        if not candidate_ids:
+            return []
+        cur.execute(f"""
+            SELECT note_id, title, content, updated_at FROM note
+            WHERE note_id IN ({', '.join(['%s'] * len(candidate_ids))})
+        """, candidate_ids)
+    else:
+        get_typeahead_cache().record_scan()
+        conditions = ' AND '.join(['(n.title LIKE %s OR n.content LIKE %s)'] * len(tokens))
+        patterns = [pattern for token in tokens for pattern in (f'%{token}%', f'%{token}%')]
+        cur.execute(f"""
+            SELECT n.note_id, n.title, n.content, n.updated_at
+            FROM note n
+            LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+            WHERE (n.user_id = %s OR col.shared_with_user_id = %s) AND {conditions}
+        """, (user_id, user_id, user_id, *patterns))
+    pattern = token_pattern(tokens)
+    matches = [(not pattern.search(title or ''), updated_at, note_id)
+               for note_id, title, content, updated_at in cur.fetchall()
+               if pattern.search(f"{title or ''}\n{content or ''}")]
+    matches.sort(key=lambda m: m[1], reverse=True)
+    matches.sort(key=lambda m: m[0])
+    return [note_id for _, _, note_id in matches]
+
+@bp.route('/api/notes/typeahead')
+@conditional_get(get_current_user)
+def typeahead_notes():
+    """Search-as-you-type: notes containing every word of q, the last one as a prefix"""
+    user_id = get_current_user()
+    query = normalize_query(request.args.get('q', ''))
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), NOTE_SEARCH_FIELDS)
+        limit = max(1, min(int(request.args.get('limit', 20)), 50))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    cache = get_typeahead_cache()
+    version = get_version_tracker().get(user_id)
+    tokens = query.split()
+    cur = db.connection.cursor()
+    note_ids, base_ids = cache.lookup(user_id, version, query)
+    if note_ids is None:
+        note_ids = typeahead_match(cur, user_id, tokens, base_ids)
+        cache.store(user_id, version, query, note_ids)
+    rows = {row[0]: row for row in note_list_rows(cur, user_id, note_ids[:limit])}
+    cur.close()
+    
+    rows = [rows[note_id] for note_id in note_ids[:limit] if note_id in rows]
+    return jsonify({
+        'query': query,
+        'total': len(note_ids),
+        'notes': serialize_search_hits(rows, fields, tokens)
+    })
+
+DUPLICATE_INDEX_LOADING_RESPONSE = {'error': 'The duplicate index is still being built', 'retry_in_s': 2}
+
+def note_titles(cur, note_ids):
+    if not note_ids:
+        return {}
+    cur.execute(f"SELECT note_id, title FROM note WHERE note_id IN ({', '.join(['%s'] * len(note_ids))})",
+                tuple(note_ids))
+    return dict(cur.fetchall())
+
+@bp.route('/api/notes/<int:note_id>/duplicates')
+def get_note_duplicates(note_id):
+    """Notes the current user can see whose content nearly matches this one"""
+    user_id = get_current_user()
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
+    
+    get_index_sync().apply(db)
+    duplicate_index = get_duplicate_index()
+    if not duplicate_index.loaded:
+        cur.close()
+        return jsonify(DUPLICATE_INDEX_LOADING_RESPONSE), 503
+    visible = user_facets(cur, user_id).positions
+    duplicates = duplicate_index.similar_to(note_id, visible, limit)
+    titles = note_titles(cur, [item['note_id'] for item in duplicates])
+    cur.close()
+    for item in duplicates:
+        item['title'] = titles.get(item['note_id'])
+    
+    return jsonify({'note_id': note_id, 'duplicates': duplicates})
 
-@app.route('/api/notes/<int:note_id>/export')
+@bp.route('/api/notes/duplicates')
+def get_duplicate_report():
+    """Groups of near-duplicate notes among everything the current user can see"""
+    user_id = get_current_user()
+    get_index_sync().apply(db)
+    duplicate_index = get_duplicate_index()
+    if not duplicate_index.loaded:
+        return jsonify(DUPLICATE_INDEX_LOADING_RESPONSE), 503
+    cur = db.connection.cursor()
+    visible = user_facets(cur, user_id).positions
+    groups = duplicate_index.report(visible)
+    titles = note_titles(cur, [note_id for group in groups for note_id in group['note_ids']])
+    cur.close()
+    for group in groups:
+        group['notes'] = [{'note_id': note_id, 'title': titles.get(note_id)} for note_id in group.pop('note_ids')]
+    
+    return jsonify({'groups': groups, 'threshold': duplicate_index.threshold})
+
+@bp.route('/api/notes/<int:note_id>/export')
 def export_note(note_id):
     """Export note to Markdown format"""
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
     cur.execute("""
         SELECT n.note_id, n.title, n.content, n.created_at, n.updated_at,
                c.name as category_name, nb.title as notebook_title,
@@ -759,11 +1411,15 @@ def export_note(note_id):
         'filename': f"{title.replace(' ', '_')}_{note_id}.md"
     })
 
-@app.route('/api/notes/<int:note_id>/duplicate', methods=['POST'])
+@bp.route('/api/notes/<int:note_id>/duplicate', methods=['POST'])
 def duplicate_note(note_id):
     """Duplicate/clone a note"""
     user_id = get_current_user()
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
     
     # Get original note
     cur.execute("""
@@ -787,63 +1443,43 @@ def duplicate_note(note_id):
     
     # Copy tags
     cur.execute("""
-        SELECT tag_id FROM note_tag WHERE note_id = %s
+        SELECT nt.tag_id, t.name FROM note_tag nt JOIN tag t ON t.tag_id = nt.tag_id WHERE nt.note_id = %s
     """, (note_id,))
     tags = cur.fetchall()
     for tag_row in tags:
         cur.execute("INSERT INTO note_tag (note_id, tag_id) VALUES (%s, %s)", (new_note_id, tag_row[0]))
     
-    mysql.connection.commit()
+    db.connection.commit()
     cur.close()
+    record_tag_usage(dict(tags))
+    index_note_text(new_note_id, new_title, original[1])
+    index_note_tags(new_note_id, [tag_row[1] for tag_row in tags])
+    mark_data_changed(user_id)
+    mark_access_changed(new_note_id)
     
     return jsonify({'note_id': new_note_id, 'message': 'Note duplicated successfully'})
 
-@app.route('/api/notes/<int:note_id>/statistics')
+@bp.route('/api/notes/<int:note_id>/statistics')
 def get_note_statistics(note_id):
     """Get note statistics (word count, reading time, etc.)"""
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
+    denied = note_access_error(cur, note_id)
+    if denied:
+        cur.close()
+        return denied
     cur.execute("SELECT title, content FROM note WHERE note_id = %s", (note_id,))
     note = cur.fetchone()
     cur.close()
     
-    if not note:
-        return jsonify({'error': 'Note not found'}), 404
-    
-    title = note[0] or ''
-    content = note[1] or ''
-    full_text = f"{title} {content}"
-    
-    # Calculate statistics
-    word_count = len(full_text.split())
-    char_count = len(full_text)
-    char_count_no_spaces = len(full_text.replace(' ', ''))
-    
-    # Reading time (average 200 words per minute)
-    reading_time_minutes = max(1, round(word_count / 200))
-    
-    # Paragraph count
-    paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-    paragraph_count = len(paragraphs)
-    
-    # Line count
-    line_count = len(content.split('\n'))
-    
-    return jsonify({
-        'word_count': word_count,
-        'character_count': char_count,
-        'character_count_no_spaces': char_count_no_spaces,
-        'reading_time_minutes': reading_time_minutes,
-        'paragraph_count': paragraph_count,
-        'line_count': line_count
-    })
+    return jsonify(compute_text_statistics(note[0], note[1]))
 
-@app.route('/api/activity')
+@bp.route('/api/activity')
 def get_activity_feed():
     """Get recent activity feed"""
     user_id = get_current_user()
     limit = int(request.args.get('limit', 20))
     
-    cur = mysql.connection.cursor()
+    cur = db.connection.cursor()
     
     # Get recent note updates
     cur.execute("""
@@ -855,17 +1491,7 @@ def get_activity_feed():
         ORDER BY n.updated_at DESC
         LIMIT %s
     """, (user_id, limit))
-    
-    activities = []
-    for row in cur.fetchall():
-        activities.append({
-            'type': row[4],
-            'note_id': row[0],
-            'title': row[1],
-            'timestamp': row[2].strftime('%Y-%m-%d %H:%M:%S'),
-            'user': row[3],
-            'description': f"Updated note: {row[1]}"
-        })
+    note_rows = cur.fetchall()
     
     # Get recent reminders
     cur.execute("""
@@ -876,27 +1502,13 @@ def get_activity_feed():
         ORDER BY r.due_date DESC
         LIMIT 10
     """, (user_id,))
-    
-    for row in cur.fetchall():
-        activities.append({
-            'type': 'reminder',
-            'reminder_id': row[0],
-            'note_id': row[5],
-            'title': row[4],
-            'timestamp': row[2].strftime('%Y-%m-%d %H:%M:%S'),
-            'status': row[3],
-            'description': f"Reminder: {row[1]}"
-        })
-    
-    # Sort by timestamp
-    activities.sort(key=lambda x: x['timestamp'], reverse=True)
-    activities = activities[:limit]
+    reminder_rows = cur.fetchall()
     
     cur.close()
     
-    return jsonify(activities)
+    return jsonify(merge_activity(note_rows, reminder_rows, limit))
 
-@app.route('/api/templates')
+@bp.route('/api/templates')
 def get_note_templates():
     """Get available note templates"""
     templates = [
@@ -1026,7 +1638,7 @@ def get_note_templates():
     
     return jsonify(templates)
 
-@app.route('/api/templates/<template_id>')
+@bp.route('/api/templates/<template_id>')
 def get_note_template(template_id):
     """Get a specific note template"""
     templates = {
@@ -1159,8 +1771,156 @@ def get_note_template(template_id):
     
     return jsonify(templates[template_id])
 
+# ========== CHANGE FEED ==========
+@bp.route('/api/changes')
+def get_changes():
+    """
+    Events for the current user after a cursor: 'data_changed' and 'reminder_due'
+    
+    Pass the returned cursor as ?since= on the next call; ?wait=N long-polls for up to N seconds.
+    When all of this process's long-poll slots are taken, the answer comes at once with
+    retry_in_s, so waiting tabs cannot use up the threads other requests need.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        wait = float(request.args.get('wait', 0))
+        limit = min(int(request.args.get('limit', 100)), 500)
+    except ValueError:
+        return jsonify({'error': 'since, wait and limit must be numbers'}), 400
+    if wait <= 0:
+        return jsonify(get_change_feed().read(get_current_user(), since, limit))
+    with wait_slot() as granted:
+        result = get_change_feed().read(get_current_user(), since, limit, wait if granted else 0)
+    if not granted:
+        result['retry_in_s'] = CHANGE_FEED_BUSY_RETRY_S
+    return jsonify(result)
+
+# ========== METRICS & DIAGNOSTICS ==========
+@bp.route('/api/metrics')
+@debug_only
+def get_app_metrics():
+    """Route latency histograms, SQL statement timings and AI model call latency"""
+    snapshot = get_metrics().snapshot()
+    snapshot['db_pool'] = db.pool_state()
+    snapshot['access_cache'] = get_access_resolver().stats()
+    snapshot['tag_index'] = get_tag_index().stats()
+    snapshot['facets'] = get_facet_index().stats()
+    snapshot['typeahead'] = get_typeahead_cache().stats()
+    snapshot['duplicates'] = get_duplicate_index().stats()
+    snapshot['fuzzy_search'] = get_trigram_index().stats()
+    snapshot['index_sync'] = get_index_sync().stats()
+    snapshot['reminder_scheduler'] = reminder_scheduler.stats()
+    snapshot['summaries'] = summary_worker.stats()
+    snapshot['autosave'] = get_autosave_buffer().stats()
+    snapshot['change_feed'] = get_change_feed().stats()
+    snapshot['single_flight'] = {'in_flight': get_single_flight().in_flight()}
+    snapshot['conversation_memory'] = get_conversation_memory().stats()
+    return jsonify(snapshot)
+
+@bp.route('/api/metrics/reset', methods=['POST'])
+@debug_only
+def reset_app_metrics():
+    """Clear all recorded metrics"""
+    get_metrics().reset()
+    return jsonify({'message': 'Metrics reset'})
+
+@bp.route('/api/debug/test-connection')
+@debug_only
+def test_connection():
+    """Ping the database and report round-trip time and connection state"""
+    try:
+        start = time.perf_counter()
+        cur = db.connection.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        ping_ms = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        return jsonify({
+            'connected': False,
+            'error': str(e),
+            'pool': db.pool_state()
+        }), 500
+
+    return jsonify({
+        'connected': True,
+        'ping_ms': round(ping_ms, 3),
+        **db.describe(),
+        'pool': db.pool_state()
+    })
+
+@bp.route('/api/debug/slow-queries')
+@debug_only
+def get_slow_queries():
+    """Slow statements aggregated by query fingerprint, slowest total time first"""
+    source = request.args.get('source', 'memory')
+    if source not in ('memory', 'log'):
+        return jsonify({'error': "source must be 'memory' or 'log'"}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    recorder = get_slow_query_recorder()
+    return jsonify({
+        'threshold_ms': recorder.threshold_ms,
+        'source': source,
+        'queries': recorder.report(source, limit)
+    })
+
 # ========== AI CHATBOT ENDPOINT ==========
-@app.route('/api/chatbot', methods=['POST'])
+CHATBOT_UNAVAILABLE_RESPONSE = {
+    'error': 'Chatbot not available. Please set GEMINI_API_KEY in .env file.',
+    'action': 'answer',
+    'message': 'I\'m sorry, the AI chatbot is not available. Please set GEMINI_API_KEY in your .env file.'
+}
+
+def build_chatbot_context(user_id):
+    """Current user and a sample of their data, so the model can resolve names to ids"""
+    context = {}
+    
+    # Get current user info
+    cur = db.connection.cursor()
+    cur.execute("SELECT user_id, name, email FROM app_user WHERE user_id = %s", (user_id,))
+    user = cur.fetchone()
+    if user:
+        context['current_user'] = {'id': user[0], 'name': user[1], 'email': user[2]}
+    
+    # Get available data (limited to avoid overwhelming the AI)
+    cur.execute("SELECT note_id, title FROM note WHERE user_id = %s ORDER BY updated_at DESC LIMIT 10", (user_id,))
+    context['notes'] = [{'id': n[0], 'title': n[1]} for n in cur.fetchall()]
+    
+    cur.execute("SELECT notebook_id, title FROM notebook WHERE user_id = %s LIMIT 10", (user_id,))
+    context['notebooks'] = [{'id': n[0], 'title': n[1]} for n in cur.fetchall()]
+    
+    cur.execute("SELECT category_id, name FROM category LIMIT 10")
+    context['categories'] = [{'id': c[0], 'name': c[1]} for c in cur.fetchall()]
+    
+    cur.execute("SELECT tag_id, name FROM tag LIMIT 20")
+    context['tags'] = [{'id': t[0], 'name': t[1]} for t in cur.fetchall()]
+    
+    cur.execute("SELECT user_id, name, email FROM app_user LIMIT 10")
+    context['users'] = [{'id': u[0], 'name': u[1], 'email': u[2]} for u in cur.fetchall()]
+    
+    cur.close()
+    
+    # Earlier exchanges, so follow-ups like "delete that one" can be resolved
+    context['conversation'] = get_conversation_memory().context_for(user_id)
+    return context
+
+def match_local_chatbot_intent(chatbot, user_id, user_message):
+    """Action for an unambiguous command, parsed without a model call (None if the model is needed)"""
+    result = chatbot.parse_local_intent(user_message, get_conversation_memory().context_for(user_id))
+    if result is not None:
+        get_metrics().increment('chatbot_local_intents', action=result['action'])
+    return result
+
+def wants_summary(result, execution_result):
+    """Whether read results go back to the model for a short answer (only when it asked for that)"""
+    return bool(result.get('summarize') and execution_result and execution_result.get('success')
+                and (execution_result.get('items') or execution_result.get('item')))
+
+def remember_chatbot_exchange(user_id, user_message, result, execution_result):
+    get_conversation_memory().record(user_id, user_message, result, execution_result)
+
+@bp.route('/api/chatbot', methods=['POST'])
 def chatbot():
     """Process chatbot messages and execute operations"""
     try:
@@ -1172,56 +1932,40 @@ def chatbot():
         
         # Get chatbot instance
         chatbot = get_chatbot(os.getenv('GEMINI_API_KEY'))
-        
-        if not chatbot.is_available():
-            return jsonify({
-                'error': 'Chatbot not available. Please set GEMINI_API_KEY in .env file.',
-                'action': 'answer',
-                'message': 'I\'m sorry, the AI chatbot is not available. Please set GEMINI_API_KEY in your .env file.'
-            }), 503
-        
-        # Gather context for the chatbot
         user_id = get_current_user()
-        context = {}
-        
-        # Get current user info
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT user_id, name, email FROM app_user WHERE user_id = %s", (user_id,))
-        user = cur.fetchone()
-        if user:
-            context['current_user'] = {'id': user[0], 'name': user[1], 'email': user[2]}
-        
-        # Get available data (limited to avoid overwhelming the AI)
-        cur.execute("SELECT note_id, title FROM note WHERE user_id = %s ORDER BY updated_at DESC LIMIT 10", (user_id,))
-        context['notes'] = [{'id': n[0], 'title': n[1]} for n in cur.fetchall()]
-        
-        cur.execute("SELECT notebook_id, title FROM notebook WHERE user_id = %s LIMIT 10", (user_id,))
-        context['notebooks'] = [{'id': n[0], 'title': n[1]} for n in cur.fetchall()]
         
-        cur.execute("SELECT category_id, name FROM category LIMIT 10")
-        context['categories'] = [{'id': c[0], 'name': c[1]} for c in cur.fetchall()]
-        
-        cur.execute("SELECT tag_id, name FROM tag LIMIT 20")
-        context['tags'] = [{'id': t[0], 'name': t[1]} for t in cur.fetchall()]
-        
-        cur.execute("SELECT user_id, name, email FROM app_user LIMIT 10")
-        context['users'] = [{'id': u[0], 'name': u[1], 'email': u[2]} for u in cur.fetchall()]
-        
-        cur.close()
+        # Simple commands ("bookmark note 12") need neither the model nor its context
+        local_result = match_local_chatbot_intent(chatbot, user_id, user_message)
+        if local_result is None:
+            if not chatbot.is_available():
+                return jsonify(CHATBOT_UNAVAILABLE_RESPONSE), 503
+            # Gather context for the chatbot
+            context = build_chatbot_context(user_id)
         
-        # Process the message
-        result = chatbot.process_message(user_message, context)
+        # Process the message and execute the action if it's an operation. A resubmitted
+        # message joins the in-flight call instead of running (and acting) twice
+        def process_and_execute():
+            result = local_result or chatbot.process_message(user_message, context)
+            execution_result = None
+            if result.get('action') != 'answer' and result.get('action') != 'clarify':
+                execution_result = execute_chatbot_action(result, user_id)
+            if wants_summary(result, execution_result):
+                summary = chatbot.summarize_results(user_message, execution_result)
+                if summary:
+                    result = {**result, 'message': summary}
+            remember_chatbot_exchange(user_id, user_message, result, execution_result)
+            return result, execution_result
         
-        # Execute the action if it's an operation
-        execution_result = None
-        if result.get('action') != 'answer' and result.get('action') != 'clarify':
-            execution_result = execute_chatbot_action(result, user_id)
+        key = ('chatbot', user_id, content_key(user_message))
+        (result, execution_result), coalesced = get_single_flight().do(key, process_and_execute)
         
         # Return response
         response = {
             'action': result.get('action', 'answer'),
             'message': result.get('message', ''),
-            'execution_result': execution_result
+            'execution_result': execution_result,
+            'coalesced': coalesced,
+            'local': local_result is not None
         }
         
         return jsonify(response)
@@ -1233,136 +1977,409 @@ def chatbot():
             'message': f'I encountered an error: {str(e)}. Please try again.'
         }), 500
 
+@bp.route('/api/chatbot/memory', methods=['DELETE'])
+def clear_chatbot_memory():
+    """Forget the current user's conversation with the chatbot"""
+    get_conversation_memory().clear(get_current_user())
+    return jsonify({'message': 'Conversation cleared'})
+
 def execute_chatbot_action(action_result: dict, user_id: int):
-    """Execute the action determined by the chatbot"""
-    action = action_result.get('action')
-    params = action_result.get('parameters', {})
+    """
+    Execute the action (or the plan of actions) determined by the chatbot
+    
+    Every step runs on one cursor in one transaction: the plan commits as a whole, or a
+    failing step rolls all of it back. Caches and indexes are updated after the commit.
+    """
+    if action_result.get('action') in READ_ACTIONS:
+        return execute_chatbot_read(action_result, user_id)
+    try:
+        steps = plan_steps(action_result)
+    except PlanError as e:
+        return {'success': False, 'message': str(e)}
     
+    effects = ActionEffects()
+    outputs = []
+    cur = db.connection.cursor()
     try:
-        cur = mysql.connection.cursor()
-        
-        if action == 'create_note':
-            title = params.get('title', 'Untitled Note')
-            content = params.get('content', '')
-            category_id = params.get('category_id')
-            notebook_id = params.get('notebook_id')
-            tags = params.get('tags', [])
-            is_public = params.get('is_public', False)
-            
-            cur.execute("""
-                INSERT INTO note (user_id, title, content, is_public, category_id, notebook_id)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (user_id, title, content, 1 if is_public else 0, category_id, notebook_id))
-            
-            note_id = cur.lastrowid
-            
-            # Add tags
-            for tag_name in tags:
-                cur.execute("INSERT IGNORE INTO tag (name) VALUES (%s)", (tag_name,))
-                cur.execute("SELECT tag_id FROM tag WHERE name = %s", (tag_name,))
-                tag_row = cur.fetchone()
-                if tag_row:
-                    tag_id = tag_row[0]
-                    cur.execute("INSERT IGNORE INTO note_tag (note_id, tag_id) VALUES (%s, %s)", (note_id, tag_id))
-            
-            mysql.connection.commit()
-            cur.close()
-            return {'success': True, 'note_id': note_id, 'message': f'Note "{title}" created successfully!'}
-        
-        elif action == 'create_notebook':
-            title = params.get('title', 'Untitled Notebook')
-            description = params.get('description', '')
-            
-            cur.execute("""
-                INSERT INTO notebook (user_id, title, description)
-                VALUES (%s, %s, %s)
-            """, (user_id, title, description))
-            
-            notebook_id = cur.lastrowid
-            mysql.connection.commit()
-            cur.close()
-            return {'success': True, 'notebook_id': notebook_id, 'message': f'Notebook "{title}" created successfully!'}
-        
-        elif action == 'bookmark_note':
-            note_id = params.get('note_id')
-            if note_id:
-                cur.execute("INSERT IGNORE INTO bookmark (note_id, user_id) VALUES (%s, %s)", (note_id, user_id))
-                mysql.connection.commit()
-                cur.close()
-                return {'success': True, 'message': 'Note bookmarked!'}
-        
-        elif action == 'unbookmark_note':
-            note_id = params.get('note_id')
-            if note_id:
-                cur.execute("DELETE FROM bookmark WHERE note_id = %s AND user_id = %s", (note_id, user_id))
-                mysql.connection.commit()
+        # One permission query for every note the plan names; each step's check then hits the request memo
+        get_access_resolver().resolve(cur, user_id, plan_note_ids(steps))
+        for number, step in enumerate(steps, start=1):
+            params = resolve_references(step['parameters'], steps, outputs)
+            try:
+                outputs.append(CHATBOT_ACTION_STEPS[step['action']](cur, user_id, params, effects))
+            except PlanStepError as e:
+                if len(steps) == 1:
+                    raise
+                raise PlanStepError(f'Step {number} ({step["action"]}) failed: {e}') from e
+            if step['action'] in ('share_note', 'mark_reminder_done'):
+                # MySQL needs a fresh cursor after CALL
                 cur.close()
-                return {'success': True, 'message': 'Bookmark removed!'}
-        
-        elif action == 'delete_note':
-            note_id = params.get('note_id')
-            if note_id:
-                # Check ownership
-                cur.execute("SELECT user_id FROM note WHERE note_id = %s", (note_id,))
-                note_owner = cur.fetchone()
-                if note_owner and note_owner[0] == user_id:
-                    cur.execute("DELETE FROM note WHERE note_id = %s", (note_id,))
-                    mysql.connection.commit()
-                    cur.close()
-                    return {'success': True, 'message': 'Note deleted successfully!'}
-                else:
-                    cur.close()
-                    return {'success': False, 'message': 'You can only delete your own notes.'}
-        
-        elif action == 'update_note':
-            note_id = params.get('note_id')
-            if note_id:
-                updates = []
-                values = []
-                
-                if 'title' in params:
-                    updates.append("title = %s")
-                    values.append(params['title'])
-                if 'content' in params:
-                    updates.append("content = %s")
-                    values.append(params['content'])
-                if 'is_public' in params:
-                    updates.append("is_public = %s")
-                    values.append(1 if params['is_public'] else 0)
-                
-                if updates:
-                    values.append(note_id)
-                    cur.execute(f"UPDATE note SET {', '.join(updates)} WHERE note_id = %s", tuple(values))
-                    mysql.connection.commit()
-                    cur.close()
-                    return {'success': True, 'message': 'Note updated successfully!'}
-        
-        elif action == 'share_note':
-            note_id = params.get('note_id')
-            shared_user_id = params.get('user_id')
-            access_level = params.get('access_level', 'read')
-            
-            if note_id and shared_user_id:
-                cur.callproc('share_note', [note_id, shared_user_id, access_level])
-                mysql.connection.commit()
-                cur.close()
-                return {'success': True, 'message': f'Note shared with user {shared_user_id}!'}
-        
-        elif action == 'mark_reminder_done':
-            reminder_id = params.get('reminder_id')
-            if reminder_id:
-                cur.callproc('mark_reminder_done', [reminder_id])
-                mysql.connection.commit()
-                cur.close()
-                return {'success': True, 'message': 'Reminder marked as done!'}
-        
+                cur = db.connection.cursor()
+        db.connection.commit()
+    except Exception as e:
+        db.connection.rollback()
+        for note_id in effects.access_notes:
+            mark_access_changed(note_id)
+        message = str(e) if isinstance(e, PlanStepError) else f'Error executing action: {str(e)}'
+        if len(steps) > 1:
+            message += '. Nothing was changed.'
+        return {'success': False, 'message': message}
+    finally:
         cur.close()
-        return {'success': False, 'message': f'Action "{action}" not implemented or invalid parameters.'}
-        
+    
+    apply_action_effects(effects)
+    if len(steps) == 1:
+        return {'success': True, **outputs[0]}
+    return {
+        'success': True,
+        'note_id': effects.last_note_id,
+        'message': ' '.join(output['message'] for output in outputs),
+        'steps': outputs
+    }
+
+def apply_action_effects(effects):
+    for tags_by_id in effects.tags_added:
+        record_tag_usage(tags_by_id)
+    record_tag_removal(effects.tags_removed)
+    for note_id, (title, content) in effects.texts.items():
+        index_note_text(note_id, title, content)
+    for note_id, tag_names in effects.note_tags.items():
+        index_note_tags(note_id, tag_names)
+    for note_id in effects.deleted_notes:
+        unindex_note(note_id)
+    mark_data_changed(*effects.changed_users)
+    for note_id in effects.access_notes:
+        mark_access_changed(note_id)
+
+def require_note_access(cur, user_id, note_id, action):
+    if not get_access_resolver().resolve_one(cur, user_id, note_id).allows(action):
+        raise PlanStepError(ACCESS_DENIED_MESSAGES[action])
+
+def attach_tags(cur, note_id, tag_names, effects):
+    """Create missing tags and attach them to a note with batched statements"""
+    names = list(dict.fromkeys(name.strip() for name in tag_names if name and name.strip()))
+    missing = [name for name in names if name.lower() not in effects.tag_ids]
+    if missing:
+        cur.executemany("INSERT IGNORE INTO tag (name) VALUES (%s)", [(name,) for name in missing])
+        cur.execute(f"SELECT tag_id, name FROM tag WHERE name IN ({', '.join(['%s'] * len(missing))})",
+                    tuple(missing))
+        for tag_id, name in cur.fetchall():
+            effects.tag_ids[name.lower()] = tag_id
+    cur.execute("SELECT tag_id FROM note_tag WHERE note_id = %s", (note_id,))
+    existing = {row[0] for row in cur.fetchall()}
+    added = {}
+    for name in names:
+        tag_id = effects.tag_ids.get(name.lower())
+        if tag_id is not None and tag_id not in existing:
+            added[tag_id] = name
+    if added:
+        cur.executemany("INSERT IGNORE INTO note_tag (note_id, tag_id) VALUES (%s, %s)",
+                        [(note_id, tag_id) for tag_id in added])
+        effects.tags_added.append(added)
+        effects.note_tags.setdefault(note_id, []).extend(added.values())
+    return added
+
+def chatbot_create_note(cur, user_id, params, effects):
+    title = params.get('title') or 'Untitled Note'
+    content = params.get('content', '')
+    cur.execute("""
+        INSERT INTO note (user_id, title, content, is_public, category_id, notebook_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (user_id, title, content, 1 if params.get('is_public') else 0,
+          params.get('category_id'), params.get('notebook_id')))
+    note_id = cur.lastrowid
+    # (this will trigger trg_auto_todo_reminder if 'todo' tag is added)
+    attach_tags(cur, note_id, params.get('tags') or [], effects)
+    effects.note_text(note_id, title, content)
+    effects.changed_users.add(user_id)
+    effects.access_notes.add(note_id)
+    effects.last_note_id = note_id
+    return {'note_id': note_id, 'message': f'Note "{title}" created successfully!'}
+
+def chatbot_create_notebook(cur, user_id, params, effects):
+    title = params.get('title') or 'Untitled Notebook'
+    cur.execute("""
+        INSERT INTO notebook (user_id, title, description)
+        VALUES (%s, %s, %s)
+    """, (user_id, title, params.get('description', '')))
+    return {'notebook_id': cur.lastrowid, 'message': f'Notebook "{title}" created successfully!'}
+
+def chatbot_update_note(cur, user_id, params, effects):
+    note_id = params['note_id']
+    require_note_access(cur, user_id, note_id, 'write')
+    updates = []
+    values = []
+    if 'title' in params:
+        updates.append("title = %s")
+        values.append(params['title'])
+    if 'content' in params:
+        updates.append("content = %s")
+        values.append(params['content'])
+    if 'is_public' in params:
+        updates.append("is_public = %s")
+        values.append(1 if params['is_public'] else 0)
+    if not updates:
+        raise PlanStepError('Nothing to update')
+    values.append(note_id)
+    cur.execute(f"UPDATE note SET {', '.join(updates)} WHERE note_id = %s", tuple(values))
+    cur.execute("SELECT title, content FROM note WHERE note_id = %s", (note_id,))
+    title, content = cur.fetchone()
+    drop_stale_summary(cur, note_id, content)
+    effects.note_text(note_id, title, content)
+    effects.changed_users.update(get_note_audience(cur, note_id))
+    effects.access_notes.add(note_id)
+    effects.last_note_id = note_id
+    return {'note_id': note_id, 'message': 'Note updated successfully!'}
+
+def chatbot_delete_note(cur, user_id, params, effects):
+    note_id = params['note_id']
+    permission = get_access_resolver().resolve_one(cur, user_id, note_id)
+    if not permission.allows('delete'):
+        raise PlanStepError('You can only delete your own notes.' if permission.exists else 'Note not found')
+    effects.changed_users.update(get_note_audience(cur, note_id))
+    cur.execute("SELECT tag_id FROM note_tag WHERE note_id = %s", (note_id,))
+    effects.tags_removed.extend(row[0] for row in cur.fetchall())
+    cur.execute("DELETE FROM note WHERE note_id = %s", (note_id,))
+    effects.note_deleted(note_id)
+    effects.access_notes.add(note_id)
+    return {'note_id': note_id, 'message': 'Note deleted successfully!'}
+
+def chatbot_add_tags_to_note(cur, user_id, params, effects):
+    note_id = params['note_id']
+    require_note_access(cur, user_id, note_id, 'write')
+    added = attach_tags(cur, note_id, params['tags'], effects)
+    effects.changed_users.update(get_note_audience(cur, note_id))
+    effects.last_note_id = note_id
+    if not added:
+        return {'note_id': note_id, 'message': f'Note {note_id} already has those tags.'}
+    return {'note_id': note_id, 'message': f'Tagged note {note_id} with {", ".join(added.values())}.'}
+
+def chatbot_bookmark_note(cur, user_id, params, effects):
+    note_id = params['note_id']
+    require_note_access(cur, user_id, note_id, 'read')
+    cur.execute("INSERT IGNORE INTO bookmark (note_id, user_id) VALUES (%s, %s)", (note_id, user_id))
+    effects.changed_users.add(user_id)
+    effects.last_note_id = note_id
+    return {'note_id': note_id, 'message': 'Note bookmarked!'}
+
+def chatbot_unbookmark_note(cur, user_id, params, effects):
+    cur.execute("DELETE FROM bookmark WHERE note_id = %s AND user_id = %s", (params['note_id'], user_id))
+    effects.changed_users.add(user_id)
+    return {'note_id': params['note_id'], 'message': 'Bookmark removed!'}
+
+def chatbot_share_note(cur, user_id, params, effects):
+    note_id = params['note_id']
+    shared_user_id = params['user_id']
+    require_note_access(cur, user_id, note_id, 'share')
+    cur.callproc('share_note', [note_id, shared_user_id, params.get('access_level', 'read')])
+    effects.changed_users.update(get_note_audience(cur, note_id))
+    effects.changed_users.add(shared_user_id)
+    effects.access_notes.add(note_id)
+    return {'note_id': note_id, 'message': f'Note shared with user {shared_user_id}!'}
+
+def chatbot_mark_reminder_done(cur, user_id, params, effects):
+    owner = reminder_owner(cur, params['reminder_id'])
+    if owner != user_id:
+        raise PlanStepError('Reminder not found' if owner is None else REMINDER_DENIED_MESSAGE)
+    cur.callproc('mark_reminder_done', [params['reminder_id']])
+    return {'reminder_id': params['reminder_id'], 'message': 'Reminder marked as done!'}
+
+# Step implementations for execute_chatbot_action (the actions listed in chatbot_plans.WRITE_ACTIONS)
+CHATBOT_ACTION_STEPS = {
+    'create_note': chatbot_create_note,
+    'create_notebook': chatbot_create_notebook,
+    'update_note': chatbot_update_note,
+    'delete_note': chatbot_delete_note,
+    'add_tags_to_note': chatbot_add_tags_to_note,
+    'bookmark_note': chatbot_bookmark_note,
+    'unbookmark_note': chatbot_unbookmark_note,
+    'share_note': chatbot_share_note,
+    'mark_reminder_done': chatbot_mark_reminder_done,
+}
+
+# Longest excerpt of a note's content included in chatbot read results
+CHATBOT_EXCERPT_CHARS = 160
+# Longest note content returned by the chatbot's get_note
+CHATBOT_NOTE_MAX_CHARS = 2000
+
+def execute_chatbot_read(action_result: dict, user_id: int):
+    """
+    Answer a read action (get_notes, search_notes, ...) for the chatbot, one page at a time
+    
+    Results come from the same helpers, caches and indexes as the REST endpoints and never
+    exceed CHATBOT_READ_MAX_ITEMS; next_cursor (or None) continues the listing.
+    """
+    action = action_result['action']
+    params = action_result.get('parameters') or {}
+    if not isinstance(params, dict):
+        return {'success': False, 'message': f'Action "{action}" has malformed parameters'}
+    
+    cur = db.connection.cursor()
+    try:
+        offset, limit = read_page(params)
+        read, noun, describe = CHATBOT_READ_ACTIONS[action]
+        items, total = read(cur, user_id, params, offset, limit)
+    except (PlanError, PlanStepError) as e:
+        return {'success': False, 'message': str(e)}
     except Exception as e:
-        return {'success': False, 'message': f'Error executing action: {str(e)}'}
+        return {'success': False, 'message': f'Error reading data: {str(e)}'}
+    finally:
+        cur.close()
+    
+    if total is None:
+        # A single record (get_note, get_stats, get_current_user)
+        return {'success': True, 'item': items, 'message': describe(items)}
+    next_cursor = offset + len(items) if offset + len(items) < total else None
+    if not items:
+        message = f'No {noun} found.'
+    else:
+        message = f'{noun.capitalize()} {offset + 1}-{offset + len(items)} of {total}:\n'
+        message += '\n'.join(f'• {describe(item)}' for item in items)
+        if next_cursor is not None:
+            message += f'\nSay "more" to see the next {min(limit, total - next_cursor)}.'
+    return {
+        'success': True,
+        'items': items,
+        'total': total,
+        'next_cursor': next_cursor,
+        'message': message
+    }
+
+def note_excerpts(cur, note_ids):
+    """Title and the start of the content of these notes, in the given order"""
+    if not note_ids:
+        return []
+    cur.execute(f"""
+        SELECT note_id, title, SUBSTR(content, 1, %s) FROM note
+        WHERE note_id IN ({', '.join(['%s'] * len(note_ids))})
+    """, (CHATBOT_EXCERPT_CHARS, *note_ids))
+    rows = {row[0]: row for row in cur.fetchall()}
+    return [{'note_id': note_id, 'title': rows[note_id][1], 'excerpt': rows[note_id][2] or ''}
+            for note_id in note_ids if note_id in rows]
+
+def chatbot_read_notes(cur, user_id, params, offset, limit):
+    # Newest first, from the per-user facet bitmaps (cached until the user's data changes)
+    filters = {}
+    if params.get('tag_ids'):
+        filters['tag_ids'] = [int(tag_id) for tag_id in params['tag_ids']]
+        filters['tag_mode'] = 'or' if params.get('tag_mode') == 'or' else 'and'
+    for name in ('category_id', 'notebook_id'):
+        if params.get(name) is not None:
+            filters[name] = int(params[name])
+    facets = user_facets(cur, user_id)
+    note_ids = facets.note_ids_in(facets.select(**filters))
+    return note_excerpts(cur, note_ids[offset:offset + limit]), len(note_ids)
+
+def chatbot_search_notes(cur, user_id, params, offset, limit):
+    query = (params.get('query') or params.get('q') or '').strip()
+    if not query:
+        raise PlanError('search_notes needs a query')
+    search_pattern = f'%{query}%'
+    # Same matching and ranking as /api/notes/search, but only ids until the page is known
+    cur.execute("""
+        SELECT n.note_id
+        FROM note n
+        LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+        WHERE (n.user_id = %s OR col.shared_with_user_id = %s)
+          AND (n.title LIKE %s OR n.content LIKE %s)
+        ORDER BY CASE WHEN n.title LIKE %s THEN 1 ELSE 2 END, n.updated_at DESC
+    """, (user_id, user_id, user_id, search_pattern, search_pattern, search_pattern))
+    note_ids = [row[0] for row in cur.fetchall()]
+    return note_excerpts(cur, note_ids[offset:offset + limit]), len(note_ids)
+
+def chatbot_read_note(cur, user_id, params, offset, limit):
+    if params.get('note_id') is None:
+        raise PlanError('get_note needs note_id')
+    note_id = int(params['note_id'])
+    permission = get_access_resolver().resolve_one(cur, user_id, note_id)
+    if not permission.allows('read'):
+        raise PlanStepError(ACCESS_DENIED_MESSAGES['read'] if permission.exists else 'Note not found')
+    cur.execute("""
+        SELECT n.note_id, n.title, n.content, n.updated_at, GROUP_CONCAT(DISTINCT t.name)
+        FROM note n
+        LEFT JOIN note_tag nt ON n.note_id = nt.note_id
+        LEFT JOIN tag t ON nt.tag_id = t.tag_id
+        WHERE n.note_id = %s
+        GROUP BY n.note_id
+    """, (note_id,))
+    row = cur.fetchone()
+    content = row[2] or ''
+    return {
+        'note_id': row[0],
+        'title': row[1],
+        'content': content[:CHATBOT_NOTE_MAX_CHARS],
+        'truncated': len(content) > CHATBOT_NOTE_MAX_CHARS,
+        'updated_at': row[3].strftime('%Y-%m-%d %H:%M'),
+        'tags': row[4].split(',') if row[4] else []
+    }, None
+
+def chatbot_read_collaborators(cur, user_id, params, offset, limit):
+    if params.get('note_id') is None:
+        raise PlanError('get_collaborators needs note_id')
+    note_id = int(params['note_id'])
+    require_note_access(cur, user_id, note_id, 'read')
+    collabs = list_collaborators(cur, note_id)
+    return collabs[offset:offset + limit], len(collabs)
+
+def chatbot_read_tags(cur, user_id, params, offset, limit):
+    # Most used first, from the autocomplete index
+    tag_index = get_tag_index()
+    if tag_index.needs_load():
+        tag_index.load(cur)
+    return tag_index.search('', offset + limit)[offset:], tag_index.stats()['tags']
+
+def paged_list(list_items):
+    """Read function for the helpers that return a user's whole (short) list"""
+    def read(cur, user_id, params, offset, limit):
+        items = list_items(cur, user_id, params)
+        return items[offset:offset + limit], len(items)
+    return read
+
+def excerpt_bookmarks(cur, user_id, params):
+    return [{'note_id': b['note_id'], 'title': b['title'], 'bookmarked_at': b['bookmarked_at']}
+            for b in list_bookmarks(cur, user_id)]
+
+def all_categories(cur, user_id, params):
+    cur.execute("SELECT category_id, name FROM category ORDER BY name")
+    return [{'id': c[0], 'name': c[1]} for c in cur.fetchall()]
+
+def all_users(cur, user_id, params):
+    cur.execute("SELECT user_id, name, email FROM app_user ORDER BY user_id")
+    return [{'id': u[0], 'name': u[1], 'email': u[2]} for u in cur.fetchall()]
+
+def chatbot_read_current_user(cur, user_id, params, offset, limit):
+    cur.execute("SELECT user_id, name, email FROM app_user WHERE user_id = %s", (user_id,))
+    user = cur.fetchone()
+    return {'id': user[0], 'name': user[1], 'email': user[2]} if user else {'id': user_id}, None
+
+def describe_stats(stats):
+    return (f"You have {stats['total_notes']} notes, {stats['total_notebooks']} notebooks, "
+            f"{stats['total_bookmarks']} bookmarks and {stats['pending_reminders']} pending reminders.")
+
+# Read implementations for execute_chatbot_read: (read function, plural noun, one-line description)
+CHATBOT_READ_ACTIONS = {
+    'get_notes': (chatbot_read_notes, 'notes', lambda n: f"#{n['note_id']} {n['title']}"),
+    'search_notes': (chatbot_search_notes, 'matching notes', lambda n: f"#{n['note_id']} {n['title']}"),
+    'get_note': (chatbot_read_note, 'note', lambda n: f"#{n['note_id']} {n['title']}: {n['content'][:CHATBOT_EXCERPT_CHARS]}"),
+    'get_notebooks': (paged_list(lambda cur, user_id, params: list_notebooks(cur, user_id)), 'notebooks',
+                      lambda nb: f"#{nb['id']} {nb['title']}"),
+    'get_bookmarks': (paged_list(excerpt_bookmarks), 'bookmarks', lambda b: f"#{b['note_id']} {b['title']}"),
+    'get_reminders': (paged_list(lambda cur, user_id, params: list_reminders(cur, user_id, params.get('status'))),
+                      'reminders', lambda r: f"#{r['id']} {r['text']} (due {r['due_date']}, {r['status']})"),
+    'get_stats': (lambda cur, user_id, params, offset, limit: (user_stats(cur, user_id), None), 'stats', describe_stats),
+    'get_collaborators': (chatbot_read_collaborators, 'collaborators',
+                          lambda c: f"{c['name']} ({c['email']}), {c['access_level']} access"),
+    'get_tags': (chatbot_read_tags, 'tags', lambda t: f"{t['name']} ({t['usage']} notes)"),
+    'get_categories': (paged_list(all_categories), 'categories', lambda c: f"#{c['id']} {c['name']}"),
+    'get_users': (paged_list(all_users), 'users', lambda u: f"#{u['id']} {u['name']} ({u['email']})"),
+    'get_current_user': (chatbot_read_current_user, 'user', lambda u: f"You are {u.get('name', 'user')} (#{u['id']})."),
+}
+
 
 if __name__ == '__main__':
+    app = create_app()
+    warm_up(app)
+    
     # Check AI service status on startup
     ai_service = get_ai_service()
     chatbot = get_chatbot(os.getenv('GEMINI_API_KEY'))
@@ -1377,9 +2394,11 @@ if __name__ == '__main__':
         print("   The app will work with fallback keyword extraction.")
     
     print(f"\n📊 Database Configuration:")
-    print(f"   Host: {app.config['MYSQL_HOST']}")
-    print(f"   User: {app.config['MYSQL_USER']}")
-    print(f"   Database: {app.config['MYSQL_DB']}")
+    print(f"   Backend: {db.name}")
+    if db.name == 'mysql':
+        print(f"   Host: {app.config['MYSQL_HOST']}")
+        print(f"   User: {app.config['MYSQL_USER']}")
+    print(f"   Database: {db.describe()['database']}")
     print(f"\n🚀 Starting server on http://localhost:5000\n")
     
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+ASGI entry point
+Serves the AI routes (/api/chatbot, /api/notes/<id>/ai-suggest-tags, /api/ai-status) as
+coroutines, so a request waiting on Gemini holds no thread, and mounts the Flask app for
+everything else.
+
+    pip install starlette uvicorn a2wsgi
+    uvicorn asgi:application --port 5000
+"""
+
+import os
+import time
+
+try:
+    import anyio
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse
+    from starlette.routing import Mount, Route
+except ImportError as e:
+    raise ImportError("ASGI mode needs starlette and uvicorn: pip install starlette uvicorn a2wsgi") from e
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from app import (create_app, warm_up, get_current_user, load_note_for_tagging, store_tag_suggestions,
+                 tag_suggestion_payload, ai_status_payload, build_chatbot_context, execute_chatbot_action,
+                 remember_chatbot_exchange, match_local_chatbot_intent, wants_summary,
+                 AI_UNAVAILABLE_RESPONSE, CHATBOT_UNAVAILABLE_RESPONSE)
+from ai_service import get_ai_service
+from chatbot_service import get_chatbot
+from singleflight import get_async_single_flight, content_key
+from metrics import get_metrics
+
+flask_app = create_app()
+warm_up(flask_app)
+
+# Threads for the short database steps of the async routes (the model wait needs none)
+ASGI_DB_THREADS = int(os.getenv('ASGI_DB_THREADS', '16'))
+# Threads serving the mounted Flask routes
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '16'))
+
+_db_limiter = None
+
+
+def _limiter() -> anyio.CapacityLimiter:
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(ASGI_DB_THREADS)
+    return _db_limiter
+
+
+def _call_in_flask_context(request: Request, fn, args):
+    # The request context gives the helpers the session (current user), flask.g and
+    # the per-context connection, which is closed when the context is popped
+    with flask_app.test_request_context(request.url.path, method=request.method,
+                                        headers={'Cookie': request.headers.get('cookie', '')}):
+        return fn(*args)
+
+
+async def run_db(request: Request, fn, *args):
+    """Run a blocking database helper from app.py on the bounded DB thread pool"""
+    return await anyio.to_thread.run_sync(_call_in_flask_context, request, fn, args, limiter=_limiter())
+
+
+def _flask_response(rv) -> JSONResponse:
+    """Convert an error (response, status) tuple returned by an app.py helper"""
+    response, status = rv
+    return JSONResponse(response.get_json(), status_code=status)
+
+
+def _record(route: str, method: str, start: float, status: int):
+    metrics = get_metrics()
+    metrics.observe('route_latency_ms', (time.perf_counter() - start) * 1000, route=route,
+                    method=method, status=status // 100 * 100)
+    metrics.increment('route_requests', route=route, method=method)
+
+
+async def ai_status(request: Request):
+    start = time.perf_counter()
+    response = JSONResponse(ai_status_payload())
+    _record('/api/ai-status', 'GET', start, response.status_code)
+    return response
+
+
+async def ai_suggest_tags(request: Request):
+    start = time.perf_counter()
+    note_id = request.path_params['note_id']
+    try:
+        denied, note = await run_db(request, load_note_for_tagging, note_id)
+        if denied:
+            response = _flask_response(denied)
+        else:
+            note_title, note_content, existing_tags = note
+            ai_service = get_ai_service()
+            if not ai_service.is_available():
+                response = JSONResponse(AI_UNAVAILABLE_RESPONSE, status_code=503)
+            else:
+                async def generate_and_store():
+                    suggestions = await ai_service.suggest_tags_with_ai_async(note_title, note_content, existing_tags)
+                    if not suggestions:
+                        return None
+                    return await run_db(request, store_tag_suggestions, note_id, suggestions)
+
+                key = ('ai_suggest_tags', note_id, content_key(note_title, note_content))
+                results, coalesced = await get_async_single_flight().do(key, generate_and_store)
+                response = JSONResponse(tag_suggestion_payload(results, coalesced))
+    except Exception as e:
+        response = JSONResponse({'error': f'Error generating AI suggestions: {str(e)}'}, status_code=500)
+    _record('/api/notes/<int:note_id>/ai-suggest-tags', 'POST', start, response.status_code)
+    return response
+
+
+def _user_and_context(chatbot, user_message):
+    user_id = get_current_user()
+    local_result = match_local_chatbot_intent(chatbot, user_id, user_message)
+    if local_result is not None or not chatbot.is_available():
+        return user_id, local_result, None
+    return user_id, None, build_chatbot_context(user_id)
+
+
+async def _chatbot_reply(request: Request, chatbot, user_message: str) -> JSONResponse:
+    user_id, local_result, context = await run_db(request, _user_and_context, chatbot, user_message)
+    if local_result is None and not chatbot.is_available():
+        return JSONResponse(CHATBOT_UNAVAILABLE_RESPONSE, status_code=503)
+
+    async def process_and_execute():
+        result = local_result or await chatbot.process_message_async(user_message, context)
+        execution_result = None
+        if result.get('action') != 'answer' and result.get('action') != 'clarify':
+            execution_result = await run_db(request, execute_chatbot_action, result, user_id)
+        if wants_summary(result, execution_result):
+            summary = await chatbot.summarize_results_async(user_message, execution_result)
+            if summary:
+                result = {**result, 'message': summary}
+        await run_db(request, remember_chatbot_exchange, user_id, user_message, result, execution_result)
+        return result, execution_result
+
+    key = ('chatbot', user_id, content_key(user_message))
+    (result, execution_result), coalesced = await get_async_single_flight().do(key, process_and_execute)
+    return JSONResponse({
+        'action': result.get('action', 'answer'),
+        'message': result.get('message', ''),
+        'execution_result': execution_result,
+        'coalesced': coalesced,
+        'local': local_result is not None
+    })
+
+
+async def chatbot(request: Request):
+    start = time.perf_counter()
+    try:
+        data = await request.json()
+        user_message = (data.get('message') or '').strip()
+        chatbot = get_chatbot(os.getenv('GEMINI_API_KEY'))
+
+        if not user_message:
+            response = JSONResponse({'error': 'Message is required'}, status_code=400)
+        else:
+            response = await _chatbot_reply(request, chatbot, user_message)
+    except Exception as e:
+        response = JSONResponse({
+            'error': str(e),
+            'action': 'answer',
+            'message': f'I encountered an error: {str(e)}. Please try again.'
+        }, status_code=500)
+    _record('/api/chatbot', 'POST', start, response.status_code)
+    return response
+
+
+def _wsgi_app():
+    try:
+        return WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+    except TypeError:
+        # starlette's fallback middleware uses the shared thread pool
+        return WSGIMiddleware(flask_app)
+
+
+application = Starlette(routes=[
+    Route('/api/ai-status', ai_status, methods=['GET']),
+    Route('/api/notes/{note_id:int}/ai-suggest-tags', ai_suggest_tags, methods=['POST']),
+    Route('/api/chatbot', chatbot, methods=['POST']),
+    Mount('/', app=_wsgi_app()),
+])
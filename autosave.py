@@ -0,0 +1,348 @@
+"""
+Coalesced autosave
+Partial note updates (PATCH) are applied to a pending draft and written to the note table
+once the edits pause, so a burst of autosaves costs one UPDATE and one history version
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from shared_state import get_shared_store
+
+# A draft is written once no edit arrived for this long...
+AUTOSAVE_WINDOW_S = float(os.getenv('AUTOSAVE_WINDOW_S', '5'))
+# ...or this long after its first unsaved edit, whichever comes first
+AUTOSAVE_MAX_DELAY_S = float(os.getenv('AUTOSAVE_MAX_DELAY_S', '30'))
+# How often the writer thread looks for drafts that are due
+AUTOSAVE_POLL_S = 0.5
+# A draft claimed by a writer is not claimed again for this long (another process may be writing it)
+AUTOSAVE_CLAIM_S = 30.0
+
+# Note columns a PATCH may change
+PATCH_FIELDS = ('title', 'content', 'is_public')
+
+
+class PatchError(ValueError):
+    """The PATCH body is malformed"""
+
+
+class VersionConflict(Exception):
+    """The note changed since the version the edit was based on"""
+
+    def __init__(self, version: str, fields: Dict):
+        super().__init__('The note was changed since base_version')
+        self.version = version
+        self.fields = fields
+
+
+def note_version(fields: Dict) -> str:
+    """Opaque version of a note's editable fields, sent back as base_version"""
+    digest = hashlib.sha1()
+    for name in PATCH_FIELDS:
+        digest.update(str(fields[name]).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:16]
+
+
+def _is_low_surrogate(units: bytes, index: int) -> bool:
+    """Whether UTF-16-LE code unit `index` is the second half of a surrogate pair"""
+    return index < len(units) // 2 and 0xDC <= units[2 * index + 1] <= 0xDF
+
+
+def _check_unicode(value: str, name: str):
+    try:
+        value.encode('utf-8')
+    except UnicodeEncodeError:
+        raise PatchError(f'{name} contains an unpaired surrogate') from None
+
+
+def apply_text_diff(text: str, ops: List[Dict]) -> str:
+    """
+    Apply splices [{'start': i, 'end': j, 'text': '...'}, ...] in order, each replacing
+    text[start:end] of the result of the previous one
+
+    Offsets count UTF-16 code units, like JavaScript string indices, so characters outside
+    the BMP (emoji) count twice. An offset between the two halves of a surrogate pair is
+    rejected rather than splitting the character.
+
+    Raises:
+        PatchError: If an operation is malformed or out of range
+    """
+    if not isinstance(ops, list):
+        raise PatchError('content_diff must be a list of {start, end, text} operations')
+    units = text.encode('utf-16-le')
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PatchError('content_diff must be a list of {start, end, text} operations')
+        start, end, insert = op.get('start'), op.get('end', op.get('start')), op.get('text', '')
+        if (not isinstance(start, int) or not isinstance(end, int) or isinstance(start, bool)
+                or isinstance(end, bool) or not isinstance(insert, str)):
+            raise PatchError('content_diff operations need integer start/end and a text string')
+        length = len(units) // 2
+        if not 0 <= start <= end <= length:
+            raise PatchError(f'content_diff range {start}..{end} is outside the content (length {length})')
+        if _is_low_surrogate(units, start) or _is_low_surrogate(units, end):
+            raise PatchError(f'content_diff range {start}..{end} splits a surrogate pair')
+        _check_unicode(insert, 'content_diff text')
+        units = units[:2 * start] + insert.encode('utf-16-le') + units[2 * end:]
+    return units.decode('utf-16-le')
+
+
+def apply_patch(fields: Dict, patch: Dict) -> Dict:
+    """
+    The note's fields after a PATCH body (title, content or content_diff, is_public)
+
+    Raises:
+        PatchError: If the body is malformed
+    """
+    if 'content' in patch and 'content_diff' in patch:
+        raise PatchError('Send either content or content_diff, not both')
+    updated = dict(fields)
+    if 'title' in patch:
+        if not isinstance(patch['title'], str) or not patch['title'].strip():
+            raise PatchError('title must be a non-empty string')
+        updated['title'] = patch['title']
+    if 'content' in patch:
+        if not isinstance(patch['content'], str):
+            raise PatchError('content must be a string')
+        _check_unicode(patch['content'], 'content')
+        updated['content'] = patch['content']
+    if 'content_diff' in patch:
+        updated['content'] = apply_text_diff(updated['content'], patch['content_diff'])
+    if 'is_public' in patch:
+        updated['is_public'] = 1 if patch['is_public'] else 0
+    return updated
+
+
+class AutosaveBuffer:
+    """
+    Pending drafts per note and the thread that writes them
+
+    A PATCH is checked against the note's current version: the pending draft's if there
+    is one, otherwise the stored row's. It then replaces the draft, which keeps the full
+    editable fields plus which of them changed, and pushes its due time back by the
+    window (capped at the max delay since the draft's first edit). When a draft comes
+    due, `write(note_id, fields, changed, base)` stores it with a single UPDATE, so the
+    version-history trigger records one version for the burst. `base` holds the stored
+    fields the draft started from, and the UPDATE only applies while the row still holds
+    them. A PUT that commits while a claimed draft is being written therefore wins, and
+    the draft is dropped. The draft stays readable while it is written and is only
+    removed if no edit arrived meanwhile, so reads and base-version checks never see a
+    gap. A draft edited during the write is rebased onto the fields just written.
+    """
+
+    def __init__(self, window_s: float = AUTOSAVE_WINDOW_S, max_delay_s: float = AUTOSAVE_MAX_DELAY_S):
+        self.window_s = window_s
+        self.max_delay_s = max_delay_s
+        self.app = None
+        self.write: Optional[Callable[[int, Dict, List[str], Dict], bool]] = None
+        self._lock = threading.RLock()
+        self._drafts: Dict[int, Dict] = {}   # note_id -> draft (with 'rev' and 'due')
+        self._wake = threading.Event()
+        self._thread = None
+        self.patches = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.last_error = None
+
+    def init_app(self, app, write: Callable[[int, Dict, List[str], Dict], bool]):
+        """
+        write(note_id, fields, changed, base) stores a draft (inside an app context) if the
+        note still holds the base fields, and says whether it wrote
+        """
+        self.app = app
+        self.write = write
+
+    # Storage (overridden by SharedAutosaveBuffer)
+
+    def _edit(self, note_id: int, edit: Callable[[Optional[Dict]], Dict]) -> Dict:
+        """Replace the draft with edit(current draft or None) atomically"""
+        with self._lock:
+            draft = edit(self._drafts.get(note_id))
+            self._drafts[note_id] = draft
+            return draft
+
+    def _get(self, note_id: int) -> Optional[Dict]:
+        with self._lock:
+            return self._drafts.get(note_id)
+
+    def _claim(self, now: float, note_id: Optional[int] = None) -> List[tuple]:
+        """(note_id, draft) of the drafts due at now (or of note_id, due or not), marked as being written"""
+        with self._lock:
+            ids = [note_id] if note_id is not None else [i for i, d in self._drafts.items() if d['due'] <= now]
+            claimed = []
+            for i in ids:
+                draft = self._drafts.get(i)
+                if draft is not None:
+                    draft['due'] = now + AUTOSAVE_CLAIM_S
+                    claimed.append((i, dict(draft)))
+            return claimed
+
+    def _release(self, note_id: int, rev: int, base: Optional[Dict] = None):
+        """Drop the draft if it is still the written revision, else rebase a newer one onto base (if given)"""
+        with self._lock:
+            draft = self._drafts.get(note_id)
+            if draft is None:
+                return
+            if draft['rev'] == rev:
+                del self._drafts[note_id]
+            elif base is not None:
+                draft['base'] = base
+
+    def _delete(self, note_id: int):
+        with self._lock:
+            self._drafts.pop(note_id, None)
+
+    def _count(self) -> int:
+        with self._lock:
+            return len(self._drafts)
+
+    # Public API
+
+    def current(self, note_id: int) -> Optional[Dict]:
+        """The pending fields of a note, or None if it has no unsaved draft"""
+        draft = self._get(note_id)
+        return dict(draft['fields']) if draft else None
+
+    def patch(self, note_id: int, editor_id: int, base_version: str, patch: Dict,
+              load_fields: Callable[[], Dict]) -> Dict:
+        """
+        Apply a PATCH body to the note's draft
+
+        Args:
+            load_fields: Returns the stored title/content/is_public, used when there is no draft
+
+        Raises:
+            VersionConflict: If base_version is not the note's current version
+            PatchError: If the body is malformed
+        """
+        now = time.time()
+
+        def edit(draft):
+            if draft is None:
+                fields = load_fields()
+                draft = {'fields': fields, 'base': fields, 'changed': [], 'first_at': now, 'rev': 0}
+            version = note_version(draft['fields'])
+            if base_version != version:
+                raise VersionConflict(version, draft['fields'])
+            fields = apply_patch(draft['fields'], patch)
+            changed = [name for name in PATCH_FIELDS
+                       if name in draft['changed'] or fields[name] != draft['fields'][name]]
+            return {
+                'fields': fields,
+                'base': draft['base'],
+                'changed': changed,
+                'first_at': draft['first_at'],
+                'editor_id': editor_id,
+                'rev': draft['rev'] + 1,
+                'due': min(now + self.window_s, draft['first_at'] + self.max_delay_s),
+            }
+
+        try:
+            draft = self._edit(note_id, edit)
+        except VersionConflict:
+            self.conflicts += 1
+            raise
+        self.patches += 1
+        self._wake.set()
+        return {
+            'version': note_version(draft['fields']),
+            'pending': True,
+            'save_in_s': round(max(0.0, draft['due'] - now), 3),
+        }
+
+    def flush(self, note_id: int) -> bool:
+        """Write a note's draft now (from a request); True if the note table was updated"""
+        claimed = self._claim(time.time(), note_id)
+        return any(self._write(i, draft) for i, draft in claimed)
+
+    def discard(self, note_id: int):
+        """Forget a note's draft (the note was overwritten with PUT or deleted)"""
+        self._delete(note_id)
+
+    def _write(self, note_id: int, draft: Dict) -> bool:
+        wrote = False
+        if draft['changed']:
+            wrote = self.write(note_id, draft['fields'], draft['changed'], draft['base'])
+        self._release(note_id, draft['rev'], draft['fields'] if wrote else None)
+        if wrote:
+            self.writes += 1
+        return wrote
+
+    def ensure_started(self):
+        """Start the writer thread once (called from a request hook, so only serving processes run it)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='autosave-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                for note_id, draft in self._claim(time.time()):
+                    with self.app.app_context():
+                        self._write(note_id, draft)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error in autosave writer: {e}")
+            if self._wake.wait(AUTOSAVE_POLL_S):
+                self._wake.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'pending': self._count(),
+            'window_s': self.window_s,
+            'patches': self.patches,
+            'writes': self.writes,
+            'conflicts': self.conflicts,
+            'last_error': self.last_error,
+            'shared': False,
+        }
+
+
+class SharedAutosaveBuffer(AutosaveBuffer):
+    """AutosaveBuffer with drafts in the shared store, so consecutive PATCHes may reach any worker process"""
+
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def _edit(self, note_id: int, edit: Callable[[Optional[Dict]], Dict]) -> Dict:
+        return self.store.edit_note_draft(note_id, edit)
+
+    def _get(self, note_id: int) -> Optional[Dict]:
+        return self.store.get_note_draft(note_id)
+
+    def _claim(self, now: float, note_id: Optional[int] = None) -> List[tuple]:
+        return self.store.claim_note_drafts(now, now + AUTOSAVE_CLAIM_S, note_id)
+
+    def _release(self, note_id: int, rev: int, base: Optional[Dict] = None):
+        self.store.release_note_draft(note_id, rev, base)
+
+    def _delete(self, note_id: int):
+        self.store.delete_note_draft(note_id)
+
+    def _count(self) -> int:
+        return self.store.count_note_drafts()
+
+    def stats(self) -> Dict:
+        return dict(super().stats(), shared=True)
+
+
+# Global instance
+_autosave_buffer = None
+
+
+def get_autosave_buffer() -> AutosaveBuffer:
+    """Get or create the autosave buffer (shared between processes when SHARED_STATE_PATH is set)"""
+    global _autosave_buffer
+    if _autosave_buffer is None:
+        store = get_shared_store()
+        _autosave_buffer = SharedAutosaveBuffer(store) if store is not None else AutosaveBuffer()
+    return _autosave_buffer
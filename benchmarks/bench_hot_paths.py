@@ -0,0 +1,162 @@
+"""
+Microbenchmarks for the pure-Python hot paths
+Runs each case on seeded synthetic inputs and writes machine-readable JSON results
+
+Usage:
+    python benchmarks/bench_hot_paths.py --output bench.json
+    python benchmarks/bench_hot_paths.py --compare baseline.json --threshold 0.25
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The services print setup warnings on import; keep stdout clean for the JSON results
+with contextlib.redirect_stdout(sys.stderr):
+    import synthetic  # noqa: E402  (sibling module, found via the script directory)
+    from ai_service import AITagSuggestionService  # noqa: E402
+    from chatbot_service import KnowledgeBaseChatbot  # noqa: E402
+    from serializers import merge_activity, parse_fields, serialize_note_rows  # noqa: E402
+    from text_utils import compute_text_statistics  # noqa: E402
+
+
+def build_cases(seed: int) -> Dict[str, Callable[[], object]]:
+    """Create the benchmark cases; inputs are generated once, outside the timed region"""
+    rng = random.Random(seed)
+    ai = AITagSuggestionService.__new__(AITagSuggestionService)  # no API key, no model
+    ai.model = None
+
+    short_text = synthetic.note_text(rng, paragraphs=1, words_per_paragraph=60)
+    long_text = synthetic.note_text(rng, paragraphs=20, words_per_paragraph=120)
+    title = synthetic.note_title(rng)
+    existing_tags = list(synthetic.TAG_POOL) + [synthetic.words(rng, 1) for _ in range(200)]
+    tag_responses = [synthetic.tag_suggestion_response(rng) for _ in range(50)]
+    chat_responses = [synthetic.chatbot_response(rng) for _ in range(50)]
+    chat_plain_answers = [synthetic.words(rng, 30) for _ in range(50)]
+    rows_1k = synthetic.note_list_rows(rng, 1000)
+    rows_10k = synthetic.note_list_rows(rng, 10000)
+    sparse = parse_fields('note_id,title,tags,updated_at')
+    activity_notes, activity_reminders = synthetic.activity_rows(rng, 200, 200)
+
+    return {
+        'extract_keywords.short': lambda: ai.extract_keywords(short_text),
+        'extract_keywords.long': lambda: ai.extract_keywords(long_text),
+        'fallback_suggestions.no_tags': lambda: ai._fallback_suggestions(title, long_text),
+        'fallback_suggestions.existing_tags': lambda: ai._fallback_suggestions(title, long_text, existing_tags),
+        'parse_tag_suggestions.x50': lambda: [ai.parse_suggestions(t) for t in tag_responses],
+        'parse_chatbot_response.json.x50': lambda: [KnowledgeBaseChatbot.parse_response(t) for t in chat_responses],
+        'parse_chatbot_response.text.x50': lambda: [KnowledgeBaseChatbot.parse_response(t) for t in chat_plain_answers],
+        'serialize_note_rows.1k': lambda: serialize_note_rows(rows_1k),
+        'serialize_note_rows.10k': lambda: serialize_note_rows(rows_10k),
+        'serialize_note_rows.10k_sparse': lambda: serialize_note_rows(rows_10k, sparse),
+        'note_statistics.short': lambda: compute_text_statistics(title, short_text),
+        'note_statistics.long': lambda: compute_text_statistics(title, long_text),
+        'merge_activity.400_rows': lambda: merge_activity(activity_notes, activity_reminders, 20),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Dict:
+    """
+    Time a case: calibrate an inner loop count so one sample takes at least min_time,
+    then collect `repeat` samples and report per-call statistics in microseconds
+    """
+    func()  # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+
+    return {
+        'loops': number,
+        'repeat': repeat,
+        'min_us': round(min(samples), 3),
+        'median_us': round(statistics.median(samples), 3),
+        'mean_us': round(statistics.fmean(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """Find cases whose median slowed down by more than threshold (0.25 = 25%)"""
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        ratio = current['median_us'] / previous['median_us'] if previous['median_us'] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append({'case': name, 'baseline_us': previous['median_us'],
+                                'current_us': current['median_us'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=1234, help='seed for the synthetic inputs')
+    parser.add_argument('--repeat', type=int, default=7, help='samples per case')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per sample')
+    parser.add_argument('--filter', default='', help='only run cases containing this substring')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    parser.add_argument('--compare', help='baseline JSON file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed median slowdown vs the baseline before failing')
+    args = parser.parse_args(argv)
+
+    cases = {name: func for name, func in build_cases(args.seed).items() if args.filter in name}
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    for name, func in cases.items():
+        results['results'][name] = measure(func, args.repeat, args.min_time)
+        print(f"{name:45s} {results['results'][name]['median_us']:>12.2f} us", file=sys.stderr)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results['regressions'] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['case']}: {r['baseline_us']} -> {r['current_us']} us "
+                  f"(x{r['ratio']})", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Reproducible synthetic data for benchmarks and load tests
+Every generator takes an explicit random.Random so the same seed always yields the same data
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+# Vocabulary loosely modelled on study/work notes so keyword extraction has realistic repetition
+VOCABULARY = (
+    'database index query join table schema normalization transaction commit rollback '
+    'python function loop class module import package async thread process memory cache '
+    'meeting agenda action deadline project milestone client review budget timeline '
+    'kubernetes docker container deploy cluster service network latency throughput '
+    'research paper experiment result hypothesis dataset model training evaluation metric '
+    'journal today grateful focus reflection habit exercise reading sleep goal '
+    'the and for with this that from have will should could about into over under'
+).split()
+
+TAG_POOL = ('sql', 'mysql', 'design', 'todo', 'ai', 'python', 'study', 'work', 'meeting',
+            'research', 'personal', 'devops', 'ideas', 'reading', 'project')
+
+BASE_TIME = datetime(2024, 1, 1, 9, 0, 0)
+
+
+def words(rng: random.Random, count: int) -> str:
+    """Generate a run of vocabulary words"""
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+def note_text(rng: random.Random, paragraphs: int = 4, words_per_paragraph: int = 60) -> str:
+    """Generate multi-paragraph note content"""
+    return '\n\n'.join(
+        '\n'.join(words(rng, words_per_paragraph // 3) for _ in range(3))
+        for _ in range(paragraphs)
+    )
+
+
+def note_title(rng: random.Random) -> str:
+    """Generate a short title"""
+    return words(rng, rng.randint(2, 5)).title()
+
+
+def timestamp(rng: random.Random, span_days: int = 365) -> datetime:
+    """Generate a timestamp within span_days of BASE_TIME"""
+    return BASE_TIME + timedelta(seconds=rng.randint(0, span_days * 86400))
+
+
+def note_list_rows(rng: random.Random, count: int) -> List[Tuple]:
+    """Generate rows shaped like the note list queries (serializers.NOTE_LIST_COLUMNS)"""
+    tag_combos = [None] + [
+        ','.join(rng.sample(TAG_POOL, rng.randint(1, 4))) for _ in range(40)
+    ]
+    rows = []
+    for note_id in range(1, count + 1):
+        created = timestamp(rng)
+        shared = rng.random() < 0.2
+        rows.append((
+            note_id,
+            note_title(rng),
+            note_text(rng, paragraphs=2, words_per_paragraph=30),
+            rng.randint(0, 1),
+            created,
+            created + timedelta(minutes=rng.randint(0, 10000)),
+            rng.choice(('Course Notes', 'Personal', 'Work', 'Programming', None)),
+            rng.choice(('DBMS Notes', 'Daily Journal', 'Work Tasks', None)),
+            rng.choice(tag_combos),
+            rng.randint(0, 1),
+            'shared' if shared else 'owner',
+            rng.choice(('read', 'write')) if shared else 'owner',
+            f'Summary of note {note_id}.' if note_id % 2 else None,
+        ))
+    return rows
+
+
+def activity_rows(rng: random.Random, notes: int, reminders: int) -> Tuple[List[Tuple], List[Tuple]]:
+    """Generate (note update rows, reminder rows) shaped like the activity feed queries"""
+    note_rows = [
+        (i, note_title(rng), timestamp(rng), 'Pranav', 'note_updated')
+        for i in range(1, notes + 1)
+    ]
+    reminder_rows = [
+        (i, words(rng, 4), timestamp(rng), rng.choice(('pending', 'done', 'skipped')),
+         note_title(rng), rng.randint(1, notes or 1))
+        for i in range(1, reminders + 1)
+    ]
+    return note_rows, reminder_rows
+
+
+def tag_suggestion_response(rng: random.Random, fenced: bool = True) -> str:
+    """Generate a model answer shaped like the tag suggestion prompt asks for"""
+    payload = json.dumps([
+        {'tag': rng.choice(TAG_POOL).upper() if rng.random() < 0.2 else rng.choice(TAG_POOL),
+         'confidence': round(rng.uniform(0.3, 1.2), 2)}
+        for _ in range(rng.randint(3, 7))
+    ])
+    return f"```json\n{payload}\n```" if fenced else payload
+
+
+def chatbot_response(rng: random.Random, fenced: bool = True) -> str:
+    """Generate a model answer shaped like the chatbot system prompt asks for"""
+    payload = json.dumps({
+        'action': 'create_note',
+        'parameters': {
+            'title': note_title(rng),
+            'content': words(rng, 40),
+            'tags': rng.sample(TAG_POOL, 3),
+        },
+        'message': words(rng, 12),
+    }, indent=2)
+    return f"```json\n{payload}\n```" if fenced else payload
@@ -0,0 +1,182 @@
+"""
+Change feed
+Log of events (data changes, due reminders) that clients read with a cursor; kept in memory,
+or in the shared store when several worker processes serve the API
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from shared_state import get_shared_store
+
+CHANGE_FEED_SIZE = int(os.getenv('CHANGE_FEED_SIZE', '5000'))
+MAX_WAIT_S = float(os.getenv('CHANGE_FEED_MAX_WAIT_S', '25'))
+# Long-polls one process holds at once. Under gunicorn's gthread workers each one occupies a
+# worker thread for its whole wait, so by default they may take half of WEB_THREADS
+CHANGE_FEED_MAX_WAITERS = int(os.getenv('CHANGE_FEED_MAX_WAITERS', str(max(1, int(os.getenv('WEB_THREADS', '4')) // 2))))
+# Readers turned away from a long-poll are told to come back after this long
+CHANGE_FEED_BUSY_RETRY_S = 5.0
+# How often a waiting reader rechecks the shared store for events published by other processes
+SHARED_POLL_S = 0.25
+
+
+class ChangeFeed:
+    """
+    Bounded sequence of events, each addressed to a set of users
+
+    Sequence numbers are contiguous, so a reader's position maps straight to an index in the
+    buffer. Readers that fall behind the oldest retained event are told to resync.
+    """
+
+    def __init__(self, max_events: int = CHANGE_FEED_SIZE):
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+        self._cond = threading.Condition()
+        # Cursors from before a restart must not be mistaken for current ones
+        self.epoch = format(int(time.time() * 1000), 'x')
+
+    def publish(self, user_ids: Iterable[int], event_type: str, payload: Optional[Dict] = None) -> int:
+        """Append an event for these users and wake waiting readers; returns its sequence number"""
+        recipients = frozenset(user_ids)
+        if not recipients:
+            return self._seq
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, recipients, event_type, payload or {}, time.time()))
+            self._cond.notify_all()
+            return self._seq
+
+    def _collect(self, user_id: int, since: int, limit: int) -> List[Dict]:
+        if not self._events:
+            return []
+        first_seq = self._events[0][0]
+        start = max(0, since - first_seq + 1)
+        events = []
+        for i in range(start, len(self._events)):
+            seq, recipients, event_type, payload, at = self._events[i]
+            if user_id in recipients:
+                events.append({'seq': seq, 'type': event_type, 'at': round(at, 3), **payload})
+                if len(events) >= limit:
+                    break
+        return events
+
+    def read(self, user_id: int, since: int, limit: int = 100, wait_s: float = 0.0) -> Dict:
+        """
+        Events for a user after sequence number `since`
+
+        With wait_s > 0 this long-polls: it blocks until a matching event arrives or the wait ends.
+        """
+        deadline = time.monotonic() + min(max(wait_s, 0.0), MAX_WAIT_S)
+        with self._cond:
+            # A cursor ahead of us comes from before a restart; one behind the buffer lost events
+            resync = since > self._seq or (bool(self._events) and since < self._events[0][0] - 1)
+            if resync:
+                since = self._seq
+            while True:
+                events = self._collect(user_id, since, limit)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            cursor = events[-1]['seq'] if len(events) >= limit else self._seq
+        return {'epoch': self.epoch, 'cursor': cursor, 'resync': resync, 'events': events}
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'epoch': self.epoch,
+                'seq': self._seq,
+                'retained': len(self._events),
+                'capacity': self._events.maxlen,
+            }
+
+
+class SharedChangeFeed:
+    """
+    ChangeFeed whose events live in the shared store (see shared_state.py)
+
+    Used when several worker processes serve the API: an event published by one worker
+    reaches readers long-polling on any other. Same interface as ChangeFeed.
+    """
+
+    def __init__(self, store, max_events: int = CHANGE_FEED_SIZE):
+        self.store = store
+        self.max_events = max_events
+        self._cond = threading.Condition()
+        self.epoch = store.epoch
+
+    def publish(self, user_ids: Iterable[int], event_type: str, payload: Optional[Dict] = None) -> int:
+        recipients = frozenset(user_ids)
+        if not recipients:
+            return self.store.feed_bounds()[1]
+        seq = self.store.append_event(recipients, event_type, payload or {}, self.max_events)
+        # Readers in this process need not wait for their next poll
+        with self._cond:
+            self._cond.notify_all()
+        return seq
+
+    def read(self, user_id: int, since: int, limit: int = 100, wait_s: float = 0.0) -> Dict:
+        deadline = time.monotonic() + min(max(wait_s, 0.0), MAX_WAIT_S)
+        first_seq, last_seq = self.store.feed_bounds()
+        resync = since > last_seq or (first_seq > 0 and since < first_seq - 1)
+        if resync:
+            since = last_seq
+        while True:
+            # Read the head first: events published after it are left for the next call
+            last_seq = self.store.feed_bounds()[1]
+            rows = self.store.events_for(user_id, since, last_seq, limit)
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                break
+            with self._cond:
+                self._cond.wait(min(remaining, SHARED_POLL_S))
+        events = [{'seq': seq, 'type': event_type, 'at': round(at, 3), **json.loads(payload)}
+                  for seq, event_type, payload, at in rows]
+        cursor = events[-1]['seq'] if len(events) >= limit else last_seq
+        return {'epoch': self.epoch, 'cursor': cursor, 'resync': resync, 'events': events}
+
+    def stats(self) -> Dict:
+        return {
+            'epoch': self.epoch,
+            'seq': self.store.feed_bounds()[1],
+            'retained': self.store.count_events(),
+            'capacity': self.max_events,
+            'shared': True,
+        }
+
+
+_wait_slots = threading.BoundedSemaphore(max(1, CHANGE_FEED_MAX_WAITERS))
+
+
+@contextmanager
+def wait_slot():
+    """
+    Claim one of the process's long-poll slots without blocking; yields whether one was free
+
+    A reader that gets none should read without waiting, so the request returns at once
+    instead of holding a thread that normal requests need.
+    """
+    granted = _wait_slots.acquire(blocking=False)
+    try:
+        yield granted
+    finally:
+        if granted:
+            _wait_slots.release()
+
+
+# Global instance
+_change_feed = None
+
+
+def get_change_feed():
+    """Get or create the change feed instance (shared between processes when SHARED_STATE_PATH is set)"""
+    global _change_feed
+    if _change_feed is None:
+        store = get_shared_store()
+        _change_feed = SharedChangeFeed(store) if store is not None else ChangeFeed()
+    return _change_feed
@@ -0,0 +1,184 @@
+"""
+Chatbot action plans
+Validation and reference resolution for the ordered action lists the chatbot may return,
+so "create three notes, tag them and bookmark the first" runs as one checked transaction,
+and paging for its read actions
+"""
+
+import os
+import re
+from typing import Dict, List, Tuple
+
+# Longest plan accepted from the model
+PLAN_MAX_STEPS = int(os.getenv('PLAN_MAX_STEPS', '20'))
+
+# Write actions the executor implements: required parameters, and the id a step produces
+WRITE_ACTIONS = {
+    'create_note': {'required': (), 'produces': 'note_id'},
+    'create_notebook': {'required': (), 'produces': 'notebook_id'},
+    'update_note': {'required': ('note_id',)},
+    'delete_note': {'required': ('note_id',)},
+    'add_tags_to_note': {'required': ('note_id', 'tags')},
+    'bookmark_note': {'required': ('note_id',)},
+    'unbookmark_note': {'required': ('note_id',)},
+    'share_note': {'required': ('note_id', 'user_id')},
+    'mark_reminder_done': {'required': ('reminder_id',)},
+}
+# Read actions the executor answers, a page at a time
+READ_ACTIONS = {
+    'get_notes', 'search_notes', 'get_note', 'get_notebooks', 'get_bookmarks', 'get_reminders',
+    'get_stats', 'get_collaborators', 'get_tags', 'get_categories', 'get_users', 'get_current_user',
+}
+CHATBOT_READ_PAGE_SIZE = int(os.getenv('CHATBOT_READ_PAGE_SIZE', '10'))
+# Hard cap on the items one read returns, whatever the model asks for
+CHATBOT_READ_MAX_ITEMS = 25
+
+# Parameters holding an id, which may also be a "$N" reference to an earlier step
+ID_PARAMETERS = ('note_id', 'notebook_id', 'reminder_id', 'user_id', 'category_id')
+# "$2" is the id step 2 produced; "$2.note_id" names the field explicitly
+_REFERENCE_RE = re.compile(r'^\$(\d+)(?:\.(\w+))?$')
+
+
+class PlanError(ValueError):
+    """The plan is malformed; nothing was executed"""
+
+
+class PlanStepError(Exception):
+    """A step could not be carried out; the whole plan is rolled back"""
+
+
+def plan_steps(action_result: Dict) -> List[Dict]:
+    """
+    Validated steps of a chatbot result: the steps of a "plan", or the single action
+
+    Returns:
+        [{'action': ..., 'parameters': {...}}, ...] with tags normalised to lists
+
+    Raises:
+        PlanError: If an action is unknown, a parameter is missing or a reference does not
+            point to an earlier step that produces that id
+    """
+    is_plan = action_result.get('action') == 'plan'
+    if is_plan:
+        steps = action_result.get('steps')
+        if not isinstance(steps, list) or not steps:
+            raise PlanError('The plan has no steps')
+    else:
+        steps = [action_result]
+    if len(steps) > PLAN_MAX_STEPS:
+        raise PlanError(f'The plan has {len(steps)} steps; at most {PLAN_MAX_STEPS} are allowed')
+
+    validated = []
+    for number, step in enumerate(steps, start=1):
+        if not isinstance(step, dict):
+            raise PlanError(f'Step {number} is not an action')
+        action = step.get('action')
+        where = f'Step {number} ({action})' if is_plan else f'Action "{action}"'
+        spec = WRITE_ACTIONS.get(action)
+        if spec is None:
+            raise PlanError(f'{where} is not supported')
+        params = step.get('parameters') or {}
+        if not isinstance(params, dict):
+            raise PlanError(f'{where} has malformed parameters')
+        params = dict(params)
+        for name in spec['required']:
+            if params.get(name) in (None, '', []):
+                raise PlanError(f'{where} needs {name}')
+        if isinstance(params.get('tags'), str):
+            params['tags'] = [params['tags']]
+        for name in ID_PARAMETERS:
+            if name in params and params[name] is not None:
+                _check_id(params[name], name, number, where, validated)
+        validated.append({'action': action, 'parameters': params})
+    return validated
+
+
+def plan_note_ids(steps: List[Dict]) -> List[int]:
+    """Notes the steps name by id (not by "$N" reference), to resolve their permissions in one query"""
+    note_ids = []
+    for step in steps:
+        value = step['parameters'].get('note_id')
+        if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+            note_ids.append(int(value))
+    return note_ids
+
+
+def read_page(params: Dict) -> Tuple[int, int]:
+    """
+    (offset, limit) of the page a read action asks for
+
+    The cursor is the offset of the first item, as returned in next_cursor.
+
+    Raises:
+        PlanError: If cursor or limit is not a number
+    """
+    try:
+        offset = max(0, int(params.get('cursor') or 0))
+        limit = int(params.get('limit') or CHATBOT_READ_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise PlanError('cursor and limit must be numbers')
+    return offset, max(1, min(limit, CHATBOT_READ_MAX_ITEMS))
+
+
+def _check_id(value, name: str, number: int, where: str, earlier: List[Dict]):
+    if isinstance(value, bool):
+        raise PlanError(f'{where}: {name} must be an id')
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return
+    match = _REFERENCE_RE.match(str(value))
+    if not match:
+        raise PlanError(f'{where}: {name} must be an id or a $N step reference')
+    target = int(match.group(1))
+    if not 1 <= target < number:
+        raise PlanError(f'{where}: {value} does not refer to an earlier step')
+    produces = WRITE_ACTIONS[earlier[target - 1]['action']].get('produces')
+    if produces is None or (match.group(2) or produces) != produces:
+        raise PlanError(f'{where}: step {target} does not produce {match.group(2) or "an id"}')
+    # An id parameter only takes the same kind of id: a note_id is never a notebook_id
+    if produces != name:
+        raise PlanError(f'{where}: {name} cannot be {value}, step {target} produces a {produces}')
+
+
+def resolve_references(params: Dict, steps: List[Dict], outputs: List[Dict]) -> Dict:
+    """Replace "$N" references with the ids earlier steps produced, and id strings with ints"""
+    resolved = dict(params)
+    for name in ID_PARAMETERS:
+        value = resolved.get(name)
+        if isinstance(value, str):
+            match = _REFERENCE_RE.match(value)
+            if match:
+                target = int(match.group(1)) - 1
+                field = match.group(2) or WRITE_ACTIONS[steps[target]['action']]['produces']
+                resolved[name] = outputs[target][field]
+            else:
+                resolved[name] = int(value)
+    return resolved
+
+
+class ActionEffects:
+    """
+    What a plan changed, for the caches and indexes to pick up once it has committed
+
+    On rollback only the cached permissions of the notes it touched are dropped, so a failed
+    plan leaves no trace in the tag or duplicate indexes.
+    """
+
+    def __init__(self):
+        self.changed_users = set()
+        self.access_notes = set()
+        self.tags_added: List[Dict[int, str]] = []
+        self.tags_removed: List[int] = []
+        self.note_tags: Dict[int, List[str]] = {}  # note_id -> names of tags attached
+        self.texts: Dict[int, tuple] = {}      # note_id -> (title, content) to (re)index
+        self.deleted_notes = set()
+        self.tag_ids: Dict[str, int] = {}      # lowercased tag name -> tag_id, per transaction
+        self.last_note_id = None
+
+    def note_text(self, note_id: int, title: str, content: str):
+        self.texts[note_id] = (title, content)
+        self.deleted_notes.discard(note_id)
+
+    def note_deleted(self, note_id: int):
+        self.texts.pop(note_id, None)
+        self.note_tags.pop(note_id, None)
+        self.deleted_notes.add(note_id)
@@ -3,16 +3,54 @@ AI Chatbot Service for Knowledge Base Management
 Uses Google Gemini to understand natural language and execute operations
 """
 
+import asyncio
 import json
 import re
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
+from metrics import timed
+from resilience import get_model_guard, ModelUnavailableError
+from ai_service import configure_gemini, generate_content_async
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
 
+# Markdown code fences the model sometimes wraps its JSON in
+_CODE_FENCE_RE = re.compile(r'```(?:json)?\s*')
+
+# Commands simple enough to map to an action without the model. A pattern must match the
+# whole message; anything longer or vaguer goes to Gemini. "it" / "that one" refer to the
+# object the conversation last acted on (see conversation_memory.py). Deletes need an
+# explicit id: that reference may be an hour old, so "delete it" goes to the model.
+_NOTE_ID = r'(?:the\s+)?note\s*(?:#|number\s+)?(?P<id>\d+)'
+_NOTE = r'(?:' + _NOTE_ID + r'|(?P<ref>it|this(?:\s+(?:one|note))?|that(?:\s+(?:one|note))?))'
+_REMINDER = r'(?:(?:the\s+)?reminder\s*(?:#|number\s+)?(?P<id>\d+)|(?P<ref>it|this(?:\s+one)?|that(?:\s+one)?))'
+_LOCAL_INTENT_PATTERNS = [
+    ('unbookmark_note', 'note', r'(?:unbookmark|unstar)\s+' + _NOTE),
+    ('unbookmark_note', 'note', r'remove\s+(?:the\s+)?bookmark\s+(?:from|on|for)\s+' + _NOTE),
+    ('unbookmark_note', 'note', r'remove\s+' + _NOTE + r'\s+from\s+(?:my\s+)?bookmarks'),
+    ('bookmark_note', 'note', r'(?:bookmark|star)\s+' + _NOTE),
+    ('delete_note', 'note', r'(?:delete|remove|trash)\s+' + _NOTE_ID),
+    ('mark_reminder_done', 'reminder', r'(?:mark|set)\s+' + _REMINDER + r'\s+(?:as\s+)?(?:done|completed?|finished)'),
+    ('mark_reminder_done', 'reminder', r'(?:complete|finish)\s+' + _REMINDER),
+    ('share_note', 'note', r'share\s+' + _NOTE + r'\s+with\s+user\s*(?:#|id\s+)?(?P<user_id>\d+)'
+                           r'(?:\s+(?:as|with)\s+(?P<access_level>read|write)(?:\s+access)?)?'),
+]
+_LOCAL_INTENTS = [(action, kind, re.compile(r'^(?:please\s+)?' + pattern + r'(?:\s+please)?\s*[.!]?$', re.IGNORECASE))
+                  for action, kind, pattern in _LOCAL_INTENT_PATTERNS]
+# Continues the last paged listing (see execute_chatbot_read)
+_MORE_RE = re.compile(r'^(?:please\s+)?(?:show\s+(?:me\s+)?)?(?:more|next(?:\s+page)?|the\s+next\s+ones?|continue)'
+                      r'(?:\s+please)?\s*[.!]?$', re.IGNORECASE)
+_LOCAL_INTENT_MESSAGES = {
+    'unbookmark_note': 'Removing the bookmark from note {id}.',
+    'bookmark_note': 'Bookmarking note {id}.',
+    'delete_note': 'Deleting note {id}.',
+    'mark_reminder_done': 'Marking reminder {id} as done.',
+    'share_note': 'Sharing note {id} with user {user_id} ({access_level} access).',
+}
+
 
 class KnowledgeBaseChatbot:
     """Chatbot that can answer questions and perform operations on the Knowledge Base"""
@@ -21,11 +59,10 @@ class KnowledgeBaseChatbot:
         """Initialize the chatbot with Gemini API"""
         self.api_key = api_key
         self.model = None
-        self.conversation_history = []
         
         if api_key and GEMINI_AVAILABLE:
             try:
-                genai.configure(api_key=api_key)
+                configure_gemini(api_key)
                 # Try different model names - Google has changed model names over time
                 model_names = [
                     'gemini-1.5-flash',
@@ -104,6 +141,25 @@ class KnowledgeBaseChatbot:
         
         return False
     
+    def _generate_content(self, prompt: str):
+        """
+        Call the Gemini model, recording the call latency
+        
+        Raises:
+            ModelUnavailableError: If the call timed out or the circuit breaker is open
+        """
+        def call():
+            with timed('llm_call_ms', service='chatbot'):
+                return self.model.generate_content(prompt)
+        return get_model_guard().call(call, 'chatbot')
+    
+    async def _generate_content_async(self, prompt: str):
+        """Async counterpart of _generate_content (same deadline and breaker)"""
+        async def call():
+            with timed('llm_call_ms', service='chatbot'):
+                return await generate_content_async(self.model, prompt)
+        return await get_model_guard().call_async(call, 'chatbot')
+    
     def get_system_prompt(self) -> str:
         """Get the system prompt that defines the chatbot's capabilities"""
         return """You are an AI assistant for a Personal Knowledge Base Management System. You can help users manage their notes, notebooks, bookmarks, reminders, and more.
@@ -112,7 +168,7 @@ AVAILABLE OPERATIONS:
 
 1. NOTES:
    - create_note(title, content, category_id=None, notebook_id=None, tags=[], is_public=False)
-   - get_notes() - List all notes
+   - get_notes(tag_ids=None, tag_mode='and', category_id=None, notebook_id=None) - List notes, newest first
    - get_note(note_id) - Get specific note
    - update_note(note_id, title=None, content=None, is_public=None)
    - delete_note(note_id)
@@ -121,7 +177,6 @@ AVAILABLE OPERATIONS:
 2. NOTEBOOKS:
    - create_notebook(title, description=None)
    - get_notebooks() - List all notebooks
-   - get_notebook(notebook_id)
 
 3. BOOKMARKS:
    - bookmark_note(note_id)
@@ -148,6 +203,11 @@ AVAILABLE OPERATIONS:
    - get_users() - List all users
    - get_current_user() - Get current user info
 
+Read operations (get_*, search_notes) return at most 25 items per call. To continue a listing,
+repeat the action with "cursor" set to the next_cursor of the previous result. Add
+"summarize": true to a read action only when the user wants the results summarised, compared
+or explained rather than listed; the results are then sent back to you for a short answer.
+
 When a user asks you to perform an operation, respond with a JSON object in this format:
 {
     "action": "operation_name",
@@ -155,6 +215,19 @@ When a user asks you to perform an operation, respond with a JSON object in this
     "message": "Friendly message explaining what you're doing"
 }
 
+When a request needs several operations, respond with a plan. Its steps run in order in a
+single transaction: either all of them succeed or nothing is changed. Refer to the id created
+by an earlier step as "$N" (N is the step number, starting at 1):
+{
+    "action": "plan",
+    "steps": [
+        {"action": "create_note", "parameters": {"title": "...", "content": "..."}},
+        {"action": "add_tags_to_note", "parameters": {"note_id": "$1", "tags": ["study"]}},
+        {"action": "bookmark_note", "parameters": {"note_id": "$1"}}
+    ],
+    "message": "Friendly message explaining what you're doing"
+}
+
 For questions or information requests, respond with:
 {
     "action": "answer",
@@ -175,6 +248,80 @@ IMPORTANT:
 - If a note_id is needed but not provided, ask the user
 """
 
+    def _build_prompt(self, user_message: str, context: Dict = None) -> str:
+        """Combine the system prompt, the context and the user's message"""
+        # Build context information
+        context_info = ""
+        if context:
+            if 'notes' in context:
+                context_info += f"\n\nAvailable Notes (first 5): {json.dumps(context['notes'][:5], indent=2)}"
+            if 'notebooks' in context:
+                context_info += f"\n\nAvailable Notebooks: {json.dumps(context['notebooks'], indent=2)}"
+            if 'categories' in context:
+                context_info += f"\n\nAvailable Categories: {json.dumps(context['categories'], indent=2)}"
+            if 'tags' in context:
+                context_info += f"\n\nAvailable Tags: {json.dumps(context['tags'], indent=2)}"
+            if 'users' in context:
+                context_info += f"\n\nAvailable Users: {json.dumps(context['users'], indent=2)}"
+            if 'current_user' in context:
+                context_info += f"\n\nCurrent User: {json.dumps(context['current_user'], indent=2)}"
+            if context.get('conversation'):
+                context_info += self._conversation_info(context['conversation'])
+        
+        # Build the prompt
+        prompt = f"""{self.get_system_prompt()}
+
+{context_info}
+
+User Message: "{user_message}"
+
+Analyze the user's request and respond with a JSON object. If the user wants to perform an operation, provide the action and parameters. If it's a question, provide an answer.
+
+Response (JSON only):"""
+        return prompt
+    
+    @staticmethod
+    def _conversation_info(conversation: Dict) -> str:
+        """Earlier exchanges with this user (see conversation_memory.py)"""
+        info = ""
+        if conversation['summary']:
+            info += "\n\nEarlier in this conversation:\n" + "\n".join(f"- {line}" for line in conversation['summary'])
+        if conversation['turns']:
+            info += "\n\nRecent conversation:\n" + "\n".join(
+                f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in conversation['turns'])
+        if conversation['last_referenced']:
+            info += f"\n\nMost recently referenced: {json.dumps(conversation['last_referenced'])}"
+            info += "\nResolve references like \"it\", \"that one\" or \"the same note\" to these ids."
+        return info
+    
+    @staticmethod
+    def _summary_prompt(user_message: str, read_result: Dict) -> str:
+        """Compact second-pass prompt: the user's request and the records a read action returned"""
+        records = read_result.get('items', read_result.get('item'))
+        return f"""Answer the user's request in a few sentences using only these records from their knowledge base.
+Refer to notes by title. Plain text, no JSON.
+
+User request: "{user_message}"
+Records: {json.dumps(records, separators=(',', ':'), default=str)}
+"""
+    
+    def summarize_results(self, user_message: str, read_result: Dict) -> Optional[str]:
+        """Second model pass over read results; None if the model is unavailable (keep the listing)"""
+        try:
+            return self._generate_content(self._summary_prompt(user_message, read_result)).text.strip()
+        except Exception as e:
+            print(f"Error summarizing results: {e}")
+            return None
+    
+    async def summarize_results_async(self, user_message: str, read_result: Dict) -> Optional[str]:
+        """Async counterpart of summarize_results"""
+        try:
+            response = await self._generate_content_async(self._summary_prompt(user_message, read_result))
+            return response.text.strip()
+        except Exception as e:
+            print(f"Error summarizing results: {e}")
+            return None
+    
     def process_message(self, user_message: str, context: Dict = None) -> Dict:
         """
         Process a user message and determine the action to take
@@ -193,36 +340,11 @@ IMPORTANT:
             }
         
         try:
-            # Build context information
-            context_info = ""
-            if context:
-                if 'notes' in context:
-                    context_info += f"\n\nAvailable Notes (first 5): {json.dumps(context['notes'][:5], indent=2)}"
-                if 'notebooks' in context:
-                    context_info += f"\n\nAvailable Notebooks: {json.dumps(context['notebooks'], indent=2)}"
-                if 'categories' in context:
-                    context_info += f"\n\nAvailable Categories: {json.dumps(context['categories'], indent=2)}"
-                if 'tags' in context:
-                    context_info += f"\n\nAvailable Tags: {json.dumps(context['tags'], indent=2)}"
-                if 'users' in context:
-                    context_info += f"\n\nAvailable Users: {json.dumps(context['users'], indent=2)}"
-                if 'current_user' in context:
-                    context_info += f"\n\nCurrent User: {json.dumps(context['current_user'], indent=2)}"
+            prompt = self._build_prompt(user_message, context)
             
-            # Build the prompt
-            prompt = f"""{self.get_system_prompt()}
-
-{context_info}
-
-User Message: "{user_message}"
-
-Analyze the user's request and respond with a JSON object. If the user wants to perform an operation, provide the action and parameters. If it's a question, provide an answer.
-
-Response (JSON only):"""
-
             # Get response from Gemini - with retry logic if model fails
             try:
-                response = self.model.generate_content(prompt)
+                response = self._generate_content(prompt)
                 response_text = response.text.strip()
             except Exception as model_error:
                 # If model call fails, try to find a working model
@@ -230,35 +352,58 @@ Response (JSON only):"""
                     print(f"Model failed, trying to find working model...")
                     if self._try_find_working_model():
                         # Retry with new model
-                        response = self.model.generate_content(prompt)
+                        response = self._generate_content(prompt)
                         response_text = response.text.strip()
                     else:
                         raise model_error
                 else:
                     raise model_error
             
-            # Clean the response (remove markdown code blocks if present)
-            response_text = re.sub(r'```json\s*', '', response_text)
-            response_text = re.sub(r'```\s*', '', response_text)
-            response_text = response_text.strip()
-            
-            # Try to parse JSON response
+            return self.parse_response(response_text)
+        
+        except ModelUnavailableError as e:
+            # Fail fast while Gemini is slow or down rather than holding the request
+            return {
+                "action": "answer",
+                "message": f"The AI assistant is temporarily unavailable ({e}). Please try again in a moment."
+            }
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            return {
+                "action": "answer",
+                "message": f"I encountered an error: {str(e)}. Please try rephrasing your request."
+            }
+    
+    async def process_message_async(self, user_message: str, context: Dict = None) -> Dict:
+        """Async version of process_message, used by the ASGI server"""
+        if not self.is_available():
+            return {
+                "action": "answer",
+                "message": "I'm sorry, the AI chatbot is not available. Please set GEMINI_API_KEY in your .env file."
+            }
+        
+        try:
+            prompt = self._build_prompt(user_message, context)
             try:
-                result = json.loads(response_text)
-                
-                # Validate the response structure
-                if 'action' not in result:
-                    result = {"action": "answer", "message": response_text}
-                
-                return result
-                
-            except json.JSONDecodeError:
-                # If JSON parsing fails, treat as a direct answer
-                return {
-                    "action": "answer",
-                    "message": response_text
-                }
-                
+                response = await self._generate_content_async(prompt)
+            except ModelUnavailableError:
+                raise
+            except Exception as model_error:
+                # Model listing is a blocking call; keep it off the event loop
+                if "404" in str(model_error) or "not found" in str(model_error).lower():
+                    print(f"Model failed, trying to find working model...")
+                    if not await asyncio.to_thread(self._try_find_working_model):
+                        raise
+                    response = await self._generate_content_async(prompt)
+                else:
+                    raise
+            return self.parse_response(response.text.strip())
+        
+        except ModelUnavailableError as e:
+            return {
+                "action": "answer",
+                "message": f"The AI assistant is temporarily unavailable ({e}). Please try again in a moment."
+            }
         except Exception as e:
             print(f"Error processing message: {e}")
             return {
@@ -266,6 +411,72 @@ Response (JSON only):"""
                 "message": f"I encountered an error: {str(e)}. Please try rephrasing your request."
             }
     
+    @staticmethod
+    def parse_response(response_text: str) -> Dict:
+        """Parse the model's answer into an action dict, treating non-JSON text as a direct answer"""
+        # Clean the response (remove markdown code blocks if present)
+        response_text = _CODE_FENCE_RE.sub('', response_text).strip()
+        
+        # Try to parse JSON response
+        try:
+            result = json.loads(response_text)
+        except json.JSONDecodeError:
+            # If JSON parsing fails, treat as a direct answer
+            return {
+                "action": "answer",
+                "message": response_text
+            }
+        
+        # Validate the response structure
+        if not isinstance(result, dict) or 'action' not in result:
+            result = {"action": "answer", "message": response_text}
+        
+        return result
+    
+    def parse_local_intent(self, message: str, conversation: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Map an unambiguous command ("bookmark note 12", "mark reminder 4 done", "delete note 7")
+        straight to an action, without a model call
+        
+        Args:
+            message: The user's message
+            conversation: Conversation memory context, used to resolve "it" / "that one"
+        
+        Returns:
+            The same action dict process_message would return, or None if the model is needed
+        """
+        text = ' '.join(message.split())
+        if _MORE_RE.match(text):
+            listing = ((conversation or {}).get('last_referenced') or {}).get('listing')
+            if not listing:
+                return None
+            return {
+                'action': listing['action'],
+                'parameters': {**listing['parameters'], 'cursor': listing['cursor']},
+                'message': 'Here are more.'
+            }
+        for action, kind, pattern in _LOCAL_INTENTS:
+            match = pattern.match(text)
+            if not match:
+                continue
+            if match.group('id'):
+                object_id = int(match.group('id'))
+            else:
+                referenced = ((conversation or {}).get('last_referenced') or {}).get(kind)
+                if not referenced:
+                    return None  # "it" with nothing to refer to: let the model ask
+                object_id = referenced['id']
+            parameters = {f'{kind}_id': object_id}
+            if action == 'share_note':
+                parameters['user_id'] = int(match.group('user_id'))
+                parameters['access_level'] = (match.group('access_level') or 'read').lower()
+            return {
+                'action': action,
+                'parameters': parameters,
+                'message': _LOCAL_INTENT_MESSAGES[action].format(id=object_id, **parameters)
+            }
+        return None
+    
     def extract_note_info(self, message: str) -> Dict:
         """
         Extract note information from a natural language message
@@ -290,7 +501,7 @@ Response (JSON only):"""
 _chatbot = None
 
 def get_chatbot(api_key: str = None) -> KnowledgeBaseChatbot:
-    """Get or create the global chatbot instance"""
+    """Get or create the global chatbot instance (per process; it holds only the model client)"""
     global _chatbot
     if _chatbot is None:
         _chatbot = KnowledgeBaseChatbot(api_key)
@@ -0,0 +1,235 @@
+"""
+Chatbot conversation memory
+Per-user window of recent exchanges plus a running summary of older ones, kept within a
+token budget so follow-ups ("delete that one") can be resolved without resending context
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from shared_state import get_shared_store
+
+# Recent exchanges (a user message and the reply) kept verbatim
+CHAT_MEMORY_TURNS = int(os.getenv('CHAT_MEMORY_TURNS', '6'))
+# Estimated tokens the verbatim window and the summary may use in a prompt together
+CHAT_MEMORY_TOKEN_BUDGET = int(os.getenv('CHAT_MEMORY_TOKEN_BUDGET', '800'))
+# Conversations idle this long start over
+CHAT_MEMORY_TTL_S = float(os.getenv('CHAT_MEMORY_TTL_S', '3600'))
+CHAT_MEMORY_MAX_USERS = int(os.getenv('CHAT_MEMORY_MAX_USERS', '1000'))
+
+# Share of the budget the summary may keep; the rest is for the verbatim window
+SUMMARY_BUDGET_SHARE = 0.35
+# Longest excerpt of a message kept in a summary line
+SUMMARY_EXCERPT_CHARS = 80
+# Parameters and execution results that name the object a turn was about
+_REFERENCE_KEYS = (('note_id', 'note'), ('notebook_id', 'notebook'), ('reminder_id', 'reminder'))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def _excerpt(text: str, limit: int = SUMMARY_EXCERPT_CHARS) -> str:
+    text = ' '.join((text or '').split())
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def _turn_tokens(turn: Dict) -> int:
+    return estimate_tokens(turn['user']) + estimate_tokens(turn['assistant'])
+
+
+def extract_references(result: Dict, execution_result: Optional[Dict]) -> Dict[str, Dict]:
+    """
+    Objects a chatbot exchange acted on, e.g. {'note': {'id': 7, 'title': 'Groceries'}}, and
+    under 'listing' the read action a "more" would continue
+    """
+    params = result.get('parameters') or {}
+    references = {}
+    for source in (params, execution_result or {}):
+        for key, kind in _REFERENCE_KEYS:
+            value = source.get(key)
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                references[kind] = {'id': int(value)}
+    if execution_result and 'next_cursor' in execution_result:
+        # A paged read: "more" continues it; a finished listing has nothing to continue
+        references['listing'] = None
+        if execution_result['next_cursor'] is not None:
+            references['listing'] = {
+                'action': result.get('action'),
+                'parameters': {k: v for k, v in params.items() if k != 'cursor'},
+                'cursor': execution_result['next_cursor'],
+            }
+    if 'note' in references and params.get('title') and result.get('action') == 'create_note':
+        references['note']['title'] = params['title']
+    elif 'notebook' in references and params.get('title') and result.get('action') == 'create_notebook':
+        references['notebook']['title'] = params['title']
+    return references
+
+
+def summarize_turn(turn: Dict) -> str:
+    """One line standing in for an exchange that left the verbatim window"""
+    line = f'User: "{_excerpt(turn["user"])}"'
+    action = turn.get('action')
+    if action and action not in ('answer', 'clarify'):
+        line += f' -> {action}'
+    refs = ', '.join(f"{kind} {ref['id']}" for kind, ref in turn.get('references', {}).items()
+                     if ref and 'id' in ref)
+    if refs:
+        line += f' ({refs})'
+    elif action in ('answer', 'clarify'):
+        line += f' -> "{_excerpt(turn["assistant"], SUMMARY_EXCERPT_CHARS // 2)}"'
+    return line
+
+
+class ConversationMemory:
+    """
+    Bounded conversation state per user
+
+    The newest exchanges are kept verbatim. When there are more than `max_turns` of them,
+    or they and the summary exceed the token budget, the oldest are folded into the summary
+    as one line each (what was asked, which action ran on which object); the summary in
+    turn drops its oldest lines past its share of the budget. The last note, notebook and
+    reminder acted on are tracked separately, so "that one" stays resolvable after the
+    turn that named it was summarised.
+
+    Summaries are built locally rather than by the model, so remembering costs no extra
+    model call.
+    """
+
+    def __init__(self, max_turns: int = CHAT_MEMORY_TURNS, token_budget: int = CHAT_MEMORY_TOKEN_BUDGET,
+                 ttl_s: float = CHAT_MEMORY_TTL_S, max_users: int = CHAT_MEMORY_MAX_USERS):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.ttl_s = ttl_s
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._states: 'OrderedDict[int, Dict]' = OrderedDict()
+        self.summarised_turns = 0
+
+    # Storage (overridden by SharedConversationMemory)
+
+    def _load(self, user_id: int) -> Optional[Dict]:
+        state = self._states.get(user_id)
+        if state is not None:
+            self._states.move_to_end(user_id)
+        return state
+
+    def _save(self, user_id: int, state: Dict):
+        self._states[user_id] = state
+        self._states.move_to_end(user_id)
+        while len(self._states) > self.max_users:
+            self._states.popitem(last=False)
+
+    def _delete(self, user_id: int):
+        self._states.pop(user_id, None)
+
+    def _current(self, user_id: int) -> Optional[Dict]:
+        state = self._load(user_id)
+        if state is not None and time.time() - state['at'] > self.ttl_s:
+            self._delete(user_id)
+            return None
+        return state
+
+    # Public API
+
+    def context_for(self, user_id: int) -> Optional[Dict]:
+        """What the prompt should carry about earlier exchanges, or None for a fresh conversation"""
+        with self._lock:
+            state = self._current(user_id)
+        if not state:
+            return None
+        return {
+            'summary': list(state['summary']),
+            'turns': [{'user': t['user'], 'assistant': t['assistant']} for t in state['turns']],
+            'last_referenced': dict(state['references']),
+        }
+
+    def record(self, user_id: int, message: str, result: Dict, execution_result: Optional[Dict] = None):
+        """Remember one exchange and compact the conversation back within its bounds"""
+        reply = result.get('message', '')
+        if execution_result and execution_result.get('message'):
+            reply = f"{reply} [{execution_result['message']}]".strip()
+        references = extract_references(result, execution_result)
+        turn = {'user': message, 'assistant': reply, 'action': result.get('action'), 'references': references}
+
+        with self._lock:
+            state = self._current(user_id) or {'turns': [], 'summary': [], 'references': {}}
+            state['turns'].append(turn)
+            state['references'].update(references)
+            self._compact(state)
+            state['at'] = time.time()
+            self._save(user_id, state)
+
+    def _compact(self, state: Dict):
+        turns, summary = state['turns'], state['summary']
+        summary_budget = int(self.token_budget * SUMMARY_BUDGET_SHARE)
+        summary_tokens = sum(estimate_tokens(line) for line in summary)
+        window_tokens = sum(_turn_tokens(t) for t in turns)
+        # The newest exchange always stays verbatim
+        while len(turns) > 1 and (len(turns) > self.max_turns or
+                                  window_tokens + min(summary_tokens, summary_budget) > self.token_budget):
+            oldest = turns.pop(0)
+            window_tokens -= _turn_tokens(oldest)
+            line = summarize_turn(oldest)
+            summary.append(line)
+            summary_tokens += estimate_tokens(line)
+            self.summarised_turns += 1
+        while summary and summary_tokens > summary_budget:
+            summary_tokens -= estimate_tokens(summary.pop(0))
+
+    def clear(self, user_id: int):
+        with self._lock:
+            self._delete(user_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': len(self._states),
+                'max_turns': self.max_turns,
+                'token_budget': self.token_budget,
+                'summarised_turns': self.summarised_turns,
+                'shared': False,
+            }
+
+
+class SharedConversationMemory(ConversationMemory):
+    """ConversationMemory kept in the shared store, so any worker process can continue a conversation"""
+
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def _load(self, user_id: int) -> Optional[Dict]:
+        return self.store.get_chat_memory(user_id)
+
+    def _save(self, user_id: int, state: Dict):
+        self.store.put_chat_memory(user_id, state, self.ttl_s)
+
+    def _delete(self, user_id: int):
+        self.store.delete_chat_memory(user_id)
+
+    def stats(self) -> Dict:
+        return {
+            'users': self.store.count_chat_memories(),
+            'max_turns': self.max_turns,
+            'token_budget': self.token_budget,
+            'summarised_turns': self.summarised_turns,
+            'shared': True,
+        }
+
+
+# Global instance
+_conversation_memory = None
+
+
+def get_conversation_memory() -> ConversationMemory:
+    """Get or create the conversation memory (shared between processes when SHARED_STATE_PATH is set)"""
+    global _conversation_memory
+    if _conversation_memory is None:
+        store = get_shared_store()
+        _conversation_memory = SharedConversationMemory(store) if store is not None else ConversationMemory()
+    return _conversation_memory
@@ -0,0 +1,340 @@
+"""
+Near-duplicate detection
+MinHash signatures of note text grouped into LSH buckets, so notes with similar content
+are found by bucket lookups instead of comparing every pair of notes. Signatures are
+computed in a background thread; writes only queue the note's text.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Container, Dict, List, Optional, Tuple
+
+# Words per shingle; notes shorter than this are one shingle
+SHINGLE_SIZE = 3
+# 20 bands of 5 rows: a pair lands in a shared bucket with probability 1 - (1 - s^5)^20,
+# about 0.2 at Jaccard similarity 0.4, 0.97 at 0.7 and 0.999 at 0.8
+NUM_BANDS = 20
+ROWS_PER_BAND = 5
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+# Estimated Jaccard similarity at which two notes are reported as duplicates
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', '0.7'))
+# Reload from the database after this long, picking up notes written by other worker processes
+DUPLICATE_INDEX_MAX_AGE_S = float(os.getenv('DUPLICATE_INDEX_MAX_AGE_S', '600'))
+# Buckets larger than this are compared against one member instead of pairwise in reports
+REPORT_PAIRWISE_BUCKET_MAX = 32
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed: every process must derive the same hash functions
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize_text(title: str, content: str) -> List[str]:
+    return _WORD_RE.findall(f"{title or ''} {content or ''}".lower())
+
+
+def minhash_signature(words: List[str]) -> Optional[tuple]:
+    """MinHash signature of the word shingles, or None for empty text"""
+    if not words:
+        return None
+    size = min(SHINGLE_SIZE, len(words))
+    hashes = {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8'))
+              for i in range(len(words) - size + 1)}
+    p = _MERSENNE_PRIME
+    return tuple(min((a * h + b) % p for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def estimate_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """Estimated Jaccard similarity: the share of signature positions that agree"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _band_keys(signature: tuple) -> List[tuple]:
+    return [(band, hash(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+            for band in range(NUM_BANDS)]
+
+
+class DuplicateIndex:
+    """
+    MinHash/LSH index over all notes
+
+    A note's signature is split into bands; notes sharing any band land in the same bucket
+    and become candidates, which are then checked against the threshold with the full
+    signature. Lookups and the duplicate report only touch bucket members.
+
+    Computing a signature costs 100 hash permutations per shingle, so none of it happens
+    on request threads: index_note() only queues the note's text, and a background thread
+    (started by the first request) builds the index from the note table, applies queued
+    writes and reloads every max_age_s to pick up notes written by other processes. Each
+    queued write carries a sequence number; a signature whose note was written again or
+    removed while it was being computed is dropped.
+    """
+
+    def __init__(self, db=None, app=None, threshold: float = DUPLICATE_THRESHOLD,
+                 max_age_s: float = DUPLICATE_INDEX_MAX_AGE_S):
+        self.db = db
+        self.app = app
+        self.threshold = threshold
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._notes: Dict[int, tuple] = {}        # note_id -> (text checksum, signature)
+        self._buckets: Dict[tuple, set] = {}      # (band, band hash) -> note ids
+        self._pending: Dict[int, Tuple[int, str, str]] = {}  # note_id -> (seq, title, content)
+        self._latest: Dict[int, int] = {}         # note_id -> seq of its newest queued write
+        self._seq = 0
+        self._in_progress = 0                     # taken from _pending, signature being computed
+        self._loading = False
+        self._removed_while_loading: set = set()
+        self._loaded_at: Optional[float] = None
+        self._reload_requested = False
+        self._wake = threading.Event()
+        self._thread = None
+        self.last_load_ms = 0.0
+        self.signatures_computed = 0
+        self.last_error = None
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+
+    def ensure_started(self):
+        """Start the background thread once (called from a request hook, so only serving processes run it)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='duplicate-index', daemon=True)
+                self._thread.start()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def needs_load(self) -> bool:
+        return (self._loaded_at is None or self._reload_requested
+                or time.monotonic() - self._loaded_at >= self.max_age_s)
+
+    def request_reload(self):
+        """Rebuild from the note table soon (lookups keep using the current index meanwhile)"""
+        self._reload_requested = True
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                if self.needs_load():
+                    with self.app.app_context():
+                        cur = self.db.connection.cursor()
+                        try:
+                            self.load(cur)
+                        finally:
+                            cur.close()
+                self._apply_pending()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error in duplicate index: {e}")
+            with self._lock:
+                if self._pending and self.last_error is None:
+                    continue
+            sleep_s = self.max_age_s
+            if self._loaded_at is not None:
+                sleep_s = self._loaded_at + self.max_age_s - time.monotonic()
+            if self._wake.wait(max(1.0, sleep_s)):
+                self._wake.clear()
+
+    def load(self, cur):
+        """(Re)build the index from the note table, reusing signatures of unchanged notes"""
+        start = time.perf_counter()
+        self._reload_requested = False
+        with self._lock:
+            self._loading = True
+            self._removed_while_loading.clear()
+        try:
+            cur.execute("SELECT note_id, title, content FROM note")
+            rows = cur.fetchall()
+            with self._lock:
+                previous = self._notes
+            notes = {}
+            for note_id, title, content in rows:
+                entry = self._entry_for(title, content, previous.get(note_id))
+                if entry is not None:
+                    notes[note_id] = entry
+            with self._lock:
+                # Deleted after the SELECT read them; queued writes are applied after this
+                for note_id in self._removed_while_loading:
+                    notes.pop(note_id, None)
+                buckets = {}
+                for note_id, (_, signature) in notes.items():
+                    for key in _band_keys(signature):
+                        buckets.setdefault(key, set()).add(note_id)
+                self._notes = notes
+                self._buckets = buckets
+                self._loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._loading = False
+                self._removed_while_loading.clear()
+        self.last_load_ms = (time.perf_counter() - start) * 1000
+
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            previous = {note_id: self._notes.get(note_id) for note_id in pending}
+            self._in_progress = len(pending)
+        for note_id, (seq, title, content) in pending.items():
+            entry = self._entry_for(title, content, previous[note_id])
+            with self._lock:
+                self._in_progress -= 1
+                if self._latest.get(note_id) != seq:
+                    continue
+                del self._latest[note_id]
+                current = self._notes.get(note_id)
+                if current is not None and entry is current:
+                    continue
+                self._remove_locked(note_id)
+                if entry is not None:
+                    self._notes[note_id] = entry
+                    for key in _band_keys(entry[1]):
+                        self._buckets.setdefault(key, set()).add(note_id)
+
+    def _entry_for(self, title: str, content: str, previous: Optional[tuple]) -> Optional[tuple]:
+        words = normalize_text(title, content)
+        checksum = zlib.crc32(' '.join(words).encode('utf-8'))
+        if previous is not None and previous[0] == checksum:
+            return previous
+        signature = minhash_signature(words)
+        if signature is None:
+            return None
+        self.signatures_computed += 1
+        return checksum, signature
+
+    def index_note(self, note_id: int, title: str, content: str):
+        """Queue a note for (re-)indexing after a write; the background thread computes its signature"""
+        with self._lock:
+            self._seq += 1
+            self._pending[note_id] = (self._seq, title, content)
+            self._latest[note_id] = self._seq
+        self._wake.set()
+
+    def remove_note(self, note_id: int):
+        with self._lock:
+            self._pending.pop(note_id, None)
+            self._latest.pop(note_id, None)
+            if self._loading:
+                self._removed_while_loading.add(note_id)
+            self._remove_locked(note_id)
+
+    def _remove_locked(self, note_id: int):
+        entry = self._notes.pop(note_id, None)
+        if entry is None:
+            return
+        for key in _band_keys(entry[1]):
+            members = self._buckets.get(key)
+            if members is not None:
+                members.discard(note_id)
+                if not members:
+                    del self._buckets[key]
+
+    def similar_to(self, note_id: int, visible: Container[int], limit: int = 10) -> List[Dict]:
+        """Visible notes whose estimated similarity to note_id reaches the threshold, most similar first"""
+        with self._lock:
+            entry = self._notes.get(note_id)
+            if entry is None:
+                return []
+            signature = entry[1]
+            candidates = set()
+            for key in _band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(note_id)
+            scored = []
+            for candidate in candidates:
+                if candidate in visible:
+                    similarity = estimate_similarity(signature, self._notes[candidate][1])
+                    if similarity >= self.threshold:
+                        scored.append({'note_id': candidate, 'similarity': round(similarity, 3)})
+        scored.sort(key=lambda item: (-item['similarity'], item['note_id']))
+        return scored[:limit]
+
+    def report(self, visible: Container[int]) -> List[Dict]:
+        """
+        Groups of visible notes that are near-duplicates of each other
+
+        Only pairs that share a bucket are compared, so the work grows with the number of
+        notes and bucket sizes rather than the square of the corpus. Verified pairs are
+        merged with union-find, so A~B and B~C give one group {A, B, C}.
+        """
+        parent = {}
+
+        def find(x):
+            while parent.setdefault(x, x) != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        best = {}
+        checked = set()
+        with self._lock:
+            notes = self._notes
+            for members in self._buckets.values():
+                if len(members) < 2:
+                    continue
+                members = sorted(m for m in members if m in visible)
+                if len(members) < 2:
+                    continue
+                if len(members) <= REPORT_PAIRWISE_BUCKET_MAX:
+                    pairs = ((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+                else:
+                    pairs = ((members[0], b) for b in members[1:])
+                for pair in pairs:
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    similarity = estimate_similarity(notes[pair[0]][1], notes[pair[1]][1])
+                    if similarity >= self.threshold:
+                        root_a, root_b = find(pair[0]), find(pair[1])
+                        if root_a != root_b:
+                            parent[root_b] = root_a
+                        for note_id in pair:
+                            best[note_id] = max(best.get(note_id, 0.0), similarity)
+
+        groups: Dict[int, List[int]] = {}
+        for note_id in best:
+            groups.setdefault(find(note_id), []).append(note_id)
+        result = [{
+            'note_ids': sorted(members),
+            'max_similarity': round(max(best[m] for m in members), 3),
+        } for members in groups.values()]
+        result.sort(key=lambda group: (-len(group['note_ids']), group['note_ids'][0]))
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'notes': len(self._notes),
+                'buckets': len(self._buckets),
+                'loaded': self._loaded_at is not None,
+                'pending': len(self._pending) + self._in_progress,
+                'threshold': self.threshold,
+                'signatures_computed': self.signatures_computed,
+                'last_load_ms': round(self.last_load_ms, 3),
+                'last_error': self.last_error,
+            }
+
+
+# Global instance
+_duplicate_index = None
+
+
+def get_duplicate_index() -> DuplicateIndex:
+    """Get or create the near-duplicate index instance"""
+    global _duplicate_index
+    if _duplicate_index is None:
+        _duplicate_index = DuplicateIndex()
+    return _duplicate_index
@@ -0,0 +1,181 @@
+"""
+Note facets
+Per-user bitmaps of note membership by tag, category and notebook, so filter combinations
+and facet counts are integer AND/OR/popcount operations instead of extra SQL joins
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+FACET_CACHE_MAX_USERS = int(os.getenv('FACET_CACHE_MAX_USERS', '500'))
+
+
+class UserFacets:
+    """
+    Facet bitmaps for the notes one user can see
+
+    Each visible note gets a dense position (0..n-1); a bitmap is a Python int with bit i
+    set when the note at position i belongs to that tag, category or notebook. Python's
+    big-int & | and bit_count run in C over machine words, so intersecting or counting
+    thousands of notes costs microseconds.
+    """
+
+    __slots__ = ('version', 'note_ids', 'positions', 'all_notes', 'tags', 'categories', 'notebooks', 'names')
+
+    def __init__(self, version: int, note_rows, tag_rows):
+        self.version = version
+        self.note_ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+        self.tags: Dict[int, int] = {}
+        self.categories: Dict[int, int] = {}
+        self.notebooks: Dict[int, int] = {}
+        self.names = {'tags': {}, 'categories': {}, 'notebooks': {}}
+
+        for note_id, category_id, category_name, notebook_id, notebook_title in note_rows:
+            if note_id in self.positions:
+                continue
+            bit = 1 << len(self.note_ids)
+            self.positions[note_id] = len(self.note_ids)
+            self.note_ids.append(note_id)
+            if category_id is not None:
+                self.categories[category_id] = self.categories.get(category_id, 0) | bit
+                self.names['categories'][category_id] = category_name
+            if notebook_id is not None:
+                self.notebooks[notebook_id] = self.notebooks.get(notebook_id, 0) | bit
+                self.names['notebooks'][notebook_id] = notebook_title
+        self.all_notes = (1 << len(self.note_ids)) - 1
+
+        for note_id, tag_id, tag_name in tag_rows:
+            position = self.positions.get(note_id)
+            if position is not None:
+                self.tags[tag_id] = self.tags.get(tag_id, 0) | (1 << position)
+                self.names['tags'][tag_id] = tag_name
+
+    def bitmap_for(self, note_ids: Iterable[int]) -> int:
+        """Bitmap of the given notes (ones the user cannot see are ignored)"""
+        bitmap = 0
+        positions = self.positions
+        for note_id in note_ids:
+            position = positions.get(note_id)
+            if position is not None:
+                bitmap |= 1 << position
+        return bitmap
+
+    def select(self, tag_ids: Iterable[int] = (), tag_mode: str = 'and',
+               category_id: Optional[int] = None, notebook_id: Optional[int] = None) -> int:
+        """Bitmap of the notes matching every given filter"""
+        selected = self.all_notes
+        tag_ids = list(tag_ids)
+        if tag_ids:
+            if tag_mode == 'or':
+                tagged = 0
+                for tag_id in tag_ids:
+                    tagged |= self.tags.get(tag_id, 0)
+                selected &= tagged
+            else:
+                for tag_id in tag_ids:
+                    selected &= self.tags.get(tag_id, 0)
+        if category_id is not None:
+            selected &= self.categories.get(category_id, 0)
+        if notebook_id is not None:
+            selected &= self.notebooks.get(notebook_id, 0)
+        return selected
+
+    def note_ids_in(self, bitmap: int) -> List[int]:
+        """Note ids whose bits are set, in position order"""
+        note_ids = self.note_ids
+        result = []
+        while bitmap:
+            low = bitmap & -bitmap
+            result.append(note_ids[low.bit_length() - 1])
+            bitmap ^= low
+        return result
+
+    def counts(self, selected: int) -> Dict[str, List[Dict]]:
+        """How many selected notes fall in each tag, category and notebook (non-zero only)"""
+        result = {}
+        for facet, bitmaps in (('tags', self.tags), ('categories', self.categories), ('notebooks', self.notebooks)):
+            names = self.names[facet]
+            entries = []
+            for facet_id, bitmap in bitmaps.items():
+                count = (bitmap & selected).bit_count()
+                if count:
+                    entries.append({'id': facet_id, 'name': names[facet_id], 'count': count})
+            entries.sort(key=lambda entry: (-entry['count'], entry['name'] or ''))
+            result[facet] = entries
+        return result
+
+
+class FacetIndex:
+    """
+    Keeps UserFacets per user, rebuilt when that user's data version moves
+
+    Every write that changes what a user sees already bumps their data version (the one
+    behind the ETags), so comparing versions catches creates, deletes, shares, tagging
+    and notebook moves from any route or worker without hooking each of them.
+    """
+
+    def __init__(self, max_users: int = FACET_CACHE_MAX_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users: 'OrderedDict[int, UserFacets]' = OrderedDict()
+        self.builds = 0
+        self.hits = 0
+
+    def for_user(self, cur, user_id: int, version: int) -> UserFacets:
+        with self._lock:
+            facets = self._users.get(user_id)
+            if facets is not None and facets.version == version:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return facets
+
+        cur.execute("""
+            SELECT n.note_id, n.category_id, c.name, n.notebook_id, nb.title
+            FROM note n
+            LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+            LEFT JOIN category c ON n.category_id = c.category_id
+            LEFT JOIN notebook nb ON n.notebook_id = nb.notebook_id
+            WHERE n.user_id = %s OR col.shared_with_user_id = %s
+            ORDER BY n.updated_at DESC
+        """, (user_id, user_id, user_id))
+        note_rows = cur.fetchall()
+        cur.execute("""
+            SELECT nt.note_id, t.tag_id, t.name
+            FROM note n
+            LEFT JOIN collaboration col ON col.note_id = n.note_id AND col.shared_with_user_id = %s
+            JOIN note_tag nt ON nt.note_id = n.note_id
+            JOIN tag t ON t.tag_id = nt.tag_id
+            WHERE n.user_id = %s OR col.shared_with_user_id = %s
+        """, (user_id, user_id, user_id))
+        facets = UserFacets(version, note_rows, cur.fetchall())
+
+        with self._lock:
+            self._users[user_id] = facets
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            self.builds += 1
+        return facets
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'cached_users': len(self._users),
+                'builds': self.builds,
+                'hits': self.hits,
+            }
+
+
+# Global instance
+_facet_index = None
+
+
+def get_facet_index() -> FacetIndex:
+    """Get or create the facet index instance"""
+    global _facet_index
+    if _facet_index is None:
+        _facet_index = FacetIndex()
+    return _facet_index
@@ -0,0 +1,40 @@
+"""
+Gunicorn configuration: prefork workers on every core, app preloaded in the master
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+# Read .env here too: these settings are needed before the app is imported
+load_dotenv()
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads per worker let requests waiting on the database or Gemini overlap
+threads = int(os.getenv('WEB_THREADS', '4'))
+worker_class = 'gthread'
+preload_app = True
+timeout = 60
+
+# Workers share ETag versions, permission invalidations and change feed events through
+# this file (see shared_state.py). A new file per master keeps old ETags and cursors from
+# being mistaken for current ones after a restart.
+os.environ.setdefault(
+    'SHARED_STATE_PATH',
+    os.path.join(tempfile.gettempdir(), f'pkb-shared-{os.getpid()}.sqlite3'),
+)
+
+
+def on_exit(server):
+    path = os.environ['SHARED_STATE_PATH']
+    for suffix in ('', '-wal', '-shm', '.scheduler.lock'):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
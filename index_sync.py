@@ -0,0 +1,142 @@
+"""
+Index synchronisation across worker processes
+The fuzzy search, near-duplicate and tag autocomplete indexes live in each process's
+memory and are updated in place by that process's writes. With SHARED_STATE_PATH set,
+writes are also published to the shared store's invalidation log, and every other process
+re-reads the affected notes and tags before its next lookup, as access_control.py does for
+permissions.
+"""
+
+import threading
+from typing import Dict, Iterable
+
+from duplicates import get_duplicate_index
+from shared_state import get_shared_store
+from tag_index import get_tag_index
+from trigram_index import get_trigram_index
+
+# Invalidation kinds in the shared store ('note' is used by access_control.py)
+NOTE_TEXT = 'note_text'
+TAG = 'tag'
+
+
+class IndexSync:
+    """
+    Applies other processes' note and tag writes to this process's indexes
+
+    A process publishes after its commit and before bumping the data versions, so a
+    process that sees the new version (and serves a response tagged with it) also sees
+    the invalidation. Notes are re-read as a whole: title and content for the fuzzy search
+    and duplicate indexes, tag names for the fuzzy search index. Tags are re-read with
+    their usage count. A reader that fell behind the retained log reloads everything.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._seq = store.latest_invalidation() if store is not None else 0
+        self._lock = threading.Lock()
+        self.notes_applied = 0
+        self.tags_applied = 0
+        self.full_reloads = 0
+
+    def note_changed(self, note_id: int):
+        """Publish that a note's title, content or tags were written, or that it was deleted"""
+        if self.store is not None:
+            self.store.publish_invalidation(NOTE_TEXT, (note_id,))
+
+    def tags_changed(self, tag_ids: Iterable[int]):
+        """Publish that tags were created or attached to / detached from notes"""
+        if self.store is not None:
+            self.store.publish_invalidation(TAG, tag_ids)
+
+    def apply(self, db):
+        """Bring the indexes up to date with writes published by other processes"""
+        if self.store is None:
+            return
+        with self._lock:
+            latest, entries, complete = self.store.invalidations_since(self._seq)
+            if latest == self._seq:
+                return
+            note_ids = {target for kind, target in entries if kind == NOTE_TEXT}
+            tag_ids = {target for kind, target in entries if kind == TAG}
+            if complete and not note_ids and not tag_ids:
+                self._seq = latest
+                return
+            cur = db.connection.cursor()
+            try:
+                if not complete:
+                    self._reload_all(cur)
+                else:
+                    if note_ids:
+                        self._apply_notes(cur, sorted(note_ids))
+                    if tag_ids:
+                        self._apply_tags(cur, sorted(tag_ids))
+            finally:
+                cur.close()
+            self._seq = latest
+
+    def _reload_all(self, cur):
+        self.full_reloads += 1
+        get_trigram_index().load(cur)
+        get_tag_index().load(cur)
+        get_duplicate_index().request_reload()
+
+    def _apply_notes(self, cur, note_ids):
+        placeholders = ', '.join(['%s'] * len(note_ids))
+        cur.execute(f"SELECT note_id, title, content FROM note WHERE note_id IN ({placeholders})", note_ids)
+        notes = {row[0]: row for row in cur.fetchall()}
+        cur.execute(f"""
+            SELECT nt.note_id, t.name
+            FROM note_tag nt
+            JOIN tag t ON t.tag_id = nt.tag_id
+            WHERE nt.note_id IN ({placeholders})
+        """, note_ids)
+        tags: Dict[int, list] = {}
+        for note_id, name in cur.fetchall():
+            tags.setdefault(note_id, []).append(name)
+
+        trigram_index = get_trigram_index()
+        duplicate_index = get_duplicate_index()
+        for note_id in note_ids:
+            row = notes.get(note_id)
+            if row is None:
+                trigram_index.remove_note(note_id)
+                duplicate_index.remove_note(note_id)
+            else:
+                trigram_index.set_note(note_id, row[1], row[2], tags.get(note_id, ()))
+                duplicate_index.index_note(note_id, row[1], row[2])
+        self.notes_applied += len(note_ids)
+
+    def _apply_tags(self, cur, tag_ids):
+        cur.execute(f"""
+            SELECT t.tag_id, t.name, COUNT(nt.note_id)
+            FROM tag t
+            LEFT JOIN note_tag nt ON nt.tag_id = t.tag_id
+            WHERE t.tag_id IN ({', '.join(['%s'] * len(tag_ids))})
+            GROUP BY t.tag_id, t.name
+        """, tag_ids)
+        tag_index = get_tag_index()
+        for tag_id, name, usage in cur.fetchall():
+            tag_index.set_tag(tag_id, name, int(usage))
+        self.tags_applied += len(tag_ids)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'shared': self.store is not None,
+                'notes_applied': self.notes_applied,
+                'tags_applied': self.tags_applied,
+                'full_reloads': self.full_reloads,
+            }
+
+
+# Global instance
+_index_sync = None
+
+
+def get_index_sync() -> IndexSync:
+    """Get or create the index synchronisation instance"""
+    global _index_sync
+    if _index_sync is None:
+        _index_sync = IndexSync(store=get_shared_store())
+    return _index_sync
@@ -0,0 +1,136 @@
+"""
+Request and SQL instrumentation
+Wraps the database connection so every statement is timed, and records per-route latency
+"""
+
+import re
+import time
+from typing import Callable, List
+
+from flask import g, request
+
+from metrics import get_metrics
+
+# Longest SQL text kept as a label; statement fingerprints are stable so this bounds memory
+MAX_STATEMENT_LABEL = 160
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+
+# Called after every statement as listener(operation, sql, args, elapsed_ms, failed, connection)
+_statement_listeners: List[Callable] = []
+
+
+def add_statement_listener(listener: Callable):
+    """Register a function to be called after every instrumented statement"""
+    _statement_listeners.append(listener)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normalize a SQL statement into a fingerprint shared by all executions of the same query
+
+    Collapses whitespace, replaces literals and placeholders with '?' and folds IN lists.
+    """
+    sql = _WHITESPACE_RE.sub(' ', sql).strip()
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (?+)', sql)
+    return sql
+
+
+def _record_statement(operation: str, sql: str, elapsed_ms: float, failed: bool):
+    """Record one statement in the global metrics and the current request's totals"""
+    statement = normalize_sql(sql)[:MAX_STATEMENT_LABEL]
+    get_metrics().observe('sql_statement_ms', elapsed_ms, statement=statement,
+                          operation=operation, outcome='error' if failed else 'ok')
+    if g:
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time_ms = g.get('sql_time_ms', 0.0) + elapsed_ms
+
+
+class InstrumentedCursor:
+    """DB-API cursor proxy that times execute, executemany and callproc"""
+
+    def __init__(self, cursor, connection=None):
+        self._cursor = cursor
+        self._connection = connection
+
+    def _timed(self, operation, sql, args, method):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = method(sql, args)
+            failed = False
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _record_statement(operation, sql, elapsed_ms, failed)
+            for listener in _statement_listeners:
+                try:
+                    listener(operation, sql, args, elapsed_ms, failed, self._connection)
+                except Exception as e:
+                    print(f"Error in statement listener: {e}")
+
+    def execute(self, query, args=None):
+        return self._timed('execute', query, args, self._cursor.execute)
+
+    def executemany(self, query, args):
+        return self._timed('executemany', query, args, self._cursor.executemany)
+
+    def callproc(self, procname, args=()):
+        return self._timed('callproc', f"CALL {procname}", args,
+                           lambda _sql, proc_args: self._cursor.callproc(procname, proc_args))
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """DB-API connection proxy whose cursors are instrumented"""
+
+    def __init__(self, connection):
+        self.raw = connection
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.raw.cursor(*args, **kwargs), self.raw)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time_ms = 0.0
+
+
+def _record_request(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics = get_metrics()
+    metrics.observe('route_latency_ms', elapsed_ms, route=route, method=request.method,
+                    status=response.status_code // 100 * 100)
+    metrics.observe('route_sql_ms', g.sql_time_ms, route=route, method=request.method)
+    metrics.increment('route_sql_queries', g.sql_count, route=route, method=request.method)
+    metrics.increment('route_requests', route=route, method=request.method)
+    # Lets the browser devtools show where the time went
+    response.headers['Server-Timing'] = (
+        f'db;dur={g.sql_time_ms:.2f};desc="{g.sql_count} queries", app;dur={elapsed_ms:.2f}'
+    )
+    return response
+
+
+def init_instrumentation(app):
+    """Register the request timing hooks on a Flask app"""
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
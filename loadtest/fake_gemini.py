@@ -0,0 +1,143 @@
+"""
+Local stand-in for the Gemini REST API
+Answers generateContent calls with canned, prompt-appropriate JSON after a configurable delay
+
+Usage:
+    python loadtest/fake_gemini.py --port 8089 --latency-ms 800 --jitter-ms 300
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://localhost:8089 python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+MODELS = ('gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro')
+TAGS = ('study', 'database', 'python', 'todo', 'meeting', 'research', 'project', 'ideas')
+
+
+class FakeGeminiConfig:
+    """Latency and failure settings shared by all handler threads"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, seed: int):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def next_delay(self) -> Tuple[float, bool]:
+        """Pick (delay in seconds, whether to fail) for the next call"""
+        with self._lock:
+            self.calls += 1
+            delay = self._rng.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms
+            fail = self._rng.random() < self.error_rate
+        return max(0.0, delay) / 1000.0, fail
+
+
+def answer_for(prompt: str, rng: random.Random) -> str:
+    """Build a response text shaped like what the app's prompts ask for"""
+    if 'suggest 3-5 relevant tags' in prompt:
+        picks = rng.sample(TAGS, rng.randint(3, 5))
+        return json.dumps([{'tag': t, 'confidence': round(rng.uniform(0.5, 0.95), 2)} for t in picks])
+    if 'Personal Knowledge Base' in prompt:
+        if rng.random() < 0.5:
+            return json.dumps({'action': 'answer', 'message': 'You have several notes about databases.'})
+        return json.dumps({
+            'action': 'create_note',
+            'parameters': {'title': 'Load test note', 'content': 'Created by the fake model', 'tags': ['loadtest']},
+            'message': 'Creating a note for you.'
+        })
+    return 'A short summary of the note.'
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    config: FakeGeminiConfig = None
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/').endswith('/models'):
+            self._send_json(200, {'models': [
+                {'name': f'models/{name}', 'supportedGenerationMethods': ['generateContent']}
+                for name in MODELS
+            ]})
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.split('?')[0].endswith(':generateContent'):
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+            return
+
+        delay, fail = self.config.next_delay()
+        time.sleep(delay)
+        if fail:
+            self._send_json(503, {'error': {'code': 503, 'message': 'Injected failure', 'status': 'UNAVAILABLE'}})
+            return
+
+        prompt = ' '.join(
+            part.get('text', '')
+            for content in request.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        text = answer_for(prompt, random.Random(zlib.crc32(prompt.encode('utf-8'))))
+        self._send_json(200, {
+            'candidates': [{
+                'content': {'parts': [{'text': text}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+                'safetyRatings': []
+            }],
+            'promptFeedback': {'safetyRatings': []}
+        })
+
+    def log_message(self, format, *args):
+        pass  # keep the console quiet under load
+
+
+def serve(port: int, config: FakeGeminiConfig) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it"""
+    FakeGeminiHandler.config = config
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeGeminiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Gemini API')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='mean response delay')
+    parser.add_argument('--jitter-ms', type=float, default=200.0, help='standard deviation of the delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 503')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    server = serve(args.port, config)
+    print(f"Fake Gemini listening on http://127.0.0.1:{args.port} "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, error rate {args.error_rate})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
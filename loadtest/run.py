@@ -0,0 +1,278 @@
+"""
+Load-test driver
+Runs a weighted mix of API calls at a fixed concurrency and reports latency percentiles per route
+
+Usage:
+    python loadtest/run.py --base-url http://localhost:5000 --concurrency 32 --duration 60 \\
+        --mix list=40,search=25,save=20,ai_tag=10,chatbot=5 --manifest loadtest_manifest.json
+"""
+
+import argparse
+import gzip
+import http.cookiejar
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import synthetic  # noqa: E402
+
+DEFAULT_MIX = 'list=40,search=25,save=20,ai_tag=10,chatbot=5'
+SEARCH_TERMS = ('database', 'python', 'meeting', 'kubernetes', 'research', 'journal', 'cache', 'deploy')
+CHAT_MESSAGES = (
+    'What notes do I have about databases?',
+    'Create a note about kubernetes deployment checklists',
+    'Summarize my meeting notes',
+    'Show me my bookmarks',
+)
+
+
+def parse_mix(raw: str) -> List[Tuple[str, int]]:
+    """Parse 'list=40,search=25' into [('list', 40), ('search', 25)]"""
+    mix = []
+    for part in raw.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}'. Choose from: {', '.join(OPERATIONS)}")
+        mix.append((name.strip(), int(weight or 1)))
+    return mix
+
+
+class VirtualUser:
+    """One simulated browser session with its own cookie jar"""
+
+    def __init__(self, base_url: str, user_id: Optional[int], rng: random.Random, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.user_id = user_id
+        self.rng = rng
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.own_note_ids: List[int] = []
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(f"{self.base_url}{path}", data=data, method=method)
+        req.add_header('Accept-Encoding', 'gzip')
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                body = resp.read()
+                if resp.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                return resp.status, body
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self):
+        """Switch the session to this virtual user's account and learn which notes it owns"""
+        if self.user_id is not None:
+            self.request('POST', '/api/set-user', {'user_id': self.user_id})
+        status, body = self.request('GET', '/api/notes?fields=note_id,note_type')
+        if status == 200:
+            self.own_note_ids = [n['note_id'] for n in json.loads(body) if n.get('note_type') == 'owner']
+
+    def pick_note(self) -> Optional[int]:
+        return self.rng.choice(self.own_note_ids) if self.own_note_ids else None
+
+
+def op_list(user: VirtualUser):
+    return user.request('GET', '/api/notes')
+
+
+def op_search(user: VirtualUser):
+    return user.request('GET', f"/api/notes/search?q={urllib.parse.quote(user.rng.choice(SEARCH_TERMS))}")
+
+
+def op_save(user: VirtualUser):
+    note_id = user.pick_note()
+    if note_id is None or user.rng.random() < 0.3:
+        status, body = user.request('POST', '/api/notes', {
+            'title': synthetic.note_title(user.rng),
+            'content': synthetic.note_text(user.rng, paragraphs=2),
+            'tags': user.rng.sample(synthetic.TAG_POOL, 2),
+        })
+        if status == 200:
+            try:
+                user.own_note_ids.append(json.loads(body)['note_id'])
+            except (ValueError, KeyError):
+                pass
+        return status, body
+    return user.request('PUT', f"/api/notes/{note_id}", {
+        'title': synthetic.note_title(user.rng),
+        'content': synthetic.note_text(user.rng, paragraphs=2),
+    })
+
+
+def op_ai_tag(user: VirtualUser):
+    note_id = user.pick_note()
+    if note_id is None:
+        return op_save(user)
+    return user.request('POST', f"/api/notes/{note_id}/ai-suggest-tags")
+
+
+def op_chatbot(user: VirtualUser):
+    return user.request('POST', '/api/chatbot', {'message': user.rng.choice(CHAT_MESSAGES)})
+
+
+OPERATIONS = {
+    'list': op_list,
+    'search': op_search,
+    'save': op_save,
+    'ai_tag': op_ai_tag,
+    'chatbot': op_chatbot,
+}
+
+
+class Recorder:
+    """Collects latency samples and outcomes per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, elapsed_ms: float, status: str):
+        with self._lock:
+            self.latencies[name].append(elapsed_ms)
+            self.statuses[name][status] += 1
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 3)
+
+
+def summarize(recorder: Recorder, elapsed_s: float) -> Dict:
+    routes = {}
+    all_latencies = []
+    for name, values in recorder.latencies.items():
+        values.sort()
+        all_latencies.extend(values)
+        errors = sum(c for s, c in recorder.statuses[name].items() if s == 'error' or s.startswith('5'))
+        routes[name] = {
+            'requests': len(values),
+            'errors': errors,
+            'throughput_rps': round(len(values) / elapsed_s, 2),
+            'p50_ms': percentile(values, 50),
+            'p95_ms': percentile(values, 95),
+            'p99_ms': percentile(values, 99),
+            'max_ms': round(values[-1], 3),
+            'statuses': dict(recorder.statuses[name]),
+        }
+    all_latencies.sort()
+    return {
+        'duration_s': round(elapsed_s, 3),
+        'total': {
+            'requests': len(all_latencies),
+            'throughput_rps': round(len(all_latencies) / elapsed_s, 2),
+            'p50_ms': percentile(all_latencies, 50),
+            'p95_ms': percentile(all_latencies, 95),
+            'p99_ms': percentile(all_latencies, 99),
+        },
+        'routes': routes,
+    }
+
+
+def worker(index: int, args, user_ids: List[int], mix: List[Tuple[str, int]],
+           recorder: Recorder, deadline: float, counter: List[int], counter_lock: threading.Lock):
+    rng = random.Random(args.seed * 1000 + index)
+    user = VirtualUser(args.base_url, user_ids[index % len(user_ids)] if user_ids else None,
+                       rng, args.timeout)
+    user.login()
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    while time.monotonic() < deadline:
+        if args.requests:
+            with counter_lock:
+                if counter[0] >= args.requests:
+                    return
+                counter[0] += 1
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            status, _ = OPERATIONS[name](user)
+            outcome = str(status)
+        except Exception:
+            outcome = 'error'
+        recorder.record(name, (time.perf_counter() - start) * 1000, outcome)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Drive a realistic request mix against the app')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='stop after this many requests (0 = no limit)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'weighted operations (default: {DEFAULT_MIX})')
+    parser.add_argument('--manifest', help='seed manifest; virtual users log in as the seeded users')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='write the JSON report to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    user_ids = []
+    if args.manifest:
+        with open(args.manifest, encoding='utf-8') as f:
+            user_ids = json.load(f)['user_ids']
+
+    recorder = Recorder()
+    counter, counter_lock = [0], threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=worker, daemon=True,
+                         args=(i, args, user_ids, mix, recorder, deadline, counter, counter_lock))
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    report = summarize(recorder, elapsed)
+    report['config'] = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'base_url': args.base_url,
+        'concurrency': args.concurrency,
+        'mix': dict(mix),
+        'seed': args.seed,
+    }
+
+    for name, stats in sorted(report['routes'].items()):
+        print(f"{name:10s} n={stats['requests']:6d} err={stats['errors']:4d} "
+              f"rps={stats['throughput_rps']:8.2f} p50={stats['p50_ms']}ms "
+              f"p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms", file=sys.stderr)
+    print(f"{'TOTAL':10s} n={report['total']['requests']:6d} rps={report['total']['throughput_rps']:8.2f} "
+          f"p50={report['total']['p50_ms']}ms p95={report['total']['p95_ms']}ms "
+          f"p99={report['total']['p99_ms']}ms", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
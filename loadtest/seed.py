@@ -0,0 +1,217 @@
+"""
+Synthetic data generator for load tests
+Seeds users, notebooks, notes, tags, collaborations, bookmarks and reminders in batches
+
+Usage:
+    python loadtest/seed.py --users 50 --notes-per-user 200 --manifest loadtest_manifest.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import synthetic  # noqa: E402
+
+BATCH_SIZE = 1000
+
+
+def connect():
+    """Connect to the backend app.py would use (STORAGE_BACKEND, MYSQL_* or SQLITE_PATH)"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    if os.getenv('STORAGE_BACKEND', 'mysql').lower() == 'sqlite':
+        from storage import connect_sqlite
+        return connect_sqlite(os.getenv('SQLITE_PATH', 'pkb.sqlite3'))
+    import MySQLdb
+    return MySQLdb.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        passwd=os.getenv('MYSQL_PASSWORD', 'admin'),
+        db=os.getenv('MYSQL_DB', 'pkb1'),
+        charset='utf8mb4',
+    )
+
+
+def insert_batched(cur, sql, rows):
+    """executemany in fixed-size batches so huge seeds don't build one giant statement"""
+    for start in range(0, len(rows), BATCH_SIZE):
+        cur.executemany(sql, rows[start:start + BATCH_SIZE])
+
+
+def seed(conn, args) -> dict:
+    """Generate and insert all data, returning a manifest of what was created"""
+    rng = random.Random(args.seed)
+    run_id = args.run_id or datetime.now().strftime('%Y%m%d%H%M%S')
+    cur = conn.cursor()
+    timings = {}
+
+    def step(name, started):
+        conn.commit()
+        timings[name] = round(time.perf_counter() - started, 3)
+        print(f"  {name:15s} {timings[name]:8.3f}s", file=sys.stderr)
+
+    # Users
+    started = time.perf_counter()
+    insert_batched(cur, "INSERT INTO app_user (name, email) VALUES (%s, %s)", [
+        (f"Load User {i}", f"loadtest_{run_id}_{i}@example.com") for i in range(args.users)
+    ])
+    cur.execute("SELECT user_id FROM app_user WHERE email LIKE %s ORDER BY user_id",
+                (f"loadtest_{run_id}_%",))
+    user_ids = [row[0] for row in cur.fetchall()]
+    step('users', started)
+
+    # Categories are shared; reuse whatever the schema seeded
+    cur.execute("SELECT category_id FROM category")
+    category_ids = [row[0] for row in cur.fetchall()] or [None]
+
+    # Notebooks
+    started = time.perf_counter()
+    insert_batched(cur, "INSERT INTO notebook (user_id, title, description) VALUES (%s, %s, %s)", [
+        (user_id, synthetic.note_title(rng), synthetic.words(rng, 8))
+        for user_id in user_ids for _ in range(args.notebooks_per_user)
+    ])
+    cur.execute(f"SELECT notebook_id, user_id FROM notebook WHERE user_id IN ({','.join(['%s'] * len(user_ids))})",
+                user_ids)
+    notebooks_by_user = {}
+    for notebook_id, user_id in cur.fetchall():
+        notebooks_by_user.setdefault(user_id, []).append(notebook_id)
+    step('notebooks', started)
+
+    # Tags
+    started = time.perf_counter()
+    tag_names = list(synthetic.TAG_POOL) + [
+        f"{rng.choice(synthetic.VOCABULARY)}-{i}" for i in range(max(0, args.tags - len(synthetic.TAG_POOL)))
+    ]
+    insert_batched(cur, "INSERT IGNORE INTO tag (name) VALUES (%s)", [(name,) for name in tag_names])
+    cur.execute(f"SELECT tag_id, name FROM tag WHERE name IN ({','.join(['%s'] * len(tag_names))})", tag_names)
+    tag_ids = [row[0] for row in cur.fetchall() if args.todo_tags or row[1] != 'todo']
+    step('tags', started)
+
+    # Notes
+    started = time.perf_counter()
+    note_rows = []
+    for user_id in user_ids:
+        notebooks = notebooks_by_user.get(user_id) or [None]
+        for _ in range(args.notes_per_user):
+            note_rows.append((
+                user_id, rng.choice(category_ids), rng.choice(notebooks), synthetic.note_title(rng),
+                synthetic.note_text(rng, paragraphs=rng.randint(1, args.max_paragraphs), words_per_paragraph=60),
+                rng.random() < 0.1
+            ))
+    insert_batched(cur, """
+        INSERT INTO note (user_id, category_id, notebook_id, title, content, is_public)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, note_rows)
+    cur.execute(f"SELECT note_id, user_id FROM note WHERE user_id IN ({','.join(['%s'] * len(user_ids))})",
+                user_ids)
+    notes = cur.fetchall()
+    step('notes', started)
+
+    # Note tags (skipping 'todo' by default: its trigger would add a reminder per row)
+    started = time.perf_counter()
+    note_tags = set()
+    for note_id, _ in notes:
+        for tag_id in rng.sample(tag_ids, min(len(tag_ids), rng.randint(0, args.max_tags_per_note))):
+            note_tags.add((note_id, tag_id))
+    insert_batched(cur, "INSERT IGNORE INTO note_tag (note_id, tag_id) VALUES (%s, %s)", sorted(note_tags))
+    step('note_tags', started)
+
+    # Collaborations
+    started = time.perf_counter()
+    collaborations = {}
+    if len(user_ids) > 1:
+        for _ in range(args.collaborations):
+            note_id, owner_id = rng.choice(notes)
+            other = rng.choice(user_ids)
+            if other != owner_id:
+                collaborations[(note_id, other)] = rng.choice(('read', 'write'))
+    insert_batched(cur, """
+        INSERT IGNORE INTO collaboration (note_id, shared_with_user_id, access_level) VALUES (%s, %s, %s)
+    """, [(n, u, level) for (n, u), level in sorted(collaborations.items())])
+    step('collaborations', started)
+
+    # Bookmarks
+    started = time.perf_counter()
+    bookmarks = {(rng.choice(notes)[0], rng.choice(user_ids)) for _ in range(args.bookmarks)}
+    insert_batched(cur, "INSERT IGNORE INTO bookmark (note_id, user_id) VALUES (%s, %s)", sorted(bookmarks))
+    step('bookmarks', started)
+
+    # Reminders, due anywhere from a month ago to a month ahead
+    started = time.perf_counter()
+    now = datetime.now().replace(microsecond=0)
+    reminder_rows = []
+    for _ in range(args.reminders):
+        note_id, owner_id = rng.choice(notes)
+        reminder_rows.append((
+            note_id, owner_id, synthetic.words(rng, 5),
+            now + timedelta(minutes=rng.randint(-30 * 1440, 30 * 1440)),
+            rng.choice(('pending', 'pending', 'pending', 'done', 'skipped'))
+        ))
+    insert_batched(cur, """
+        INSERT INTO reminder (note_id, user_id, reminder_text, due_date, status) VALUES (%s, %s, %s, %s, %s)
+    """, reminder_rows)
+    step('reminders', started)
+
+    cur.close()
+    return {
+        'run_id': run_id,
+        'seed': args.seed,
+        'user_ids': user_ids,
+        'counts': {
+            'users': len(user_ids),
+            'notebooks': sum(len(v) for v in notebooks_by_user.values()),
+            'notes': len(notes),
+            'note_tags': len(note_tags),
+            'collaborations': len(collaborations),
+            'bookmarks': len(bookmarks),
+            'reminders': len(reminder_rows),
+        },
+        'timings_s': timings,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Seed the database with synthetic load-test data')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--notebooks-per-user', type=int, default=5)
+    parser.add_argument('--notes-per-user', type=int, default=100)
+    parser.add_argument('--tags', type=int, default=200, help='distinct tags (including the common pool)')
+    parser.add_argument('--max-tags-per-note', type=int, default=4)
+    parser.add_argument('--max-paragraphs', type=int, default=6)
+    parser.add_argument('--collaborations', type=int, default=500)
+    parser.add_argument('--bookmarks', type=int, default=500)
+    parser.add_argument('--reminders', type=int, default=500)
+    parser.add_argument('--todo-tags', action='store_true',
+                        help="also attach the 'todo' tag (fires trg_auto_todo_reminder per row)")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--run-id', help='suffix for generated emails (default: timestamp)')
+    parser.add_argument('--manifest', default='loadtest_manifest.json',
+                        help='where to write the ids and counts of the seeded data')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    conn = connect()
+    print("Seeding:", file=sys.stderr)
+    try:
+        manifest = seed(conn, args)
+    finally:
+        conn.close()
+    with open(args.manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(json.dumps(manifest['counts']), file=sys.stderr)
+    print(f"Manifest written to {args.manifest}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
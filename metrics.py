@@ -0,0 +1,159 @@
+"""
+In-process metrics registry
+Latency histograms and counters for routes, SQL statements and AI model calls
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is unbounded)
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with count, sum, min and max"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        """Record a single observation"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate a percentile (0-100) from the bucket counts, interpolating within the bucket"""
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                fraction = (rank - seen) / bucket_count
+                return min(self.max, max(self.min, lower + (upper - lower) * fraction))
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self) -> Dict:
+        """Get a JSON-serializable summary of the histogram"""
+        labels = [f"le_{b}" for b in self.buckets] + ['le_inf']
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total, 3),
+            'avg_ms': round(self.total / self.count, 3) if self.count else None,
+            'min_ms': round(self.min, 3) if self.min is not None else None,
+            'max_ms': round(self.max, 3) if self.max is not None else None,
+            'p50_ms': _round(self.percentile(50)),
+            'p95_ms': _round(self.percentile(95)),
+            'p99_ms': _round(self.percentile(99)),
+            'buckets': {label: c for label, c in zip(labels, self.counts) if c},
+        }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class MetricsRegistry:
+    """Thread-safe collection of named histograms and counters, each keyed by a label tuple"""
+
+    def __init__(self, max_series: int = 1000):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, int]] = {}
+        self._max_series = max_series
+        self.started_at = time.time()
+
+    def observe(self, name: str, value_ms: float, **labels):
+        """Record a latency observation in milliseconds"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                if len(series) >= self._max_series:
+                    key = (('overflow', True),)
+                    histogram = series.setdefault(key, Histogram())
+                else:
+                    histogram = series[key] = Histogram()
+            histogram.observe(value_ms)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        """Increment a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def counter_value(self, name: str, **labels) -> int:
+        """Get the current value of a counter"""
+        key = tuple(sorted(labels.items()))
+        return self._counters.get(name, {}).get(key, 0)
+
+    def snapshot(self) -> Dict:
+        """Get all metrics as a JSON-serializable dict"""
+        with self._lock:
+            histograms = {
+                name: [dict(labels=dict(key), **h.snapshot()) for key, h in series.items()]
+                for name, series in self._histograms.items()
+            }
+            counters = {
+                name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'histograms': histograms,
+            'counters': counters,
+        }
+
+    def reset(self):
+        """Clear all recorded metrics"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+
+# Global instance
+_metrics = None
+
+def get_metrics() -> MetricsRegistry:
+    """Get or create the global metrics registry"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
+
+
+class timed:
+    """Context manager that records the elapsed time of a block into a histogram"""
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self.elapsed_ms = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+        labels = dict(self.labels, outcome='error' if exc_type else 'ok')
+        get_metrics().observe(self.name, self.elapsed_ms, **labels)
+        return False
@@ -0,0 +1,212 @@
+"""
+Reminder scheduler
+Keeps upcoming pending reminders in a heap ordered by due time and publishes a
+'reminder_due' event to the change feed when each one comes due
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from change_feed import get_change_feed
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process runs the scheduler
+    fcntl = None
+
+# Only reminders due within this window are held in memory
+REMINDER_HORIZON_S = float(os.getenv('REMINDER_HORIZON_S', '3600'))
+# How often to look for newly inserted reminders and extend the horizon
+REMINDER_REFRESH_S = float(os.getenv('REMINDER_REFRESH_S', '30'))
+# On startup, reminders that came due within this window are still announced (as overdue)
+REMINDER_LOOKBACK_S = float(os.getenv('REMINDER_LOOKBACK_S', '3600'))
+# A reminder announced more than this late is flagged overdue
+REMINDER_GRACE_S = 60.0
+
+
+class ReminderScheduler:
+    """
+    Fires reminders at their due time without rescanning the reminder table
+
+    Two cheap incremental queries keep the heap current:
+      * horizon: pending reminders with loaded_until < due_date <= now + horizon
+        (a range scan on (status, due_date)), advanced every refresh
+      * new rows: reminder_id between the previous and current MAX(reminder_id) with
+        due_date <= loaded_until, catching reminders inserted after their window was
+        loaded (a primary-key range scan)
+    Status is rechecked in one batched query just before firing, so reminders marked
+    done or skipped in the meantime are dropped.
+
+    With SHARED_STATE_PATH set (several worker processes), only the process holding a lock
+    file next to the shared store runs the scheduler; the others wait to take over.
+    """
+
+    def __init__(self, db, app=None, horizon_s: float = REMINDER_HORIZON_S,
+                 refresh_s: float = REMINDER_REFRESH_S, lookback_s: float = REMINDER_LOOKBACK_S):
+        self.app = app
+        self.db = db
+        self.horizon_s = horizon_s
+        self.refresh_s = refresh_s
+        self.lookback_s = lookback_s
+        self._heap: List[tuple] = []   # (due_date, reminder_id, user_id, note_id, text)
+        self._queued = set()
+        self._loaded_until: Optional[datetime] = None
+        self._max_id = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self.leader = False
+        self.fired = 0
+        self.dropped = 0
+        self.last_load_ms = 0.0
+        self.last_error = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def ensure_started(self):
+        """Start the background thread once (called from a request hook, so only serving processes run it)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Reload now instead of waiting for the next refresh"""
+        self._wake.set()
+
+    def _acquire_leadership(self):
+        """Block until this process is the one that runs the scheduler"""
+        path = os.getenv('SHARED_STATE_PATH')
+        if path and fcntl is not None:
+            self._lock_file = open(path + '.scheduler.lock', 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)  # released by the OS when the process exits
+        self.leader = True
+
+    def _run(self):
+        self._acquire_leadership()
+        next_refresh = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_refresh:
+                    self._load()
+                    next_refresh = time.monotonic() + self.refresh_s
+                self._fire_due()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error in reminder scheduler: {e}")
+                next_refresh = time.monotonic() + self.refresh_s
+
+            with self._lock:
+                head = self._heap[0][0] if self._heap else None
+            sleep_s = next_refresh - time.monotonic()
+            if head is not None:
+                sleep_s = min(sleep_s, (head - datetime.now()).total_seconds())
+            if self._wake.wait(max(0.05, sleep_s)):
+                self._wake.clear()
+                next_refresh = 0.0
+
+    def _push(self, rows):
+        with self._lock:
+            for reminder_id, note_id, user_id, text, due_date in rows:
+                if reminder_id not in self._queued and due_date is not None:
+                    self._queued.add(reminder_id)
+                    heapq.heappush(self._heap, (due_date, reminder_id, user_id, note_id, text))
+
+    def _load(self):
+        start = time.perf_counter()
+        now = datetime.now().replace(microsecond=0)
+        since = now - timedelta(seconds=self.lookback_s)
+        until = now + timedelta(seconds=self.horizon_s)
+        with self.app.app_context():
+            cur = self.db.connection.cursor()
+            try:
+                # Read the id watermark first so rows inserted while loading are seen next time
+                cur.execute("SELECT COALESCE(MAX(reminder_id), 0) FROM reminder")
+                max_id = cur.fetchone()[0]
+
+                lower = since if self._loaded_until is None else max(since, self._loaded_until)
+                cur.execute("""
+                    SELECT reminder_id, note_id, user_id, reminder_text, due_date
+                    FROM reminder
+                    WHERE status = 'pending' AND due_date > %s AND due_date <= %s
+                """, (lower, until))
+                self._push(cur.fetchall())
+
+                if self._loaded_until is not None and max_id > self._max_id:
+                    # New rows due inside the window that was already loaded
+                    cur.execute("""
+                        SELECT reminder_id, note_id, user_id, reminder_text, due_date
+                        FROM reminder
+                        WHERE reminder_id > %s AND reminder_id <= %s
+                          AND status = 'pending' AND due_date > %s AND due_date <= %s
+                    """, (self._max_id, max_id, since, self._loaded_until))
+                    self._push(cur.fetchall())
+            finally:
+                cur.close()
+        with self._lock:
+            self._max_id = max_id
+        self._loaded_until = until
+        self.last_load_ms = (time.perf_counter() - start) * 1000
+
+    def _fire_due(self):
+        now = datetime.now()
+        with self._lock:
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry[1])
+                due.append(entry)
+        if not due:
+            return
+
+        with self.app.app_context():
+            cur = self.db.connection.cursor()
+            try:
+                ids = [entry[1] for entry in due]
+                cur.execute(f"""
+                    SELECT reminder_id FROM reminder
+                    WHERE status = 'pending' AND reminder_id IN ({', '.join(['%s'] * len(ids))})
+                """, ids)
+                still_pending = {row[0] for row in cur.fetchall()}
+            finally:
+                cur.close()
+
+        feed = get_change_feed()
+        for due_date, reminder_id, user_id, note_id, text in due:
+            if reminder_id not in still_pending:
+                self.dropped += 1
+                continue
+            late_s = (now - due_date).total_seconds()
+            feed.publish((user_id,), 'reminder_due', {
+                'reminder_id': reminder_id,
+                'note_id': note_id,
+                'text': text,
+                'due_date': due_date.strftime('%Y-%m-%d %H:%M'),
+                'overdue': late_s > REMINDER_GRACE_S,
+            })
+            self.fired += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            next_due = self._heap[0][0].strftime('%Y-%m-%d %H:%M:%S') if self._heap else None
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'leader': self.leader,
+                'queued': len(self._heap),
+                'next_due': next_due,
+                'loaded_until': self._loaded_until.strftime('%Y-%m-%d %H:%M:%S') if self._loaded_until else None,
+                'max_reminder_id': self._max_id,
+                'fired': self.fired,
+                'dropped': self.dropped,
+                'last_load_ms': round(self.last_load_ms, 3),
+                'last_error': self.last_error,
+            }
@@ -0,0 +1,219 @@
+"""
+Resilience for model calls
+Per-call deadlines, a bounded worker pool and a circuit breaker, so a slow or failing
+Gemini endpoint costs callers a bounded wait (or none at all) instead of a hung worker
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Callable, Dict
+
+from metrics import get_metrics
+
+LLM_TIMEOUT_S = float(os.getenv('LLM_TIMEOUT_S', '15'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+# Calls awaited on the ASGI event loop hold no thread, so far more can be in flight
+LLM_MAX_ASYNC_CONCURRENCY = int(os.getenv('LLM_MAX_ASYNC_CONCURRENCY', '256'))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv('LLM_BREAKER_COOLDOWN_S', '30'))
+
+
+class ModelUnavailableError(Exception):
+    """A model call was not made or did not finish in time; callers should use their fallback"""
+
+
+class CircuitOpenError(ModelUnavailableError):
+    pass
+
+
+class ModelTimeoutError(ModelUnavailableError):
+    pass
+
+
+class ModelSaturatedError(ModelUnavailableError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls go through; `threshold` failures in a row open the circuit.
+    open: calls are rejected immediately until `cooldown_s` has passed.
+    half_open: a single probe call is let through; success closes the circuit,
+    failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown_s: float = LLM_BREAKER_COOLDOWN_S):
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.last_error = None
+        self.times_opened = 0
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead"""
+        with self._lock:
+            if self._state == 'open':
+                if time.monotonic() - self._opened_at < self.cooldown_s:
+                    raise CircuitOpenError('AI model circuit is open')
+                self._state = 'half_open'
+            if self._state == 'half_open':
+                if self._probing:
+                    raise CircuitOpenError('AI model circuit is half-open; probe in progress')
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """Give up a probe slot taken by allow() without recording an outcome"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self._failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            if self._state == 'half_open' or self._failures >= self.threshold:
+                if self._state != 'open':
+                    self.times_opened += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            retry_in = None
+            if self._state == 'open':
+                retry_in = round(max(0.0, self.cooldown_s - (time.monotonic() - self._opened_at)), 1)
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'threshold': self.threshold,
+                'cooldown_s': self.cooldown_s,
+                'retry_in_s': retry_in,
+                'times_opened': self.times_opened,
+                'last_error': self.last_error,
+            }
+
+
+class ModelGuard:
+    """
+    Runs model calls on a bounded pool with a deadline, behind a circuit breaker
+
+    A call that misses its deadline keeps running on its pool thread (the client library
+    cannot be interrupted), but the caller stops waiting and the pool slot is only freed
+    when it ends. Once every slot is busy further calls fail fast instead of queueing.
+    """
+
+    def __init__(self, timeout_s: float = LLM_TIMEOUT_S, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 breaker: CircuitBreaker = None, max_async_concurrency: int = LLM_MAX_ASYNC_CONCURRENCY):
+        self.timeout_s = timeout_s
+        self.max_concurrency = max_concurrency
+        self.max_async_concurrency = max_async_concurrency
+        self._async_in_flight = 0
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='model-call')
+
+    def call(self, fn: Callable[[], Any], service: str) -> Any:
+        """
+        Run fn with the deadline and breaker applied
+
+        Raises:
+            ModelUnavailableError: If the circuit is open, the pool is full or the deadline passed
+            Exception: Whatever fn raised (also counted as a breaker failure)
+        """
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            get_metrics().increment('llm_rejected', service=service, reason='circuit_open')
+            raise
+        if not self._slots.acquire(blocking=False):
+            # Not the upstream's fault, so it does not count as a failure
+            self.breaker.release_probe()
+            get_metrics().increment('llm_rejected', service=service, reason='saturated')
+            raise ModelSaturatedError('All model call slots are busy')
+
+        future = self._executor.submit(fn)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout_s)
+        except FutureTimeout:
+            error = ModelTimeoutError(f'AI model did not answer within {self.timeout_s:g}s')
+            get_metrics().increment('llm_timeouts', service=service)
+            self.breaker.record_failure(error)
+            raise error
+        except Exception as e:
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]], service: str) -> Any:
+        """
+        Await fn() with the deadline and breaker applied
+
+        Unlike call(), a call that misses its deadline is cancelled. Raises the same errors as call().
+        """
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            get_metrics().increment('llm_rejected', service=service, reason='circuit_open')
+            raise
+        if self._async_in_flight >= self.max_async_concurrency:
+            self.breaker.release_probe()
+            get_metrics().increment('llm_rejected', service=service, reason='saturated')
+            raise ModelSaturatedError('Too many model calls in flight')
+
+        self._async_in_flight += 1
+        try:
+            result = await asyncio.wait_for(fn(), self.timeout_s)
+        except asyncio.TimeoutError:
+            error = ModelTimeoutError(f'AI model did not answer within {self.timeout_s:g}s')
+            get_metrics().increment('llm_timeouts', service=service)
+            self.breaker.record_failure(error)
+            raise error
+        except asyncio.CancelledError:
+            # The client went away; that says nothing about the model
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self.breaker.record_failure(e)
+            raise
+        finally:
+            self._async_in_flight -= 1
+        self.breaker.record_success()
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            'timeout_s': self.timeout_s,
+            'max_concurrency': self.max_concurrency,
+            'max_async_concurrency': self.max_async_concurrency,
+            'async_in_flight': self._async_in_flight,
+            'breaker': self.breaker.stats(),
+        }
+
+
+# Global instance
+_model_guard = None
+
+
+def get_model_guard() -> ModelGuard:
+    """Get or create the model guard shared by the AI services (one upstream, one breaker)"""
+    global _model_guard
+    if _model_guard is None:
+        _model_guard = ModelGuard()
+    return _model_guard
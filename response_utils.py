@@ -0,0 +1,156 @@
+"""
+Response helpers for the JSON API
+Compresses large responses and answers conditional GETs using per-user data versions
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import request, make_response
+
+from shared_state import get_shared_store
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/markdown'}
+
+
+class DataVersionTracker:
+    """Keeps a version counter per user that is bumped whenever data visible to that user changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        # Part of every ETag so validators issued before a restart are never reused
+        self._epoch = format(int(time.time() * 1000), 'x')
+
+    def get(self, user_id: int) -> int:
+        """Get the current data version for a user"""
+        return self._versions.get(user_id, 0)
+
+    def bump(self, *user_ids: int):
+        """Mark data as changed for the given users"""
+        with self._lock:
+            for user_id in set(user_ids):
+                if user_id is not None:
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def etag_for(self, user_id: int, scope: str) -> str:
+        """Build an opaque ETag value for a user, data version and request scope"""
+        raw = f"{self._epoch}:{user_id}:{self.get(user_id)}:{scope}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+class SharedVersionTracker(DataVersionTracker):
+    """Data versions kept in the shared store, so every worker process issues the same ETags"""
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self._epoch = store.epoch
+
+    def get(self, user_id: int) -> int:
+        return self.store.get_version(user_id)
+
+    def bump(self, *user_ids: int):
+        self.store.bump_versions(user_ids)
+
+
+# Global instance
+_version_tracker = None
+
+def get_version_tracker() -> DataVersionTracker:
+    """Get or create the global data version tracker"""
+    global _version_tracker
+    if _version_tracker is None:
+        store = get_shared_store()
+        _version_tracker = SharedVersionTracker(store) if store is not None else DataVersionTracker()
+    return _version_tracker
+
+
+def conditional_get(user_getter: Callable[[], int], validator: Optional[Callable] = None):
+    """
+    Decorator for GET endpoints whose output depends only on the current user's data
+
+    Responds with 304 Not Modified before the view runs when the client's If-None-Match
+    matches, otherwise tags the fresh response with a weak ETag.
+
+    Args:
+        user_getter: Function returning the current user_id
+        validator: Optional function called with the view's arguments before the 304 check,
+            for views that also show data the current user's version does not track. It
+            returns an error response (sent as-is, e.g. after an access check) or a string
+            mixed into the ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            tracker = get_version_tracker()
+            # full_path includes the query string, so ?q= and ?fields= get their own validators
+            scope = request.full_path
+            if validator is not None:
+                extra = validator(*args, **kwargs)
+                if not isinstance(extra, str):
+                    return extra
+                scope = f"{scope}:{extra}"
+            etag = tracker.etag_for(user_getter(), scope)
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            # Browsers must revalidate, which is what makes the 304 path useful
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def compress_response(response):
+    """
+    Compress a response body with brotli or gzip when the client accepts it
+
+    Intended to be registered as an after_request hook.
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    # The body depends on Accept-Encoding from here on, even when it goes out uncompressed,
+    # so shared caches must not hand this response to clients with other encodings
+    response.vary.add('Accept-Encoding')
+    accept = request.accept_encodings
+    if BROTLI_AVAILABLE and accept['br']:
+        compressed = brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+        encoding = 'br'
+    elif accept['gzip']:
+        compressed = gzip.compress(data, compresslevel=min(COMPRESS_LEVEL, 9))
+        encoding = 'gzip'
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,174 @@
+"""
+Row-to-JSON serialization for note queries
+Converts positional database rows into API dicts column-by-column instead of row-by-row
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Column layout of the list queries (get_notes, get_notebook_notes, search_notes)
+NOTE_LIST_COLUMNS = (
+    'note_id', 'title', 'content', 'is_public', 'created_at', 'updated_at',
+    'category', 'notebook', 'tags', 'is_bookmarked', 'note_type', 'access_level', 'summary'
+)
+
+# Fields of search results: the list columns with a snippet around the match instead of the content
+NOTE_SEARCH_FIELDS = tuple(c for c in NOTE_LIST_COLUMNS if c != 'content') + ('snippet',)
+
+# Column layout of the single-note query (get_note)
+NOTE_DETAIL_COLUMNS = (
+    'note_id', 'title', 'content', 'is_public', 'created_at', 'updated_at',
+    'category', 'category_id', 'notebook', 'notebook_id', 'tags'
+)
+
+
+def format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Format a timestamp as 'YYYY-MM-DD HH:MM' (isoformat is several times faster than strftime)"""
+    return value.isoformat(' ', 'minutes') if value is not None else None
+
+
+def format_timestamps(values: Iterable[Optional[datetime]]) -> List[Optional[str]]:
+    """Format a whole column of timestamps"""
+    return [v.isoformat(' ', 'minutes') if v is not None else None for v in values]
+
+
+def split_tags(values: Iterable[Optional[str]]) -> List[List[str]]:
+    """
+    Split a column of GROUP_CONCAT tag strings
+
+    Most notes share a handful of tag combinations, so each distinct string is split once.
+    The returned lists may be shared between rows and must not be mutated.
+    """
+    cache = {None: [], '': []}
+    result = []
+    for value in values:
+        tags = cache.get(value)
+        if tags is None:
+            tags = cache[value] = value.split(',')
+        result.append(tags)
+    return result
+
+
+def _note_type(value):
+    return value or 'owner'
+
+
+def _access_level(value):
+    return value if value is not None else 'owner'
+
+
+# Column converters applied to a whole column at once; missing columns pass through unchanged
+_COLUMN_CONVERTERS = {
+    'created_at': format_timestamps,
+    'updated_at': format_timestamps,
+    'tags': split_tags,
+    'is_bookmarked': lambda values: list(map(bool, values)),
+    'note_type': lambda values: list(map(_note_type, values)),
+    'access_level': lambda values: list(map(_access_level, values)),
+}
+
+
+class NoteRecord:
+    """Compact record for a single note row, addressable by column name"""
+
+    __slots__ = NOTE_LIST_COLUMNS + ('category_id', 'notebook_id')
+
+    def __init__(self, columns: Sequence[str], row: Sequence):
+        for name, value in zip(columns, row):
+            setattr(self, name, value)
+
+    def to_dict(self, fields: Sequence[str]) -> Dict:
+        """Serialize the record, converting each requested column like the bulk path does"""
+        result = {}
+        for name in fields:
+            value = getattr(self, name, None)
+            converter = _COLUMN_CONVERTERS.get(name)
+            result[name] = converter([value])[0] if converter else value
+        return result
+
+
+def parse_fields(raw: Optional[str], columns: Sequence[str] = NOTE_LIST_COLUMNS) -> Sequence[str]:
+    """
+    Parse a sparse fieldset parameter such as "note_id,title,tags"
+
+    Returns all columns when raw is empty, preserving the column order of the layout.
+
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    if not raw:
+        return columns
+    requested = {f.strip() for f in raw.split(',') if f.strip()}
+    unknown = requested.difference(columns)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return tuple(c for c in columns if c in requested)
+
+
+def serialize_rows(rows: Sequence[Sequence], columns: Sequence[str],
+                   fields: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    Serialize positional rows into a list of dicts
+
+    Rows are transposed into columns, only the requested columns are converted
+    (each in a single pass), and dicts are built by zipping the columns back together.
+
+    Args:
+        rows: Rows as returned by cursor.fetchall()
+        columns: Column names of the query, in SELECT order
+        fields: Subset of columns to include (default: all)
+    """
+    if not rows:
+        return []
+    fields = fields or columns
+    all_columns = list(zip(*rows))
+    selected = []
+    for name in fields:
+        values = all_columns[columns.index(name)]
+        converter = _COLUMN_CONVERTERS.get(name)
+        selected.append(converter(values) if converter else values)
+    return [dict(zip(fields, values)) for values in zip(*selected)]
+
+
+def serialize_note_rows(rows: Sequence[Sequence], fields: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Serialize rows from the note list queries"""
+    return serialize_rows(rows, NOTE_LIST_COLUMNS, fields)
+
+
+def merge_activity(note_rows: Sequence[Sequence], reminder_rows: Sequence[Sequence],
+                   limit: int) -> List[Dict]:
+    """
+    Merge recent note updates and reminders into one feed, newest first
+
+    Args:
+        note_rows: (note_id, title, updated_at, user_name, activity_type) rows
+        reminder_rows: (reminder_id, reminder_text, due_date, status, note_title, note_id) rows
+        limit: Maximum number of entries returned
+    """
+    # Sort on the datetimes and only format the entries that survive the cut
+    entries = [(row[2], 0, row) for row in note_rows]
+    entries.extend((row[2], 1, row) for row in reminder_rows)
+    entries.sort(key=lambda e: e[0], reverse=True)
+
+    activities = []
+    for when, kind, row in entries[:limit]:
+        if kind == 0:
+            activities.append({
+                'type': row[4],
+                'note_id': row[0],
+                'title': row[1],
+                'timestamp': when.isoformat(' ', 'seconds'),
+                'user': row[3],
+                'description': f"Updated note: {row[1]}"
+            })
+        else:
+            activities.append({
+                'type': 'reminder',
+                'reminder_id': row[0],
+                'note_id': row[5],
+                'title': row[4],
+                'timestamp': when.isoformat(' ', 'seconds'),
+                'status': row[3],
+                'description': f"Reminder: {row[1]}"
+            })
+    return activities
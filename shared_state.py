@@ -0,0 +1,280 @@
+"""
+Process-shared state
+A small SQLite file through which the worker processes of one host share data versions
+(ETags), permission and index invalidations, change feed events, chatbot conversations
+and autosave drafts. Without
+SHARED_STATE_PATH everything stays in-process, which is right for a single process
+(python app.py).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS data_version (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invalidation (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    target INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feed_event (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipients TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_memory (
+    user_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS note_draft (
+    note_id INTEGER PRIMARY KEY,
+    draft TEXT NOT NULL,
+    rev INTEGER NOT NULL,
+    due REAL NOT NULL
+);
+"""
+
+# Invalidation rows kept; readers further behind than this drop their whole cache
+INVALIDATION_RETAIN = 10000
+
+
+class SharedStore:
+    """
+    SQLite-backed state shared by processes on one host
+
+    Each thread of each process gets its own connection (connections are reopened after
+    a fork). WAL mode keeps readers from blocking the writer; all statements are short.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+            # The first process to open the file fixes the epoch every worker puts in its ETags
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)",
+                         (format(int(time.time() * 1000), 'x'),))
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            # Never use a connection inherited across fork
+            self._local.conn = self._connect()
+            self._local.pid = pid
+        return self._local.conn
+
+    @property
+    def epoch(self) -> str:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    # Data versions
+
+    def get_version(self, user_id: int) -> int:
+        row = self._conn.execute("SELECT version FROM data_version WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_versions(self, user_ids: Iterable[int]):
+        rows = [(user_id,) for user_id in set(user_ids) if user_id is not None]
+        if rows:
+            self._conn.executemany("""
+                INSERT INTO data_version (user_id, version) VALUES (?, 1)
+                ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+            """, rows)
+
+    # Invalidations
+
+    def publish_invalidation(self, kind: str, targets: Iterable[int]):
+        """Record that cached entries for these notes ('note', 'note_text') or tags ('tag') are stale"""
+        conn = self._conn
+        rows = [(kind, int(target)) for target in targets]
+        if not rows:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO invalidation (kind, target) VALUES (?, ?)", rows)
+            conn.execute("DELETE FROM invalidation WHERE seq <= (SELECT MAX(seq) FROM invalidation) - ?",
+                         (INVALIDATION_RETAIN,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def latest_invalidation(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidation").fetchone()[0]
+
+    def invalidations_since(self, seq: int) -> Tuple[int, List[Tuple[str, int]], bool]:
+        """
+        Invalidations after seq
+
+        Returns:
+            (latest_seq, [(kind, target), ...], complete) where complete is False if
+            entries after seq were already trimmed and the caller should drop everything
+        """
+        conn = self._conn
+        latest, oldest = conn.execute("SELECT COALESCE(MAX(seq), 0), COALESCE(MIN(seq), 0) FROM invalidation").fetchone()
+        if latest <= seq:
+            return latest, [], True
+        rows = conn.execute("SELECT kind, target FROM invalidation WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        return latest, rows, oldest <= seq + 1
+
+    # Change feed
+
+    def append_event(self, recipients: Iterable[int], event_type: str, payload: Dict, max_events: int) -> int:
+        # Commas around every id make "is user X a recipient" a LIKE match
+        recipient_str = ',' + ','.join(str(int(r)) for r in recipients) + ','
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute("""
+                INSERT INTO feed_event (recipients, event_type, payload, at) VALUES (?, ?, ?, ?)
+            """, (recipient_str, event_type, json.dumps(payload, default=str), time.time())).lastrowid
+            conn.execute("DELETE FROM feed_event WHERE seq <= ?", (seq - max_events,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def feed_bounds(self) -> Tuple[int, int]:
+        """(oldest retained seq, latest seq); (0, latest) when nothing is retained"""
+        first, last = self._conn.execute("SELECT MIN(seq), MAX(seq) FROM feed_event").fetchone()
+        if last is None:
+            last = self._conn.execute("SELECT COALESCE(seq, 0) FROM sqlite_sequence WHERE name = 'feed_event'").fetchone()
+            return 0, last[0] if last else 0
+        return first, last
+
+    def events_for(self, user_id: int, since: int, until: int, limit: int) -> List[Tuple]:
+        """Events addressed to a user with since < seq <= until"""
+        return self._conn.execute("""
+            SELECT seq, event_type, payload, at FROM feed_event
+            WHERE seq > ? AND seq <= ? AND recipients LIKE ?
+            ORDER BY seq LIMIT ?
+        """, (since, until, f'%,{int(user_id)},%', limit)).fetchall()
+
+    def count_events(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM feed_event").fetchone()[0]
+
+    # Chatbot conversation memory
+
+    def get_chat_memory(self, user_id: int) -> Optional[Dict]:
+        row = self._conn.execute("SELECT state FROM chat_memory WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_chat_memory(self, user_id: int, state: Dict, ttl_s: float):
+        conn = self._conn
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO chat_memory (user_id, state, at) VALUES (?, ?, ?)",
+                     (user_id, json.dumps(state), now))
+        conn.execute("DELETE FROM chat_memory WHERE at < ?", (now - ttl_s,))
+
+    def delete_chat_memory(self, user_id: int):
+        self._conn.execute("DELETE FROM chat_memory WHERE user_id = ?", (user_id,))
+
+    def count_chat_memories(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chat_memory").fetchone()[0]
+
+    # Autosave drafts
+
+    def get_note_draft(self, note_id: int) -> Optional[Dict]:
+        row = self._conn.execute("SELECT draft FROM note_draft WHERE note_id = ?", (note_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def edit_note_draft(self, note_id: int, edit) -> Dict:
+        """Replace a draft with edit(current draft or None) in one write transaction"""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT draft FROM note_draft WHERE note_id = ?", (note_id,)).fetchone()
+            draft = edit(json.loads(row[0]) if row else None)
+            conn.execute("INSERT OR REPLACE INTO note_draft (note_id, draft, rev, due) VALUES (?, ?, ?, ?)",
+                         (note_id, json.dumps(draft), draft['rev'], draft['due']))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return draft
+
+    def claim_note_drafts(self, now: float, claimed_until: float, note_id: Optional[int] = None) -> List[Tuple]:
+        """
+        (note_id, draft) of the drafts due at now, or of note_id whether due or not; their
+        due time moves to claimed_until so no other process claims them meanwhile
+        """
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if note_id is None:
+                rows = conn.execute("SELECT note_id, draft FROM note_draft WHERE due <= ?", (now,)).fetchall()
+            else:
+                rows = conn.execute("SELECT note_id, draft FROM note_draft WHERE note_id = ?", (note_id,)).fetchall()
+            conn.executemany("UPDATE note_draft SET due = ? WHERE note_id = ?",
+                             [(claimed_until, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def delete_note_draft(self, note_id: int):
+        self._conn.execute("DELETE FROM note_draft WHERE note_id = ?", (note_id,))
+
+    def release_note_draft(self, note_id: int, rev: int, base: Optional[Dict] = None):
+        """Delete a draft if it is still at rev; otherwise set the newer draft's base (if given)"""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute("DELETE FROM note_draft WHERE note_id = ? AND rev = ?", (note_id, rev)).rowcount
+            if not deleted and base is not None:
+                row = conn.execute("SELECT draft FROM note_draft WHERE note_id = ?", (note_id,)).fetchone()
+                if row is not None:
+                    draft = json.loads(row[0])
+                    draft['base'] = base
+                    conn.execute("UPDATE note_draft SET draft = ? WHERE note_id = ?", (json.dumps(draft), note_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count_note_drafts(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM note_draft").fetchone()[0]
+
+
+# Global instance
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """Get the shared store, or None when SHARED_STATE_PATH is not set (single process)"""
+    global _shared_store
+    path = os.getenv('SHARED_STATE_PATH')
+    if not path:
+        return None
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                _shared_store = SharedStore(path)
+    return _shared_store
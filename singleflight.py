@@ -0,0 +1,141 @@
+"""
+Single-flight request coalescing
+Concurrent calls with the same key share one execution and its result (or exception)
+"""
+
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from metrics import get_metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates in-flight work within this process
+
+    The first caller for a key runs the function; callers arriving while it runs wait
+    for it and receive the same result. Once it finishes the key is forgotten, so later
+    calls run again. Keys are tuples whose first item names the operation (used as the
+    metrics label).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Tuple, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with this key
+
+        Returns:
+            (result, shared) where shared is True for callers that reused another's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            get_metrics().increment('singleflight_shared', op=key[0])
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        get_metrics().increment('singleflight_executed', op=key[0])
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop (used by the ASGI server)"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Tuple, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        future = self._calls.get(key)
+        if future is not None:
+            get_metrics().increment('singleflight_shared', op=key[0])
+            # shield: a follower giving up must not cancel the leader's call
+            return await asyncio.shield(future), True
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        get_metrics().increment('singleflight_executed', op=key[0])
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # followers re-raise it; don't log it as unretrieved
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result, False
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+def content_key(*parts) -> str:
+    """Short stable hash of the inputs a call depends on"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part if part is not None else '').encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+# Global instance
+_single_flight = None
+
+
+def get_single_flight() -> SingleFlight:
+    """Get or create the single-flight instance"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+
+_async_single_flight = None
+
+
+def get_async_single_flight() -> AsyncSingleFlight:
+    """Get or create the async single-flight instance"""
+    global _async_single_flight
+    if _async_single_flight is None:
+        _async_single_flight = AsyncSingleFlight()
+    return _async_single_flight
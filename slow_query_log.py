@@ -0,0 +1,211 @@
+"""
+Slow-query log
+Records statements slower than a threshold, with their EXPLAIN plan, to a rotating JSON-lines file
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from logging import Formatter, Logger
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from instrumentation import normalize_sql
+
+# Statements that MySQL can EXPLAIN
+EXPLAINABLE_PREFIXES = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+
+def describe_params(args) -> List[str]:
+    """
+    Describe the shape of statement parameters without logging their values
+
+    e.g. (1, 'kubernetes', None) -> ['int', 'str(10)', 'NoneType']
+    """
+    if args is None:
+        return []
+    if isinstance(args, dict):
+        return [f"{key}:{_describe_value(value)}" for key, value in args.items()]
+    if isinstance(args, (list, tuple)) and args and isinstance(args[0], (list, tuple)):
+        # executemany: describe the first row and the row count
+        return [f"rows={len(args)}"] + [_describe_value(v) for v in args[0]]
+    return [_describe_value(v) for v in args]
+
+
+def _describe_value(value) -> str:
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+class SlowQueryRecorder:
+    """Captures slow statements, explains them and aggregates them by fingerprint"""
+
+    def __init__(self, threshold_ms: float = 200.0, log_path: str = 'logs/slow_queries.log',
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5,
+                 explain: bool = True, explain_interval_s: float = 60.0):
+        """
+        Args:
+            threshold_ms: Statements at or above this duration are recorded
+            log_path: JSON-lines log file; rotated at max_bytes keeping backup_count old files
+            explain: Whether to capture an EXPLAIN plan for slow statements
+            explain_interval_s: Minimum seconds between EXPLAINs of the same fingerprint
+        """
+        self.threshold_ms = threshold_ms
+        self.log_path = log_path
+        self.backup_count = backup_count
+        self.explain = explain
+        self.explain_interval_s = explain_interval_s
+        self._lock = threading.Lock()
+        self._aggregates: Dict[str, Dict] = {}
+        self._last_explain: Dict[str, float] = {}
+        self._logger = self._build_logger(log_path, max_bytes, backup_count)
+
+    @staticmethod
+    def _build_logger(log_path: str, max_bytes: int, backup_count: int) -> Optional[Logger]:
+        try:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                          backupCount=backup_count, encoding='utf-8')
+        except OSError as e:
+            print(f"Warning: slow-query log disabled, cannot open {log_path}: {e}")
+            return None
+        handler.setFormatter(Formatter('%(message)s'))
+        logger = Logger('slow_queries')
+        logger.addHandler(handler)
+        return logger
+
+    def on_statement(self, operation, sql, args, elapsed_ms, failed, connection):
+        """Statement listener registered with instrumentation.add_statement_listener"""
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        fingerprint = normalize_sql(sql)
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'fingerprint': fingerprint,
+            'operation': operation,
+            'duration_ms': round(elapsed_ms, 3),
+            'params_shape': describe_params(args),
+            'failed': failed,
+        }
+        if self.explain and operation == 'execute' and self._should_explain(fingerprint):
+            entry['explain'] = self._explain(connection, sql, args)
+
+        self._aggregate(entry)
+        if self._logger is not None:
+            self._logger.warning(json.dumps(entry, default=str))
+
+    def _should_explain(self, fingerprint: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explain.get(fingerprint)
+            if last is not None and now - last < self.explain_interval_s:
+                return False
+            self._last_explain[fingerprint] = now
+            return True
+
+    @staticmethod
+    def _explain(connection, sql: str, args) -> Dict:
+        """Run EXPLAIN for a statement on a plain (uninstrumented) cursor"""
+        if connection is None or not sql.lstrip().upper().startswith(EXPLAINABLE_PREFIXES):
+            return {'skipped': 'not explainable'}
+        try:
+            cur = connection.cursor()
+            try:
+                cur.execute(f"EXPLAIN {sql}", args)
+                columns = [d[0] for d in cur.description or ()]
+                return {'rows': [dict(zip(columns, row)) for row in cur.fetchall()]}
+            finally:
+                cur.close()
+        except Exception as e:
+            return {'error': str(e)}
+
+    def _aggregate(self, entry: Dict):
+        with self._lock:
+            agg = self._aggregates.get(entry['fingerprint'])
+            if agg is None:
+                agg = self._aggregates[entry['fingerprint']] = {
+                    'fingerprint': entry['fingerprint'],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'failed': 0,
+                }
+            _merge(agg, entry)
+
+    def report(self, source: str = 'memory', limit: int = 20) -> List[Dict]:
+        """
+        Aggregate slow statements by fingerprint, slowest total time first
+
+        Args:
+            source: 'memory' for this process since startup, 'log' to re-read the rotated log files
+                    (covers restarts and every worker writing to the same file)
+            limit: Maximum number of fingerprints returned
+        """
+        if source == 'log':
+            aggregates = self._aggregate_log()
+        else:
+            with self._lock:
+                aggregates = {k: dict(v) for k, v in self._aggregates.items()}
+
+        results = sorted(aggregates.values(), key=lambda a: a['total_ms'], reverse=True)[:limit]
+        for agg in results:
+            agg['total_ms'] = round(agg['total_ms'], 3)
+            agg['avg_ms'] = round(agg['total_ms'] / agg['count'], 3)
+        return results
+
+    def _aggregate_log(self) -> Dict[str, Dict]:
+        aggregates = {}
+        paths = [self.log_path] + [f"{self.log_path}.{i}" for i in range(1, self.backup_count + 1)]
+        for path in reversed(paths):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    agg = aggregates.setdefault(entry['fingerprint'], {
+                        'fingerprint': entry['fingerprint'],
+                        'count': 0,
+                        'total_ms': 0.0,
+                        'max_ms': 0.0,
+                        'failed': 0,
+                    })
+                    _merge(agg, entry)
+        return aggregates
+
+
+def _merge(agg: Dict, entry: Dict):
+    """Fold one log entry into an aggregate (entries must arrive oldest first)"""
+    agg['count'] += 1
+    agg['total_ms'] += entry['duration_ms']
+    agg['max_ms'] = max(agg['max_ms'], entry['duration_ms'])
+    agg['failed'] += 1 if entry.get('failed') else 0
+    agg['last_seen'] = entry['timestamp']
+    agg['params_shape'] = entry.get('params_shape')
+    if 'explain' in entry:
+        agg['explain'] = entry['explain']
+
+
+# Global instance
+_slow_query_recorder = None
+
+def get_slow_query_recorder() -> SlowQueryRecorder:
+    """Get or create the global slow-query recorder, configured from environment variables"""
+    global _slow_query_recorder
+    if _slow_query_recorder is None:
+        _slow_query_recorder = SlowQueryRecorder(
+            threshold_ms=float(os.getenv('SLOW_QUERY_MS', '200')),
+            log_path=os.getenv('SLOW_QUERY_LOG', 'logs/slow_queries.log'),
+            max_bytes=int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(5 * 1024 * 1024))),
+            backup_count=int(os.getenv('SLOW_QUERY_LOG_BACKUPS', '5')),
+            explain=os.getenv('SLOW_QUERY_EXPLAIN', '1') != '0',
+        )
+    return _slow_query_recorder
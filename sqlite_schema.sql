@@ -0,0 +1,271 @@
+-- SQLite version of "DBMS Proj.sql" for STORAGE_BACKEND=sqlite
+-- Applied automatically by storage.py when the database file has no tables yet.
+-- Timestamps are stored as local time ('YYYY-MM-DD HH:MM:SS') to match MySQL NOW().
+-- storage.py switches the file to WAL mode and runs this script in one transaction.
+
+CREATE TABLE app_user (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(150) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE notebook (
+    notebook_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE category (
+    category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL UNIQUE,
+    description TEXT
+);
+
+CREATE TABLE category_hierarchy (
+    parent_category_id INT NOT NULL,
+    sub_category_id INT NOT NULL,
+    PRIMARY KEY (parent_category_id, sub_category_id),
+    FOREIGN KEY (parent_category_id) REFERENCES category(category_id) ON DELETE CASCADE,
+    FOREIGN KEY (sub_category_id) REFERENCES category(category_id) ON DELETE CASCADE,
+    CHECK (parent_category_id <> sub_category_id)
+);
+
+CREATE TABLE note (
+    note_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    category_id INT,
+    notebook_id INT,
+    title VARCHAR(200) NOT NULL,
+    content TEXT,
+    is_public BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (user_id) REFERENCES app_user(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (category_id) REFERENCES category(category_id),
+    FOREIGN KEY (notebook_id) REFERENCES notebook(notebook_id) ON DELETE SET NULL
+);
+
+CREATE TABLE note_history (
+    history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT,
+    title_snapshot VARCHAR(100),
+    content_snapshot TEXT,
+    edited_by INT,
+    version_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (edited_by) REFERENCES app_user(user_id)
+);
+
+CREATE TABLE tag (
+    tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(80) NOT NULL UNIQUE
+);
+
+CREATE TABLE note_tag (
+    note_id INT NOT NULL,
+    tag_id INT NOT NULL,
+    PRIMARY KEY (note_id, tag_id),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tag(tag_id) ON DELETE CASCADE
+);
+
+CREATE TABLE attachment (
+    attachment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT NOT NULL,
+    filename VARCHAR(225) NOT NULL,
+    filepath TEXT,
+    uploaded_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+);
+
+CREATE TABLE collaboration (
+    collab_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT NOT NULL,
+    shared_with_user_id INT NOT NULL,
+    access_level VARCHAR(10) NOT NULL CHECK (access_level IN ('read', 'write', 'owner')),
+    shared_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (note_id, shared_with_user_id),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (shared_with_user_id) REFERENCES app_user(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE comment (
+    comment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT NOT NULL,
+    user_id INT NOT NULL,
+    comment_text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES app_user(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE reminder (
+    reminder_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT NOT NULL,
+    user_id INT NOT NULL,
+    reminder_text VARCHAR(300),
+    due_date DATETIME,
+    status VARCHAR(10) DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'skipped')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES app_user(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE tag_suggestion (
+    suggestion_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT NOT NULL,
+    tag_id INT NOT NULL,
+    confidence DECIMAL(5,4) DEFAULT 0.0,
+    suggested_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tag(tag_id)
+);
+
+CREATE TABLE bookmark (
+    bookmark_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id INT NOT NULL,
+    user_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (note_id, user_id),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES app_user(user_id) ON DELETE CASCADE
+);
+
+-- AI summary of a note, with the hash of the content it was generated from
+CREATE TABLE note_summary (
+    note_id INTEGER PRIMARY KEY,
+    summary TEXT NOT NULL,
+    content_hash CHAR(40) NOT NULL,
+    generated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+);
+
+-- Failed summary generations for a note's current content (cleared when the content changes)
+CREATE TABLE summary_failure (
+    note_id INTEGER PRIMARY KEY,
+    content_hash CHAR(40) NOT NULL,
+    attempts INT NOT NULL,
+    failed_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (note_id) REFERENCES note(note_id) ON DELETE CASCADE
+);
+
+-- MySQL indexes foreign key columns implicitly; SQLite needs them spelled out
+CREATE INDEX idx_note_user ON note(user_id);
+CREATE INDEX idx_collaboration_user ON collaboration(shared_with_user_id);
+CREATE INDEX idx_reminder_user ON reminder(user_id);
+-- Range scans by the reminder scheduler
+CREATE INDEX idx_reminder_status_due ON reminder(status, due_date);
+CREATE INDEX idx_bookmark_user ON bookmark(user_id);
+CREATE INDEX idx_note_history_note ON note_history(note_id);
+CREATE INDEX idx_tag_suggestion_note ON tag_suggestion(note_id);
+
+-- ===============================
+-- TRIGGERS
+-- ===============================
+
+-- Trigger 1: Version History
+-- AFTER instead of BEFORE so it can also maintain updated_at (MySQL's ON UPDATE CURRENT_TIMESTAMP);
+-- SQLite triggers are not recursive by default, so the inner UPDATE does not record a second version.
+CREATE TRIGGER trg_note_version
+AFTER UPDATE ON note
+FOR EACH ROW
+BEGIN
+    INSERT INTO note_history(note_id, title_snapshot, content_snapshot, edited_by, version_at)
+    VALUES (OLD.note_id, OLD.title, OLD.content, OLD.user_id, datetime('now', 'localtime'));
+    UPDATE note SET updated_at = datetime('now', 'localtime') WHERE note_id = NEW.note_id;
+END;
+
+-- Trigger 2: Update notebook timestamp
+CREATE TRIGGER trg_notebook_updated
+AFTER UPDATE ON note
+FOR EACH ROW
+WHEN OLD.notebook_id IS NOT NULL
+BEGIN
+    UPDATE notebook SET created_at = datetime('now', 'localtime') WHERE notebook_id = OLD.notebook_id;
+END;
+
+-- Trigger 3: Auto reminder when tag='todo'
+CREATE TRIGGER trg_auto_todo_reminder
+AFTER INSERT ON note_tag
+FOR EACH ROW
+WHEN (SELECT name FROM tag WHERE tag_id = NEW.tag_id) = 'todo'
+BEGIN
+    INSERT INTO reminder (note_id, user_id, reminder_text, due_date, status)
+    SELECT NEW.note_id, n.user_id, 'Complete TODO item', datetime('now', 'localtime', '+7 days'), 'pending'
+    FROM note n WHERE n.note_id = NEW.note_id;
+END;
+
+-- Stored procedures (suggest_tag, share_note, mark_reminder_done) have no SQLite equivalent;
+-- storage.py runs their bodies when app code calls cursor.callproc().
+
+-- ===============================
+-- SAMPLE DATA
+-- ===============================
+
+INSERT INTO app_user (name, email) VALUES
+('Pranav', 'pranav@example.com'),
+('aman', 'aman@example.com'),
+('aaron', 'aaron@example.com'),
+('aashilesh', 'aashilesh@example.com'),
+('aaditya', 'aaditya@example.com');
+
+INSERT INTO category (name, description) VALUES
+('Course Notes', 'Notes for courses'),
+('Personal', 'Personal knowledge and diary'),
+('Work', 'Work-related notes'),
+('Programming', 'Code snippets and references'),
+('Research', 'Research papers and project findings');
+
+INSERT INTO category_hierarchy VALUES (1, 4);
+
+INSERT INTO notebook (user_id, title, description) VALUES
+(1, 'DBMS Notes', 'Concepts, SQL, and normalization'),
+(1, 'Daily Journal', 'Everyday personal thoughts'),
+(2, 'Team Project', 'Collaborative space for shared tasks'),
+(3, 'Work Tasks', 'Work-related documentation'),
+(4, 'Coding Practice', 'Code snippets and problem-solving');
+
+INSERT INTO tag (name) VALUES
+('sql'),
+('mysql'),
+('design'),
+('todo'),
+('ai');
+
+INSERT INTO note (user_id, category_id, notebook_id, title, content, is_public) VALUES
+(1, 1, 1, 'ER Model', 'ER diagram and normalization', 0),
+(1, 4, 1, 'Indexing Tips', 'Use proper indexing for performance', 1),
+(2, 2, 2, 'Daily Reflection', 'Worked on group project module', 0),
+(3, 3, 4, 'Client Meeting', 'Discussed project timeline', 0),
+(4, 4, 5, 'Python Basics', 'Learning functions and loops', 1);
+
+INSERT INTO note_tag VALUES
+(1, 3),
+(2, 1),
+(2, 2),
+(3, 4),
+(5, 5);
+
+INSERT INTO bookmark (note_id, user_id) VALUES
+(2, 1),
+(3, 1),
+(4, 2),
+(1, 3),
+(5, 2);
+
+INSERT INTO collaboration (note_id, shared_with_user_id, access_level) VALUES
+(1, 2, 'write'),
+(2, 3, 'read'),
+(3, 4, 'read'),
+(4, 5, 'write'),
+(5, 1, 'read');
+
+INSERT INTO reminder (note_id, user_id, reminder_text, due_date) VALUES
+(1, 1, 'Revise ER diagram', datetime('now', 'localtime', '+1 day')),
+(2, 1, 'Recheck indexing strategy', datetime('now', 'localtime', '+2 days')),
+(3, 2, 'Finish project summary', datetime('now', 'localtime', '+3 days')),
+(4, 3, 'Prepare meeting notes', datetime('now', 'localtime', '+1 day')),
+(5, 4, 'Complete Python exercises', datetime('now', 'localtime', '+4 days'));
@@ -0,0 +1,265 @@
+"""
+Storage backends
+app.py talks to the database through `db.connection.cursor()` with MySQL-flavoured SQL;
+this module provides that interface on top of MySQL (Flask-MySQLdb) or an embedded SQLite file.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict
+
+from flask import g
+
+from instrumentation import InstrumentedConnection
+
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+_INSERT_IGNORE_RE = re.compile(r'^(\s*)INSERT\s+IGNORE\b', re.IGNORECASE)
+_EXPLAIN_RE = re.compile(r'^(\s*)EXPLAIN\b(?!\s+QUERY\s+PLAN)', re.IGNORECASE)
+
+# Bodies of the stored procedures in "DBMS Proj.sql", run by SQLiteCursor.callproc
+SQLITE_PROCEDURES = {
+    'suggest_tag': """
+        INSERT INTO tag_suggestion (note_id, tag_id, confidence, suggested_at)
+        VALUES (?, ?, ?, datetime('now', 'localtime'))
+    """,
+    'share_note': """
+        INSERT INTO collaboration (note_id, shared_with_user_id, access_level, shared_at)
+        VALUES (?, ?, ?, datetime('now', 'localtime'))
+        ON CONFLICT (note_id, shared_with_user_id) DO UPDATE SET
+            access_level = excluded.access_level,
+            shared_at = excluded.shared_at
+    """,
+    'mark_reminder_done': """
+        UPDATE reminder SET status = 'done' WHERE reminder_id = ?
+    """,
+}
+
+
+def _convert_timestamp(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+# Return TIMESTAMP/DATETIME columns as datetime objects, like MySQLdb does
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+sqlite3.register_converter('DATETIME', _convert_timestamp)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(Decimal, float)
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql: str) -> str:
+    """
+    Rewrite the MySQL constructs app.py uses into SQLite syntax
+
+    %s placeholders become ?, INSERT IGNORE becomes INSERT OR IGNORE and EXPLAIN
+    becomes EXPLAIN QUERY PLAN. GROUP_CONCAT, COALESCE, CASE and LIMIT work as-is.
+    """
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _INSERT_IGNORE_RE.sub(r'\1INSERT OR IGNORE', sql)
+    sql = _EXPLAIN_RE.sub(r'\1EXPLAIN QUERY PLAN', sql)
+    return sql
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts the MySQL dialect used by app.py"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query, args=None):
+        return self._cursor.execute(translate_sql(query), tuple(args) if args is not None else ())
+
+    def executemany(self, query, args):
+        return self._cursor.executemany(translate_sql(query), [tuple(row) for row in args])
+
+    def callproc(self, procname, args=()):
+        body = SQLITE_PROCEDURES.get(procname)
+        if body is None:
+            raise sqlite3.OperationalError(f"PROCEDURE {procname} does not exist")
+        self._cursor.execute(body, tuple(args))
+        return args
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SQLiteConnection:
+    """sqlite3 connection whose cursors speak the MySQL dialect"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.raw = connection
+
+    def cursor(self):
+        return SQLiteCursor(self.raw.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def _script_statements(script: str):
+    """Split a SQL script into statements (trigger bodies included)"""
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            yield buffer.strip()
+            buffer = ''
+
+
+def connect_sqlite(path: str, timeout: float = 30.0) -> SQLiteConnection:
+    """
+    Open a SQLite database, creating the schema and sample data on first use
+
+    WAL lets readers run alongside the single writer; synchronous=NORMAL is durable
+    across application crashes and only risks the last commits on power loss.
+    """
+    conn = sqlite3.connect(path, timeout=timeout, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'app_user'").fetchone() is None:
+        # Exclusive, and checked again inside, so concurrent first connections create it once
+        conn.execute("BEGIN EXCLUSIVE")
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'app_user'").fetchone() is None:
+                with open(SQLITE_SCHEMA_PATH, encoding='utf-8') as f:
+                    for statement in _script_statements(f.read()):
+                        conn.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return SQLiteConnection(conn)
+
+
+class StorageBackend:
+    """
+    Hands out one instrumented connection per application context and tracks their lifecycle
+
+    Subclasses implement _connect/_close and describe the backend for diagnostics.
+    """
+
+    name = 'base'
+    strategy = 'connection per app context'
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.teardown_appcontext(self.teardown)
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _close(self, raw):
+        raw.close()
+
+    @property
+    def connection(self):
+        wrapper = g.get('_db_connection')
+        if wrapper is None:
+            raw = self._connect()
+            if raw is None:
+                return None
+            wrapper = InstrumentedConnection(raw)
+            g._db_connection = wrapper
+            with self._lock:
+                self._opened += 1
+        return wrapper
+
+    def teardown(self, exception):
+        wrapper = g.pop('_db_connection', None)
+        if wrapper is not None:
+            with self._lock:
+                self._closed += 1
+            self._close(wrapper.raw)
+
+    def describe(self) -> Dict:
+        """Backend details for /api/debug/test-connection"""
+        return {'backend': self.name}
+
+    def pool_state(self) -> Dict:
+        """
+        Describe connection usage
+
+        Connections are opened per application context and closed on teardown,
+        so there is no pool to size; the counters show how many connections are live.
+        """
+        with self._lock:
+            opened, closed = self._opened, self._closed
+        return {
+            'pooling': False,
+            'strategy': self.strategy,
+            'opened': opened,
+            'closed': closed,
+            'active': opened - closed,
+        }
+
+
+class MySQLStorage(StorageBackend):
+    """MySQL through Flask-MySQLdb, configured by the MYSQL_* app config keys"""
+
+    name = 'mysql'
+
+    def init_app(self, app):
+        from flask_mysqldb import MySQL
+        self._app = app
+        self._mysql = MySQL(app)  # registers its own teardown that closes the connection
+        super().init_app(app)
+
+    def _connect(self):
+        return self._mysql.connection
+
+    def _close(self, raw):
+        pass  # Flask-MySQLdb closes it
+
+    def describe(self) -> Dict:
+        return {
+            'backend': self.name,
+            'database': self._app.config['MYSQL_DB'],
+            'host': self._app.config['MYSQL_HOST'],
+        }
+
+
+class SQLiteStorage(StorageBackend):
+    """Embedded SQLite file in WAL mode; no server and no network hop"""
+
+    name = 'sqlite'
+
+    def __init__(self, app=None, path: str = None):
+        self.path = path or os.getenv('SQLITE_PATH', 'pkb.sqlite3')
+        super().__init__(app)
+
+    def _connect(self):
+        return connect_sqlite(self.path)
+
+    def describe(self) -> Dict:
+        return {'backend': self.name, 'database': os.path.abspath(self.path), 'journal_mode': 'wal'}
+
+
+STORAGE_BACKENDS = {
+    'mysql': MySQLStorage,
+    'sqlite': SQLiteStorage,
+}
+
+
+def create_storage(app=None) -> StorageBackend:
+    """Create the backend named by STORAGE_BACKEND (mysql or sqlite); call init_app later if app is None"""
+    name = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}'. Choose from: {', '.join(STORAGE_BACKENDS)}")
+    return STORAGE_BACKENDS[name](app)
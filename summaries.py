@@ -0,0 +1,286 @@
+"""
+Note summaries
+Generates the AI summaries shown on note cards in a background thread, a debounce delay
+after a note's text was last written, so list views read stored summaries and never wait
+on the model
+"""
+
+import hashlib
+import heapq
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from ai_service import get_ai_service
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process backfills
+    fcntl = None
+
+# A note is summarised this long after its last write, so a burst of edits costs one model call
+SUMMARY_DEBOUNCE_S = float(os.getenv('SUMMARY_DEBOUNCE_S', '10'))
+# Failed generations (model unavailable or an empty answer) are retried after this long
+SUMMARY_RETRY_S = float(os.getenv('SUMMARY_RETRY_S', '60'))
+SUMMARY_MAX_ATTEMPTS = 3
+# When idle, notes without a summary are queued this many at a time (0 disables backfilling)
+SUMMARY_BACKFILL_BATCH = int(os.getenv('SUMMARY_BACKFILL_BATCH', '20'))
+SUMMARY_BACKFILL_S = float(os.getenv('SUMMARY_BACKFILL_S', '300'))
+
+
+def summary_hash(content: str) -> str:
+    """Hash of the text a summary is generated from (stored next to the summary)"""
+    return hashlib.sha1((content or '').encode('utf-8')).hexdigest()
+
+
+def drop_stale_summary(cur, note_id: int, content: str):
+    """
+    Delete a note's summary unless it was generated from this content
+
+    Called in the transaction that writes the note, so list views show the content
+    excerpt rather than an outdated summary until the new one is ready. The write bumps
+    the note audience's data versions after its commit, which covers this delete too.
+    Failed attempts recorded for other content are cleared as well, so new text gets
+    SUMMARY_MAX_ATTEMPTS fresh tries.
+    """
+    content_hash = summary_hash(content)
+    cur.execute("DELETE FROM note_summary WHERE note_id = %s AND content_hash <> %s", (note_id, content_hash))
+    cur.execute("DELETE FROM summary_failure WHERE note_id = %s AND content_hash <> %s", (note_id, content_hash))
+
+
+class SummaryWorker:
+    """
+    Debounced background summarisation
+
+    note_changed() only records when the note is due: each write pushes the due time back
+    by the debounce delay, and a heap entry whose due time was superseded is skipped when
+    popped. A single thread (started by the first request when a model is configured) works through due notes one
+    model call at a time. Before calling the model it compares the hash of the current
+    content with the one stored with the summary, so writes that did not change the
+    content (visibility toggles, reverted edits) cost nothing; before storing it checks
+    the content again, so a summary of text edited in the meantime is never saved.
+
+    Failed attempts are counted per note and content hash in the summary_failure table, so
+    no per-note state accumulates in memory: the row is removed when a summary is stored,
+    when the content changes (drop_stale_summary) and with the note (foreign key cascade).
+    Jobs live in the process that handled the write. With SHARED_STATE_PATH set, only one
+    process at a time runs the backfill of notes that have no summary yet.
+    """
+
+    def __init__(self, db, app=None, on_stored: Optional[Callable] = None, debounce_s: float = SUMMARY_DEBOUNCE_S, retry_s: float = SUMMARY_RETRY_S,
+                 backfill_batch: int = SUMMARY_BACKFILL_BATCH, backfill_s: float = SUMMARY_BACKFILL_S):
+        self.app = app
+        self.on_stored = on_stored
+        self.db = db
+        self.debounce_s = debounce_s
+        self.retry_s = retry_s
+        self.backfill_batch = backfill_batch
+        self.backfill_s = backfill_s
+        self._heap: List[tuple] = []     # (due monotonic time, note_id)
+        self._due: Dict[int, float] = {}  # note_id -> current due time
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._next_backfill = 0.0
+        self.generated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.exhausted = 0
+        self.superseded = 0
+        self.last_error = None
+
+    def init_app(self, app, on_stored: Optional[Callable] = None):
+        """
+        on_stored(cur, note_id) runs after a summary was committed (inside an app context),
+        to invalidate the cached list responses that show it
+        """
+        self.app = app
+        self.on_stored = on_stored
+
+    def note_changed(self, note_id: int):
+        """Schedule (or postpone) summarising a note whose text was just written"""
+        if not get_ai_service().is_available():
+            return
+        self._schedule(note_id, self.debounce_s)
+        self.ensure_started()
+
+    def _schedule(self, note_id: int, delay_s: float):
+        due = time.monotonic() + delay_s
+        with self._lock:
+            self._due[note_id] = due
+            heapq.heappush(self._heap, (due, note_id))
+        self._wake.set()
+
+    def ensure_started(self):
+        """Start the background thread once; without a model there is nothing to do"""
+        if self._thread is not None or not get_ai_service().is_available():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='summary-worker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            note_id = None
+            with self._lock:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due, candidate = heapq.heappop(self._heap)
+                    if self._due.get(candidate) == due:
+                        del self._due[candidate]
+                        note_id = candidate
+                        break
+                head = self._heap[0][0] if self._heap else None
+            backfill = (note_id is None and head is None and self.backfill_batch > 0
+                        and time.monotonic() >= self._next_backfill)
+            try:
+                if note_id is not None:
+                    self._summarize(note_id)
+                elif backfill:
+                    self._next_backfill = time.monotonic() + self.backfill_s
+                    self._backfill()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error in summary worker: {e}")
+            if note_id is not None or backfill:
+                continue
+            sleep_s = (head if head is not None else self._next_backfill) - time.monotonic()
+            if self._wake.wait(max(0.05, sleep_s)):
+                self._wake.clear()
+
+    def _current_text(self, note_id: int) -> Optional[tuple]:
+        """
+        (content, hash of the stored summary or None, hash of the failed content or None,
+        failed attempts or None), or None if the note is gone
+        """
+        with self.app.app_context():
+            cur = self.db.connection.cursor()
+            try:
+                cur.execute("""
+                    SELECT n.content, ns.content_hash, sf.content_hash, sf.attempts
+                    FROM note n
+                    LEFT JOIN note_summary ns ON ns.note_id = n.note_id
+                    LEFT JOIN summary_failure sf ON sf.note_id = n.note_id
+                    WHERE n.note_id = %s
+                """, (note_id,))
+                return cur.fetchone()
+            finally:
+                cur.close()
+
+    def _record_failure(self, note_id: int, content_hash: str, attempts: int):
+        with self.app.app_context():
+            cur = self.db.connection.cursor()
+            try:
+                cur.execute("DELETE FROM summary_failure WHERE note_id = %s", (note_id,))
+                cur.execute("""
+                    INSERT INTO summary_failure (note_id, content_hash, attempts)
+                    SELECT note_id, %s, %s FROM note WHERE note_id = %s
+                """, (content_hash, attempts, note_id))
+                self.db.connection.commit()
+            finally:
+                cur.close()
+
+    def _summarize(self, note_id: int):
+        current = self._current_text(note_id)
+        if current is None or not (current[0] or '').strip():
+            return
+        content, stored_hash, failed_hash, attempts = current
+        content_hash = summary_hash(content)
+        if content_hash == stored_hash:
+            self.unchanged += 1
+            return
+        attempts = attempts if failed_hash == content_hash else 0
+        if attempts >= SUMMARY_MAX_ATTEMPTS:
+            return
+
+        # analyze_note_summary goes through the model guard (deadline and circuit breaker)
+        # and returns '' on any failure
+        summary = get_ai_service().analyze_note_summary(content)
+        if not summary:
+            self.failed += 1
+            attempts += 1
+            self._record_failure(note_id, content_hash, attempts)
+            if attempts < SUMMARY_MAX_ATTEMPTS:
+                with self._lock:
+                    pending = note_id in self._due
+                if not pending:
+                    self._schedule(note_id, self.retry_s)
+            else:
+                self.exhausted += 1
+            return
+
+        with self.app.app_context():
+            cur = self.db.connection.cursor()
+            try:
+                cur.execute("SELECT content FROM note WHERE note_id = %s", (note_id,))
+                row = cur.fetchone()
+                if row is None or summary_hash(row[0]) != content_hash:
+                    # Edited (or deleted) while the model was working; the edit queued a new job
+                    self.superseded += 1
+                    return
+                cur.execute("DELETE FROM note_summary WHERE note_id = %s", (note_id,))
+                cur.execute("DELETE FROM summary_failure WHERE note_id = %s", (note_id,))
+                cur.execute("""
+                    INSERT INTO note_summary (note_id, summary, content_hash)
+                    VALUES (%s, %s, %s)
+                """, (note_id, summary, content_hash))
+                self.db.connection.commit()
+                if self.on_stored is not None:
+                    self.on_stored(cur, note_id)
+            finally:
+                cur.close()
+        self.generated += 1
+
+    def _backfill(self):
+        """Queue the most recently updated notes that have no summary yet and have not used up their attempts"""
+        lock_file = None
+        path = os.getenv('SHARED_STATE_PATH')
+        if path and fcntl is not None:
+            lock_file = open(path + '.summaries.lock', 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return  # another process is backfilling
+        try:
+            with self.app.app_context():
+                cur = self.db.connection.cursor()
+                try:
+                    # summary_failure rows always belong to the current content (drop_stale_summary)
+                    cur.execute("""
+                        SELECT n.note_id
+                        FROM note n
+                        LEFT JOIN note_summary ns ON ns.note_id = n.note_id
+                        LEFT JOIN summary_failure sf ON sf.note_id = n.note_id
+                        WHERE ns.note_id IS NULL AND n.content <> ''
+                          AND (sf.note_id IS NULL OR sf.attempts < %s)
+                        ORDER BY n.updated_at DESC
+                        LIMIT %s
+                    """, (SUMMARY_MAX_ATTEMPTS, self.backfill_batch))
+                    rows = cur.fetchall()
+                finally:
+                    cur.close()
+            with self._lock:
+                note_ids = [note_id for note_id, in rows if note_id not in self._due]
+            for note_id in note_ids:
+                self._schedule(note_id, 0)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'queued': len(self._due),
+                'debounce_s': self.debounce_s,
+                'generated': self.generated,
+                'unchanged': self.unchanged,
+                'failed': self.failed,
+                'exhausted': self.exhausted,
+                'superseded': self.superseded,
+                'last_error': self.last_error,
+            }
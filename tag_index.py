@@ -0,0 +1,151 @@
+"""
+Tag prefix index
+Sorted array of tag names with usage counts from note_tag, for autocomplete without
+sending the whole tag table to the browser
+"""
+
+import bisect
+import heapq
+import os
+import threading
+import time
+from operator import itemgetter
+from typing import Dict, List, Optional
+
+# Prefixes up to this long match a large share of all tags; their answers are cached
+SHORT_PREFIX_LEN = 2
+# Reload from the database after this long, picking up tags created by other worker processes
+TAG_INDEX_MAX_AGE_S = float(os.getenv('TAG_INDEX_MAX_AGE_S', '300'))
+
+
+class TagIndex:
+    """
+    Prefix search over tag names, ranked by how many notes use each tag
+
+    Names are kept lowercased in a sorted list, so the tags starting with a prefix are one
+    contiguous slice found with two binary searches; the top-k of that slice by usage is a
+    heap selection. Results for one- and two-character prefixes (the largest slices) are
+    cached; a write drops only the cached prefixes whose answer it can change. Writes update
+    the index in place.
+    """
+
+    def __init__(self, max_age_s: float = TAG_INDEX_MAX_AGE_S):
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._keys: List[str] = []         # sorted lowercased names
+        self._entries: List[list] = []     # [name, usage, tag_id] at the same position
+        self._tags: Dict[int, list] = {}   # tag_id -> the same entry
+        self._short_cache: Dict[tuple, List[Dict]] = {}
+        self._loaded_at: Optional[float] = None
+        self.last_load_ms = 0.0
+
+    def needs_load(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.max_age_s
+
+    def load(self, cur):
+        """(Re)build the index from the tag and note_tag tables"""
+        start = time.perf_counter()
+        cur.execute("""
+            SELECT t.tag_id, t.name, COUNT(nt.note_id)
+            FROM tag t
+            LEFT JOIN note_tag nt ON nt.tag_id = t.tag_id
+            GROUP BY t.tag_id, t.name
+        """)
+        entries = sorted(([name, int(usage), tag_id] for tag_id, name, usage in cur.fetchall()),
+                         key=lambda entry: entry[0].lower())
+        with self._lock:
+            self._keys = [entry[0].lower() for entry in entries]
+            self._entries = entries
+            self._tags = {entry[2]: entry for entry in entries}
+            self._short_cache.clear()
+            self._loaded_at = time.monotonic()
+        self.last_load_ms = (time.perf_counter() - start) * 1000
+
+    def search(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Tags whose name starts with prefix (case-insensitive), most used first; call load() first"""
+        prefix = prefix.strip().lower()
+        cache_key = (prefix, limit)
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX_LEN:
+                cached = self._short_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            lo = bisect.bisect_left(self._keys, prefix)
+            # U+FFFF sorts after every character, so this is the end of the prefix range
+            hi = bisect.bisect_left(self._keys, prefix + '\uffff', lo)
+            top = heapq.nlargest(limit, self._entries[lo:hi], key=itemgetter(1))
+            result = [{'id': tag_id, 'name': name, 'usage': usage} for name, usage, tag_id in top]
+            if len(prefix) <= SHORT_PREFIX_LEN:
+                self._short_cache[cache_key] = result
+        return result
+
+    def add_tag(self, tag_id: int, name: str):
+        """Register a tag (no-op if already known or the index is not loaded yet)"""
+        with self._lock:
+            if self._loaded_at is None or tag_id in self._tags:
+                return
+            self._insert_locked(tag_id, name, 0)
+
+    def set_tag(self, tag_id: int, name: str, usage: int):
+        """Register a tag or replace its usage count with one read from the database"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            entry = self._tags.get(tag_id)
+            if entry is None:
+                self._insert_locked(tag_id, name, usage)
+            elif entry[1] != usage:
+                delta = usage - entry[1]
+                entry[1] = usage
+                self._invalidate_prefixes(entry, delta)
+
+    def _insert_locked(self, tag_id: int, name: str, usage: int):
+        key = name.lower()
+        pos = bisect.bisect_left(self._keys, key)
+        entry = [name, usage, tag_id]
+        self._keys.insert(pos, key)
+        self._entries.insert(pos, entry)
+        self._tags[tag_id] = entry
+        self._invalidate_prefixes(entry, usage)
+
+    def record_usage(self, tag_ids, delta: int = 1):
+        """Adjust usage counts after tags were attached to (or detached from) a note"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for tag_id in tag_ids:
+                entry = self._tags.get(tag_id)
+                if entry is not None:
+                    entry[1] = max(0, entry[1] + delta)
+                    self._invalidate_prefixes(entry, delta)
+
+    def _invalidate_prefixes(self, entry: list, delta: int):
+        # Only the cached prefixes of this tag's name can change, and only if the tag is
+        # listed there, or if it was added or gained uses and could now make the list
+        key = entry[0].lower()
+        for cache_key in [k for k in self._short_cache if key.startswith(k[0])]:
+            result = self._short_cache[cache_key]
+            listed = any(item['id'] == entry[2] for item in result)
+            if listed or (delta >= 0 and (len(result) < cache_key[1] or entry[1] >= result[-1]['usage'])):
+                del self._short_cache[cache_key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'tags': len(self._keys),
+                'cached_prefixes': len(self._short_cache),
+                'loaded': self._loaded_at is not None,
+                'last_load_ms': round(self.last_load_ms, 3),
+            }
+
+
+# Global instance
+_tag_index = None
+
+
+def get_tag_index() -> TagIndex:
+    """Get or create the tag index instance"""
+    global _tag_index
+    if _tag_index is None:
+        _tag_index = TagIndex()
+    return _tag_index
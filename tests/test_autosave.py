@@ -0,0 +1,49 @@
+"""
+Autosave content_diff splices: offsets are UTF-16 code units, as the editor computes them
+
+Run with: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autosave import PatchError, apply_patch, apply_text_diff  # noqa: E402
+
+
+class ApplyTextDiffTest(unittest.TestCase):
+
+    def test_splices_apply_in_order(self):
+        ops = [{'start': 0, 'end': 5, 'text': 'Howdy'}, {'start': 5, 'end': 5, 'text': '!'}]
+        self.assertEqual(apply_text_diff('Hello world', ops), 'Howdy! world')
+
+    def test_offsets_after_emoji_count_two_units(self):
+        # 'a😀b'.length is 4 in JavaScript: the emoji is a surrogate pair
+        self.assertEqual(apply_text_diff('a😀b', [{'start': 3, 'end': 4, 'text': 'c'}]), 'a😀c')
+        self.assertEqual(apply_text_diff('a😀b', [{'start': 1, 'end': 3, 'text': '😁'}]), 'a😁b')
+
+    def test_range_splitting_a_surrogate_pair_is_rejected(self):
+        for op in ({'start': 2, 'end': 2, 'text': 'x'}, {'start': 0, 'end': 2, 'text': ''}):
+            with self.assertRaises(PatchError):
+                apply_text_diff('a😀b', [op])
+
+    def test_unpaired_surrogate_text_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_text_diff('ab', [{'start': 1, 'end': 1, 'text': '\ud83d'}])
+
+    def test_out_of_range(self):
+        with self.assertRaises(PatchError):
+            apply_text_diff('a😀', [{'start': 0, 'end': 4, 'text': ''}])
+
+
+class ApplyPatchTest(unittest.TestCase):
+
+    def test_content_with_unpaired_surrogate_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_patch({'title': 't', 'content': '', 'is_public': 0}, {'content': 'x\udc00'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+SQLite storage path: the MySQL-to-SQLite rewrites and the stored procedures run by storage.py
+
+Run with: python -m unittest discover -s tests
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLITE_PROCEDURES, connect_sqlite, translate_sql  # noqa: E402
+
+MYSQL_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'DBMS Proj.sql')
+
+
+class TranslateSqlTest(unittest.TestCase):
+
+    def test_placeholders(self):
+        self.assertEqual(translate_sql("SELECT * FROM note WHERE note_id = %s AND user_id = %s"),
+                         "SELECT * FROM note WHERE note_id = ? AND user_id = ?")
+
+    def test_insert_ignore(self):
+        self.assertEqual(translate_sql("INSERT IGNORE INTO tag (name) VALUES (%s)"),
+                         "INSERT OR IGNORE INTO tag (name) VALUES (?)")
+        self.assertEqual(translate_sql("\n    insert ignore into tag (name) VALUES (%s)"),
+                         "\n    INSERT OR IGNORE into tag (name) VALUES (?)")
+
+    def test_insert_ignore_only_at_statement_start(self):
+        sql = "SELECT 'INSERT IGNORE' FROM note"
+        self.assertEqual(translate_sql(sql), sql)
+
+    def test_explain(self):
+        self.assertEqual(translate_sql("EXPLAIN SELECT 1"), "EXPLAIN QUERY PLAN SELECT 1")
+        self.assertEqual(translate_sql("EXPLAIN QUERY PLAN SELECT 1"), "EXPLAIN QUERY PLAN SELECT 1")
+
+    def test_portable_constructs_unchanged(self):
+        sql = ("SELECT n.note_id, GROUP_CONCAT(DISTINCT t.name), COALESCE(n.content, '') FROM note n "
+               "LEFT JOIN note_tag nt ON nt.note_id = n.note_id LEFT JOIN tag t ON t.tag_id = nt.tag_id "
+               "GROUP BY n.note_id ORDER BY CASE WHEN n.is_public THEN 1 ELSE 2 END LIMIT 10")
+        self.assertEqual(translate_sql(sql), sql)
+
+
+class SqliteDatabaseTest(unittest.TestCase):
+    """Each test gets a fresh database file created from sqlite_schema.sql (with its sample data)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = connect_sqlite(os.path.join(self.tmp.name, 'test.sqlite3'))
+        self.cur = self.conn.cursor()
+
+    def tearDown(self):
+        self.cur.close()
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def scalar(self, sql, args=()):
+        self.cur.execute(sql, args)
+        return self.cur.fetchone()
+
+
+class ProceduresTest(SqliteDatabaseTest):
+
+    def test_every_mysql_procedure_has_a_sqlite_body(self):
+        with open(MYSQL_SCHEMA_PATH, encoding='utf-8') as f:
+            names = set(re.findall(r'CREATE\s+PROCEDURE\s+(\w+)', f.read(), re.IGNORECASE))
+        self.assertEqual(names, set(SQLITE_PROCEDURES))
+
+    def test_suggest_tag(self):
+        self.cur.callproc('suggest_tag', [1, 2, 0.75])
+        self.conn.commit()
+        row = self.scalar("SELECT confidence, suggested_at FROM tag_suggestion WHERE note_id = %s AND tag_id = %s",
+                          (1, 2))
+        self.assertAlmostEqual(float(row[0]), 0.75)
+        self.assertIsNotNone(row[1])
+
+    def test_share_note_inserts(self):
+        self.cur.callproc('share_note', [2, 3, 'read'])
+        self.conn.commit()
+        self.assertEqual(self.scalar("SELECT access_level FROM collaboration WHERE note_id = %s AND "
+                                     "shared_with_user_id = %s", (2, 3)), ('read',))
+
+    def test_share_note_updates_existing_share(self):
+        # Like ON DUPLICATE KEY UPDATE: one row per (note, user), access level replaced
+        self.cur.callproc('share_note', [2, 3, 'read'])
+        self.cur.callproc('share_note', [2, 3, 'write'])
+        self.conn.commit()
+        self.assertEqual(self.scalar("SELECT COUNT(*), MAX(access_level) FROM collaboration WHERE note_id = %s "
+                                     "AND shared_with_user_id = %s", (2, 3)), (1, 'write'))
+
+    def test_mark_reminder_done(self):
+        reminder_id = self.scalar("SELECT MIN(reminder_id) FROM reminder WHERE status = 'pending'")[0]
+        self.cur.callproc('mark_reminder_done', [reminder_id])
+        self.conn.commit()
+        self.assertEqual(self.scalar("SELECT status FROM reminder WHERE reminder_id = %s", (reminder_id,)),
+                         ('done',))
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM reminder WHERE status = 'done'"), (1,))
+
+    def test_unknown_procedure(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.cur.callproc('no_such_procedure', [])
+
+
+class MySqlDialectTest(SqliteDatabaseTest):
+    """Statements written for MySQL in app.py run unchanged through the SQLite cursor"""
+
+    def test_insert_ignore_skips_duplicates(self):
+        self.cur.execute("INSERT IGNORE INTO tag (name) VALUES (%s)", ('sql',))
+        self.cur.execute("INSERT IGNORE INTO tag (name) VALUES (%s)", ('brand-new',))
+        self.conn.commit()
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM tag WHERE name IN (%s, %s)", ('sql', 'brand-new')), (2,))
+
+    def test_timestamps_are_datetimes(self):
+        self.assertIsInstance(self.scalar("SELECT created_at FROM note WHERE note_id = %s", (1,))[0], datetime)
+
+    def test_note_update_trigger_writes_history(self):
+        self.cur.execute("UPDATE note SET content = %s WHERE note_id = %s", ('changed', 1))
+        self.conn.commit()
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM note_history WHERE note_id = %s", (1,)), (1,))
+
+    def test_explain(self):
+        self.cur.execute("EXPLAIN SELECT * FROM note WHERE note_id = %s", (1,))
+        self.assertTrue(self.cur.fetchall())
+
+
+if __name__ == '__main__':
+    unittest.main()
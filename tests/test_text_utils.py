@@ -0,0 +1,51 @@
+"""
+Search snippets: highlight offsets are UTF-16 code units, as the frontend slices them
+
+Run with: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_utils import build_snippet, search_terms, utf16_offsets  # noqa: E402
+
+
+def js_slice(text, start, end):
+    """text.slice(start, end) as JavaScript evaluates it"""
+    return text.encode('utf-16-le')[2 * start:2 * end].decode('utf-16-le')
+
+
+class BuildSnippetTest(unittest.TestCase):
+
+    def highlighted(self, snippet):
+        return [js_slice(snippet['text'], start, end) for start, end in snippet['highlights']]
+
+    def test_ascii(self):
+        snippet = build_snippet('Notes about the sql join planner', search_terms('join'))
+        self.assertEqual(self.highlighted(snippet), ['join'])
+
+    def test_offsets_after_emoji(self):
+        snippet = build_snippet('🎉🎉 party 🎉 planning with the party team', search_terms('party'))
+        self.assertEqual(self.highlighted(snippet), ['party', 'party'])
+
+    def test_offsets_after_cut_with_emoji(self):
+        content = '😀 ' * 200 + 'needle in a haystack'
+        snippet = build_snippet(content, search_terms('needle'))
+        self.assertTrue(snippet['text'].startswith('…'))
+        self.assertEqual(self.highlighted(snippet), ['needle'])
+
+
+class Utf16OffsetsTest(unittest.TestCase):
+
+    def test_bmp_text_unchanged(self):
+        self.assertEqual(utf16_offsets('café', [0, 4]), [0, 4])
+
+    def test_astral_characters_count_twice(self):
+        self.assertEqual(utf16_offsets('a😀b', [0, 1, 2, 3]), [0, 1, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Text utilities for note content
+Pure functions shared by the API routes and the benchmark suite
+"""
+
+import re
+from typing import Dict, List
+
+# Average adult reading speed used for reading-time estimates
+WORDS_PER_MINUTE = 200
+# Length of the content window returned with each search hit
+SNIPPET_CHARS = 160
+ELLIPSIS = '…'
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def compute_text_statistics(title: str, content: str) -> Dict:
+    """
+    Compute word/character/paragraph statistics for a note
+    
+    Args:
+        title: Note title (counted in words and characters)
+        content: Note body (also used for paragraph and line counts)
+    """
+    title = title or ''
+    content = content or ''
+    full_text = f"{title} {content}"
+    
+    word_count = len(full_text.split())
+    char_count = len(full_text)
+    char_count_no_spaces = char_count - full_text.count(' ')
+    
+    return {
+        'word_count': word_count,
+        'character_count': char_count,
+        'character_count_no_spaces': char_count_no_spaces,
+        'reading_time_minutes': max(1, round(word_count / WORDS_PER_MINUTE)),
+        'paragraph_count': sum(1 for p in content.split('\n\n') if p.strip()),
+        'line_count': content.count('\n') + 1
+    }
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Lowercased terms to highlight for a search query: the whole phrase (it is what the
+    LIKE search matched) followed by its distinct words
+    """
+    phrase = ' '.join(query.lower().split())
+    terms = [phrase] if phrase else []
+    for word in _TERM_RE.findall(phrase):
+        if word not in terms:
+            terms.append(word)
+    return terms
+
+
+def utf16_offsets(text: str, offsets: List[int]) -> List[int]:
+    """
+    Convert code point offsets into text to UTF-16 code unit offsets, the string indices
+    JavaScript uses; characters outside the BMP (emoji) count twice
+    """
+    if len(text.encode('utf-16-le')) == 2 * len(text):
+        return list(offsets)
+    return [len(text[:offset].encode('utf-16-le')) // 2 for offset in offsets]
+
+
+def build_snippet(content: str, terms: List[str], width: int = SNIPPET_CHARS) -> Dict:
+    """
+    Window of the content around its best match, with highlight offsets
+
+    Matches of all terms are found in one regex pass (longest term first, so the phrase
+    wins over its words). The window is the stretch of at most `width` characters that
+    covers the most distinct terms, then the most matches, centred on those matches and
+    moved to word boundaries. Content that only matched in the title gets its opening.
+
+    Returns:
+        {'text': ..., 'highlights': [[start, end], ...]} with UTF-16 offsets into text (as
+        JavaScript's slice() counts them), which starts or ends with an ellipsis where the
+        content was cut
+    """
+    content = content or ''
+    matches = []
+    if terms:
+        pattern = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+        matches = [(m.start(), m.end(), m.group().lower()) for m in pattern.finditer(content)]
+
+    best = (0, 0, 0, 0, 0)   # (distinct words, longest match, matches, first index, last index)
+    first = 0
+    for last in range(len(matches)):
+        while matches[last][1] - matches[first][0] > width:
+            first += 1
+        window = matches[first:last + 1]
+        words = set()
+        for m in window:
+            words.update(m[2].split())
+        # A phrase match covers all its words and beats the same words found apart
+        score = (len(words), max(len(m[2]) for m in window), len(window))
+        if score > best[:3]:
+            best = score + (first, last)
+
+    if matches:
+        span_start, span_end = matches[best[3]][0], matches[best[4]][1]
+        start = max(0, span_start - (width - (span_end - span_start)) // 2)
+    else:
+        start = 0
+    end = min(len(content), start + width)
+    start = max(0, end - width)
+    if start > 0:
+        # Begin at a word, unless that would cut off the first match
+        space = content.find(' ', start, matches[best[3]][0] if matches else end)
+        if space != -1:
+            start = space + 1
+    if end < len(content):
+        space = content.rfind(' ', matches[best[4]][1] if matches else start, end)
+        if space > start:
+            end = space
+
+    prefix = ELLIPSIS if start > 0 else ''
+    text = prefix + content[start:end].replace('\n', ' ') + (ELLIPSIS if end < len(content) else '')
+    shift = len(prefix) - start
+    bounds = [offset + shift for m_start, m_end, _ in matches if m_start >= start and m_end <= end
+              for offset in (m_start, m_end)]
+    bounds = utf16_offsets(text, bounds)
+    highlights = [bounds[i:i + 2] for i in range(0, len(bounds), 2)]
+    return {'text': text, 'highlights': highlights}
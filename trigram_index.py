@@ -0,0 +1,245 @@
+"""
+Fuzzy note search
+Character-trigram index over the words of note titles, contents and tags, so a query with
+a typo still finds notes: candidate words come from shared trigrams and are confirmed
+with a bounded edit distance
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Reload from the database after this long, picking up notes written by other worker processes
+TRIGRAM_INDEX_MAX_AGE_S = float(os.getenv('TRIGRAM_INDEX_MAX_AGE_S', '600'))
+# Upper bound on typos tolerated per query word (fewer for short words, see max_distance)
+FUZZY_MAX_DISTANCE = int(os.getenv('FUZZY_MAX_DISTANCE', '2'))
+# Words longer than this are not indexed (hashes, URLs and the like)
+MAX_TERM_LENGTH = 40
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def note_terms(*texts: Optional[str]) -> frozenset:
+    """Distinct lowercased words of the texts"""
+    terms = set()
+    for text in texts:
+        terms.update(word for word in _WORD_RE.findall((text or '').lower()) if len(word) <= MAX_TERM_LENGTH)
+    return frozenset(terms)
+
+
+def trigrams(term: str) -> set:
+    """Trigrams of the word padded like pg_trgm ("  ab " for "ab"), so short words have some"""
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(word: str) -> int:
+    """Typos tolerated for a query word: none up to 2 characters, one up to 5, then FUZZY_MAX_DISTANCE"""
+    if len(word) <= 2:
+        return 0
+    return min(1 if len(word) <= 5 else 2, FUZZY_MAX_DISTANCE)
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """Levenshtein distance of a and b, or None as soon as it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class TrigramIndex:
+    """
+    Word -> notes postings plus trigram -> words, over all notes
+
+    A query word's candidates are the indexed words sharing enough of its trigrams: one
+    edit changes at most three trigrams, so a word within distance k shares at least
+    (trigrams of the longer word - 3k) of them, and words of very different length are
+    skipped before counting. Only candidates passing that filter get the edit-distance
+    check, which itself gives up once the distance exceeds k. Tags are indexed as words
+    of the notes carrying them. Writes update the index in place.
+    """
+
+    def __init__(self, max_age_s: float = TRIGRAM_INDEX_MAX_AGE_S):
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._postings: Dict[str, set] = {}            # word -> note ids
+        self._grams: Dict[str, set] = {}               # trigram -> words
+        self._notes: Dict[int, Tuple[frozenset, frozenset]] = {}   # note_id -> (text words, tag words)
+        self._loaded_at: Optional[float] = None
+        self.last_load_ms = 0.0
+        self.verified = 0
+
+    def needs_load(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.max_age_s
+
+    def load(self, cur):
+        """(Re)build the index from the note, note_tag and tag tables"""
+        start = time.perf_counter()
+        cur.execute("SELECT note_id, title, content FROM note")
+        notes = {note_id: (note_terms(title, content), frozenset()) for note_id, title, content in cur.fetchall()}
+        cur.execute("""
+            SELECT nt.note_id, t.name
+            FROM note_tag nt
+            JOIN tag t ON t.tag_id = nt.tag_id
+        """)
+        tags: Dict[int, set] = {}
+        for note_id, name in cur.fetchall():
+            tags.setdefault(note_id, set()).update(note_terms(name))
+        for note_id, names in tags.items():
+            if note_id in notes:
+                notes[note_id] = (notes[note_id][0], frozenset(names))
+
+        postings: Dict[str, set] = {}
+        for note_id, (text_terms, tag_terms) in notes.items():
+            for term in text_terms | tag_terms:
+                postings.setdefault(term, set()).add(note_id)
+        grams: Dict[str, set] = {}
+        for term in postings:
+            for gram in trigrams(term):
+                grams.setdefault(gram, set()).add(term)
+        with self._lock:
+            self._notes = notes
+            self._postings = postings
+            self._grams = grams
+            self._loaded_at = time.monotonic()
+        self.last_load_ms = (time.perf_counter() - start) * 1000
+
+    def _set_terms_locked(self, note_id: int, text_terms: frozenset, tag_terms: frozenset):
+        old_text, old_tags = self._notes.get(note_id, (frozenset(), frozenset()))
+        old, new = old_text | old_tags, text_terms | tag_terms
+        for term in old - new:
+            members = self._postings.get(term)
+            if members is not None:
+                members.discard(note_id)
+                if not members:
+                    del self._postings[term]
+                    for gram in trigrams(term):
+                        words = self._grams.get(gram)
+                        if words is not None:
+                            words.discard(term)
+                            if not words:
+                                del self._grams[gram]
+        for term in new - old:
+            members = self._postings.get(term)
+            if members is None:
+                members = self._postings[term] = set()
+                for gram in trigrams(term):
+                    self._grams.setdefault(gram, set()).add(term)
+            members.add(note_id)
+        if new:
+            self._notes[note_id] = (text_terms, tag_terms)
+        else:
+            self._notes.pop(note_id, None)
+
+    def index_note(self, note_id: int, title: str, content: str):
+        """Re-index a note's title and content after a write (no-op if the index is not loaded yet)"""
+        if self._loaded_at is None:
+            return
+        text_terms = note_terms(title, content)
+        with self._lock:
+            self._set_terms_locked(note_id, text_terms, self._notes.get(note_id, (None, frozenset()))[1])
+
+    def set_note(self, note_id: int, title: str, content: str, tag_names: Iterable[str]):
+        """Replace everything indexed for a note (text and tags), e.g. after another process wrote it"""
+        if self._loaded_at is None:
+            return
+        text_terms, tag_terms = note_terms(title, content), note_terms(*tag_names)
+        with self._lock:
+            self._set_terms_locked(note_id, text_terms, tag_terms)
+
+    def add_tags(self, note_id: int, names: Iterable[str]):
+        """Index tags just attached to a note"""
+        if self._loaded_at is None:
+            return
+        added = note_terms(*names)
+        with self._lock:
+            text_terms, tag_terms = self._notes.get(note_id, (frozenset(), frozenset()))
+            self._set_terms_locked(note_id, text_terms, tag_terms | added)
+
+    def remove_note(self, note_id: int):
+        with self._lock:
+            self._set_terms_locked(note_id, frozenset(), frozenset())
+
+    def _matching_terms_locked(self, word: str) -> Dict[str, int]:
+        """Indexed words within max_distance(word) of word, with their distance"""
+        limit = max_distance(word)
+        if limit == 0:
+            return {word: 0} if word in self._postings else {}
+        word_grams = trigrams(word)
+        shared = Counter()
+        for gram in word_grams:
+            for term in self._grams.get(gram, ()):
+                if abs(len(term) - len(word)) <= limit:
+                    shared[term] += 1
+        matches = {}
+        for term, count in shared.items():
+            # Each edit removes at most three distinct trigrams from either word
+            if count < max(len(word_grams), len(trigrams(term))) - 3 * limit:
+                continue
+            self.verified += 1
+            distance = bounded_edit_distance(word, term, limit)
+            if distance is not None:
+                matches[term] = distance
+        return matches
+
+    def search(self, query: str) -> List[Tuple[int, int, List[str]]]:
+        """
+        Notes containing a close match of every query word; call load() first
+
+        Returns:
+            [(note_id, total edit distance, matched words), ...] in no particular order
+        """
+        words = list(dict.fromkeys(_WORD_RE.findall(query.lower())))
+        if not words:
+            return []
+        results: Optional[Dict[int, list]] = None   # note_id -> [distance, matched words]
+        with self._lock:
+            for word in words:
+                per_note: Dict[int, tuple] = {}
+                for term, distance in self._matching_terms_locked(word).items():
+                    for note_id in self._postings[term]:
+                        best = per_note.get(note_id)
+                        if best is None or distance < best[0]:
+                            per_note[note_id] = (distance, term)
+                if results is None:
+                    results = {note_id: [distance, [term]] for note_id, (distance, term) in per_note.items()}
+                else:
+                    results = {note_id: [entry[0] + per_note[note_id][0], entry[1] + [per_note[note_id][1]]]
+                               for note_id, entry in results.items() if note_id in per_note}
+                if not results:
+                    return []
+        return [(note_id, distance, terms) for note_id, (distance, terms) in results.items()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'notes': len(self._notes),
+                'words': len(self._postings),
+                'trigrams': len(self._grams),
+                'loaded': self._loaded_at is not None,
+                'verified': self.verified,
+                'last_load_ms': round(self.last_load_ms, 3),
+            }
+
+
+# Global instance
+_trigram_index = None
+
+
+def get_trigram_index() -> TrigramIndex:
+    """Get or create the fuzzy search index instance"""
+    global _trigram_index
+    if _trigram_index is None:
+        _trigram_index = TrigramIndex()
+    return _trigram_index
@@ -0,0 +1,128 @@
+"""
+Search-as-you-type
+Per-user cache of the notes matching recent typeahead queries, so each keystroke refines
+the previous answer with a primary-key lookup instead of scanning every note again
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+TYPEAHEAD_CACHE_MAX_USERS = int(os.getenv('TYPEAHEAD_CACHE_MAX_USERS', '500'))
+# Queries remembered per user
+TYPEAHEAD_CACHE_QUERIES = int(os.getenv('TYPEAHEAD_CACHE_QUERIES', '32'))
+# Answers matching more notes than this (one- or two-letter prefixes) are not cached
+TYPEAHEAD_CACHE_MAX_IDS = int(os.getenv('TYPEAHEAD_CACHE_MAX_IDS', '2000'))
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def query_tokens(query: str) -> List[str]:
+    return normalize_query(query).split()
+
+
+def token_pattern(tokens: List[str]):
+    """
+    Regex for the typeahead match: every token must start a word of the text
+
+    The last token is what the user is still typing, so matching it as a word prefix
+    ("kube" finds "Kubernetes") is the point; earlier tokens are complete words, but
+    matching them as prefixes too keeps the match monotonic: a query extending a cached
+    one can only match a subset of the cached notes.
+    """
+    return re.compile(''.join(f'(?=.*?(?<!\\w){re.escape(token)})' for token in tokens),
+                      re.IGNORECASE | re.DOTALL)
+
+
+class TypeaheadCache:
+    """
+    Matching note ids (in rank order) per user and normalized query
+
+    Entries belong to the user's data version: when it moves (any write the user can
+    see), their entries are dropped. A new query that extends a cached one, as the next
+    keystroke does, starts from that query's ids; the longest such prefix is used.
+    """
+
+    def __init__(self, max_users: int = TYPEAHEAD_CACHE_MAX_USERS, max_queries: int = TYPEAHEAD_CACHE_QUERIES,
+                 max_ids: int = TYPEAHEAD_CACHE_MAX_IDS):
+        self.max_users = max_users
+        self.max_queries = max_queries
+        self.max_ids = max_ids
+        self._lock = threading.Lock()
+        self._users: 'OrderedDict[int, Tuple[int, OrderedDict]]' = OrderedDict()
+        self.hits = 0
+        self.refined = 0
+        self.scans = 0
+
+    def _queries(self, user_id: int, version: int) -> Optional[OrderedDict]:
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] != version:
+            return None
+        self._users.move_to_end(user_id)
+        return entry[1]
+
+    def lookup(self, user_id: int, version: int, query: str) -> Tuple[Optional[List[int]], Optional[List[int]]]:
+        """
+        (ids cached for exactly this query, ids of the longest cached query it extends);
+        at most one of them is not None
+        """
+        with self._lock:
+            queries = self._queries(user_id, version)
+            if queries is None:
+                return None, None
+            exact = queries.get(query)
+            if exact is not None:
+                queries.move_to_end(query)
+                self.hits += 1
+                return exact, None
+            base = max((cached for cached in queries if query.startswith(cached)), key=len, default=None)
+            if base is None:
+                return None, None
+            queries.move_to_end(base)
+            self.refined += 1
+            return None, queries[base]
+
+    def store(self, user_id: int, version: int, query: str, note_ids: List[int]):
+        if len(note_ids) > self.max_ids:
+            return
+        with self._lock:
+            queries = self._queries(user_id, version)
+            if queries is None:
+                queries = OrderedDict()
+                self._users[user_id] = (version, queries)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            queries[query] = note_ids
+            queries.move_to_end(query)
+            while len(queries) > self.max_queries:
+                queries.popitem(last=False)
+
+    def record_scan(self):
+        with self._lock:
+            self.scans += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'cached_users': len(self._users),
+                'hits': self.hits,
+                'refined': self.refined,
+                'scans': self.scans,
+            }
+
+
+# Global instance
+_typeahead_cache = None
+
+
+def get_typeahead_cache() -> TypeaheadCache:
+    """Get or create the typeahead cache instance"""
+    global _typeahead_cache
+    if _typeahead_cache is None:
+        _typeahead_cache = TypeaheadCache()
+    return _typeahead_cache
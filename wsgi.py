@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+With preload_app (see gunicorn.conf.py) this module is imported once in the master
+process, so the app is built and warmed up before the workers fork.
+"""
+
+from app import create_app, warm_up
+
+application = create_app()
+warm_up(application)